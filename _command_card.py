@@ -1,6 +1,5 @@
 # 文件: feifeisupermarket/_command_card.py
 
-import os
 import math
 import textwrap
 from typing import Dict, Optional
@@ -9,6 +8,7 @@ from astrbot.api import logger
 
 # 导入您项目中的绘图工具箱
 from . import drawing_utils as utils
+from .tracing import traced
 
 # -------------------------------------------------------------------
 # 1. 命令信息统一定义
@@ -144,6 +144,10 @@ COMMANDS_INFO = {
         "usage": "我的关系网",
         "description": "查看与你好感度最高的5位朋友。"
     },
+    "群关系榜": {
+        "usage": "群关系榜",
+        "description": "查看全群的最佳CP、人气王与社交圈子。"
+    },
     "赠送": {
         "usage": "赠送 <金额> @用户",
         "description": "向指定用户赠送Astr币。"
@@ -153,6 +157,7 @@ COMMANDS_INFO = {
 # -------------------------------------------------------------------
 # 2. 命令卡片生成函数
 # -------------------------------------------------------------------
+@traced()
 async def generate_command_card() -> Optional[str]:
     """
     生成包含所有命令帮助信息的图片卡片。
@@ -179,7 +184,6 @@ async def generate_command_card() -> Optional[str]:
         title_font = utils.get_font(70)
         cmd_name_font = utils.get_font(36)
         cmd_usage_font = utils.get_font(28)
-        timestamp_font = utils.get_font(22)
 
         # --- 绘制标题 ---
         title_text = "命令帮助手册"
@@ -206,17 +210,12 @@ async def generate_command_card() -> Optional[str]:
             draw.text((text_x, y + 60), usage_text, font=cmd_usage_font, fill=(200, 200, 200))
         
         # --- 绘制时间戳 ---
-        timestamp_text = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        draw.text((WIDTH - 20, int(HEIGHT) - 20), timestamp_text, font=timestamp_font, fill=(180, 180, 180), anchor="rs")
+        utils.draw_timestamp(draw, WIDTH, int(HEIGHT), fill=(180, 180, 180))
 
         # --- 保存并返回图片路径 ---
-        output_dir = os.path.join(utils.BASE_DIR, "data/command_cards")
-        os.makedirs(output_dir, exist_ok=True)
         file_name = f"command_list_{int(datetime.now().timestamp())}.png"
-        output_path = os.path.join(output_dir, file_name)
-        
         # 将RGBA转换为RGB以保存为PNG
-        card.convert("RGB").save(output_path, "PNG", quality=95)
+        output_path = utils.save_card(card, "command_cards", file_name)
         logger.info(f"已成功生成命令帮助卡片: {output_path}")
 
         return output_path
@@ -1,6 +1,5 @@
 # feifeisupermarket/_generate_achievements.py
 
-import os
 import math
 import textwrap
 from typing import List, Dict, Optional
@@ -10,6 +9,7 @@ from astrbot.api import logger
 
 # 导入全新的绘图工具箱
 from . import drawing_utils as utils
+from .tracing import traced
 
 
 def _draw_achievement_icon(draw: ImageDraw.Draw, position: tuple, size: int, unlocked: bool):
@@ -30,6 +30,7 @@ def _draw_achievement_icon(draw: ImageDraw.Draw, position: tuple, size: int, unl
     draw.polygon([p1, p2, p3, p4, p5], fill=star_color)
 
 
+@traced()
 async def generate_achievements_image(
     user_name: str,
     unlocked_ids: List[str],
@@ -76,7 +77,6 @@ async def generate_achievements_image(
         ach_name_font = utils.get_font(32)
         ach_desc_font = utils.get_font(24)
         ach_reward_font = utils.get_font(22)
-        timestamp_font = utils.get_font(22)
 
         # --- 4. 绘制标题 ---
         title_text = f"{user_name} 的成就墙"
@@ -113,17 +113,12 @@ async def generate_achievements_image(
                 draw.text((text_x, y + ITEM_HEIGHT - 35), reward_text, font=ach_reward_font, fill=REWARD_COLOR)
 
         # --- 6. 绘制时间戳 ---
-        timestamp_text = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        draw.text((WIDTH - 20, HEIGHT - 20), timestamp_text, font=timestamp_font, fill=TIMESTAMP_COLOR, anchor="rs")
+        utils.draw_timestamp(draw, WIDTH, HEIGHT, fill=TIMESTAMP_COLOR)
 
         # --- 7. 保存并返回图片路径 ---
-        output_dir = os.path.join(utils.BASE_DIR, "data/achievements")
-        os.makedirs(output_dir, exist_ok=True)
         safe_user_name = "".join(c for c in user_name if c.isalnum()) or "user"
         file_name = f"achievements_{safe_user_name}_{int(datetime.now().timestamp())}.png"
-        output_path = os.path.join(output_dir, file_name)
-        
-        card.convert("RGB").save(output_path, "PNG", quality=95)
+        output_path = utils.save_card(card, "achievements", file_name)
         logger.info(f"已成功为 {user_name} 生成成就墙图片: {output_path}")
 
         return output_path
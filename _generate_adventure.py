@@ -1,4 +1,3 @@
-import os
 import textwrap
 from datetime import datetime
 from typing import Dict, Optional, Any, List
@@ -7,7 +6,9 @@ from astrbot.api import logger
 
 # 导入绘图工具箱
 from . import drawing_utils as utils
+from .tracing import traced
 
+@traced()
 async def generate_adventure_report_card(results: Dict[str, Any]) -> Optional[str]:
     """
     生成冒险报告卡片
@@ -33,7 +34,6 @@ async def generate_adventure_report_card(results: Dict[str, Any]) -> Optional[st
         event_title_font = utils.get_font(32)
         event_desc_font = utils.get_font(24)
         effect_font = utils.get_font(26)
-        timestamp_font = utils.get_font(22)
         
         # --- 4. 绘制标题 ---
         title_text = "冒险报告"
@@ -116,8 +116,19 @@ async def generate_adventure_report_card(results: Dict[str, Any]) -> Optional[st
         event_height = 90  # 增加事件高度
         events_per_column = 4  # 每列显示4个事件
         event_width = (WIDTH - 150) / 2
-        
-        for i, event in enumerate(results["events"]):
+        max_event_tiles = events_per_column * 2  # 两列共可显示的事件数量
+
+        # 事件过多时只显示前面的事件，最后一格汇总其余事件
+        events = results["events"]
+        if len(events) > max_event_tiles:
+            hidden_count = len(events) - (max_event_tiles - 1)
+            events = events[:max_event_tiles - 1] + [{
+                "name": f"……其余{hidden_count}个事件",
+                "description": "效果已计入上方的Astr币与体力统计",
+                "effects": {}
+            }]
+
+        for i, event in enumerate(events):
             col = i // events_per_column
             row = i % events_per_column
             
@@ -198,15 +209,11 @@ async def generate_adventure_report_card(results: Dict[str, Any]) -> Optional[st
                     font=info_font, fill=(255, 255, 200))
         
         # --- 9. 添加时间戳 ---
-        timestamp_text = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        draw.text((WIDTH - 20, HEIGHT - 20), timestamp_text, font=timestamp_font, fill=(180, 180, 180), anchor="rs")
+        utils.draw_timestamp(draw, WIDTH, HEIGHT, fill=(180, 180, 180))
         
         # --- 10. 保存图片 ---
-        output_dir = os.path.join(utils.BASE_DIR, "data/adventure_reports")
-        os.makedirs(output_dir, exist_ok=True)
         file_name = f"adventure_{int(datetime.now().timestamp())}.png"
-        output_path = os.path.join(output_dir, file_name)
-        card.save(output_path, "PNG")
+        output_path = utils.save_card(card, "adventure_reports", file_name, convert_rgb=False)
         return output_path
         
     except Exception as e:
@@ -0,0 +1,76 @@
+# feifeisupermarket/_generate_group_social.py
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from .card_layout import (
+    CardLayout, BackgroundLayer, TextLayer, RowsLayer, TimestampLayer, render_pillow
+)
+from .tracing import traced
+
+# 群社交排行卡片布局
+GROUP_SOCIAL_LAYOUT = CardLayout("group_social", 1280, 720, [
+    BackgroundLayer(decorations=True),
+    TextLayer("群社交排行", 640, 35, 60, (255, 215, 0), anchor="ma", outline=(0, 0, 0)),
+    TextLayer("最佳CP", 330, 130, 40, (255, 105, 180), anchor="ma"),
+    RowsLayer("couple_rows", 60, 195, row_height=62, value_dx=450, value_dy=2,
+              label_size=32, value_size=30, highlight_size=32, highlight_color=(255, 105, 180)),
+    TextLayer("人气王", 950, 130, 40, (255, 215, 0), anchor="ma"),
+    RowsLayer("popular_rows", 720, 195, row_height=62, value_dx=300, value_dy=2,
+              label_size=32, value_size=30, highlight_size=32),
+    RowsLayer("summary_rows", 380, 530, row_height=50, value_dx=330, value_dy=0,
+              label_size=30, value_size=30, highlight_size=30, highlight_color=(50, 255, 50)),
+    TimestampLayer((180, 180, 180)),
+])
+
+
+def _short_name(name: str, limit: int = 5) -> str:
+    return name if len(name) <= limit else name[:limit - 1] + "…"
+
+
+def _build_group_social_data(stats: Any, names: Dict[str, str]) -> Dict[str, Any]:
+    """整理群社交排行卡片布局所需的数据"""
+    def name_of(user_id: str) -> str:
+        return _short_name(names.get(user_id, f"用户{user_id}"))
+
+    couple_rows = [
+        (f"{i + 1}. {name_of(a)} & {name_of(b)}", f"{a_to_b} / {b_to_a}", i == 0)
+        for i, (a, b, a_to_b, b_to_a) in enumerate(stats.top_couples)
+    ] or [("暂无互相有好感的群友", "", False)]
+    popular_rows = [
+        (f"{i + 1}. {name_of(user_id)}", f"{total}（{count}人）", i == 0)
+        for i, (user_id, total, count) in enumerate(stats.most_popular)
+    ] or [("暂无数据", "", False)]
+
+    largest_cluster = len(stats.clusters[0]) if stats.clusters else 0
+    summary_rows = [
+        ("有好感度记录的群友:", f"{stats.member_count} 人", False),
+        (f"互相好感度≥{stats.mutual_threshold}:", f"{stats.mutual_count} 对", True),
+        ("社交圈子 / 最大圈子:", f"{len(stats.clusters)} 个 / {largest_cluster} 人", False),
+    ]
+    return {
+        "couple_rows": couple_rows,
+        "popular_rows": popular_rows,
+        "summary_rows": summary_rows,
+    }
+
+
+@traced()
+async def generate_group_social_card(
+    group_id: str,
+    stats: Any,
+    names: Dict[str, str]
+) -> Optional[str]:
+    """
+    生成群社交排行卡片。
+
+    Args:
+        stats: SocialManager.get_group_social_stats 的返回值
+        names: {用户ID: 显示名称}
+
+    Returns:
+        图片路径，失败时返回None
+    """
+    data = _build_group_social_data(stats, names)
+    file_name = f"group_social_{group_id}_{int(datetime.now().timestamp())}.png"
+    return await render_pillow(GROUP_SOCIAL_LAYOUT, data, "social_network", file_name)
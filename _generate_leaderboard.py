@@ -1,6 +1,5 @@
 # feifeisupermarket/_generate_leaderboard.py
 
-import os
 import textwrap
 from datetime import datetime
 from typing import Dict, List, Optional
@@ -9,8 +8,10 @@ from astrbot.api import logger
 
 # 导入全新的绘图工具箱
 from . import drawing_utils as utils
+from .tracing import traced
 
 
+@traced()
 async def generate_leaderboard_image(
     board_type: str,
     top_users: List[Dict],
@@ -55,7 +56,6 @@ async def generate_leaderboard_image(
         header_font = utils.get_font(36)
         item_font = utils.get_font(36) # 统一列表项字体
         footer_font = utils.get_font(30)
-        timestamp_font = utils.get_font(22)
 
         # --- 4. 绘制标题 ---
         title_text = config['title']
@@ -100,16 +100,11 @@ async def generate_leaderboard_image(
         draw.text(((WIDTH - w) / 2, footer_y), req_info_text, font=footer_font, fill=TEXT_COLOR)
 
         # --- 8. 绘制时间戳 ---
-        timestamp_text = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        draw.text((WIDTH - 20, HEIGHT - 20), timestamp_text, font=timestamp_font, fill=SUB_TEXT_COLOR, anchor="rs")
+        utils.draw_timestamp(draw, WIDTH, HEIGHT, fill=SUB_TEXT_COLOR)
 
         # --- 9. 保存并返回图片路径 ---
-        output_dir = os.path.join(utils.BASE_DIR, "data/leaderboards")
-        os.makedirs(output_dir, exist_ok=True)
         file_name = f"leaderboard_{board_type}_{int(datetime.now().timestamp())}.png"
-        output_path = os.path.join(output_dir, file_name)
-        
-        card.convert("RGB").save(output_path, "PNG", quality=95)
+        output_path = utils.save_card(card, "leaderboards", file_name)
         logger.info(f"已成功生成 {config['title']} 图片: {output_path}")
         
         return output_path
@@ -1,6 +1,5 @@
 # feifeisupermarket/_generate_market.py
 
-import os
 from datetime import datetime
 from typing import Dict, Any, Optional
 
@@ -8,8 +7,10 @@ from astrbot.api import logger
 
 # 导入全新的绘图工具箱，所有绘图操作都将通过它进行
 from . import drawing_utils as utils
+from .tracing import traced
 
 
+@traced()
 async def generate_market_card_pillow(
     user_id: str,
     user_name: str,
@@ -54,7 +55,6 @@ async def generate_market_card_pillow(
         label_font = utils.get_font(35)
         value_font = utils.get_font(42)
         highlight_font = utils.get_font(45)
-        timestamp_font = utils.get_font(22)
 
         # --- 4. 根据卡片类型绘制特定内容 ---
         # 所有内容绘制在卡片的右半部分
@@ -95,16 +95,11 @@ async def generate_market_card_pillow(
                     current_y += 45
 
         # --- 5. 添加时间戳 ---
-        timestamp_text = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        draw.text((WIDTH - 20, HEIGHT - 20), timestamp_text, font=timestamp_font, fill=(180, 180, 180), anchor="rs")
+        utils.draw_timestamp(draw, WIDTH, HEIGHT, fill=(180, 180, 180))
         
         # --- 6. 保存图片 ---
-        output_dir = os.path.join(utils.BASE_DIR, "data/market_cards")
-        os.makedirs(output_dir, exist_ok=True)
         file_name = f"market_card_{user_id}_{card_type}_{int(datetime.now().timestamp())}.png"
-        output_path = os.path.join(output_dir, file_name)
-        
-        card.convert("RGB").save(output_path, "PNG", quality=95)
+        output_path = utils.save_card(card, "market_cards", file_name)
         return output_path
 
     except Exception as e:
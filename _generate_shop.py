@@ -1,4 +1,3 @@
-import os
 import textwrap
 from datetime import datetime
 from typing import Dict, Optional, Any
@@ -8,8 +7,10 @@ from astrbot.api import logger
 # 导入绘图工具箱
 from . import drawing_utils as utils
 from .shop_items import SHOP_DATA
+from .tracing import traced
 
 # --- 商店卡片生成函数 ---
+@traced()
 async def generate_shop_card(category: str, user_points: int, user_avatar_url: str = None) -> Optional[str]:
     """
     生成指定类别的商店卡片。
@@ -29,7 +30,6 @@ async def generate_shop_card(category: str, user_points: int, user_avatar_url: s
         item_name_font = utils.get_font(32)
         item_price_font = utils.get_font(30)
         item_desc_font = utils.get_font(24)
-        timestamp_font = utils.get_font(22)
 
         # --- 4. 获取并绘制头像 ---
         avatar_size = 80
@@ -106,21 +106,18 @@ async def generate_shop_card(category: str, user_points: int, user_avatar_url: s
                     draw.text((text_start_x, box_y + 75 + j * 28), line, font=item_desc_font, fill=(200, 200, 200))
 
         # --- 7. 添加时间戳 ---
-        timestamp_text = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        draw.text((WIDTH - 20, HEIGHT - 20), timestamp_text, font=timestamp_font, fill=(180, 180, 180), anchor="rs")
+        utils.draw_timestamp(draw, WIDTH, HEIGHT, fill=(180, 180, 180))
 
         # --- 8. 保存图片 ---
-        output_dir = os.path.join(utils.BASE_DIR, "data/shop_cards")
-        os.makedirs(output_dir, exist_ok=True)
         file_name = f"shop_{category}_{int(datetime.now().timestamp())}.png"
-        output_path = os.path.join(output_dir, file_name)
-        card.save(output_path, "PNG")
+        output_path = utils.save_card(card, "shop_cards", file_name, convert_rgb=False)
         return output_path
 
     except Exception as e:
         logger.error(f"Pillow生成商店卡片失败: {e}", exc_info=True)
         return None
 
+@traced()
 async def generate_backpack_card(user_bag: Dict[str, Dict[str, int]], user_points: int, 
                                stamina: int = 0, max_stamina: int = 100, 
                                user_avatar_url: str = None) -> Optional[str]:
@@ -168,7 +165,6 @@ async def generate_backpack_card(user_bag: Dict[str, Dict[str, int]], user_point
         item_name_font = utils.get_font(32)
         item_quantity_font = utils.get_font(30)
         item_desc_font = utils.get_font(24)
-        timestamp_font = utils.get_font(22)
 
         # --- 4. [移除] 不再绘制头像 ---
         
@@ -258,15 +254,11 @@ async def generate_backpack_card(user_bag: Dict[str, Dict[str, int]], user_point
                     draw.text((text_start_x, box_y + 75 + j * 28), line, font=item_desc_font, fill=(200, 200, 200))
 
         # --- 7. 添加时间戳 ---
-        timestamp_text = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        draw.text((WIDTH - 20, HEIGHT - 20), timestamp_text, font=timestamp_font, fill=(180, 180, 180), anchor="rs")
+        utils.draw_timestamp(draw, WIDTH, HEIGHT, fill=(180, 180, 180))
 
         # --- 8. 保存图片 ---
-        output_dir = os.path.join(utils.BASE_DIR, "data/backpack_cards")
-        os.makedirs(output_dir, exist_ok=True)
         file_name = f"backpack_{int(datetime.now().timestamp())}.png"
-        output_path = os.path.join(output_dir, file_name)
-        card.save(output_path, "PNG")
+        output_path = utils.save_card(card, "backpack_cards", file_name, convert_rgb=False)
         return output_path
 
     except Exception as e:
@@ -1,6 +1,5 @@
 # feifeisupermarket/_generate_social.py
 
-import os
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 
@@ -8,9 +7,11 @@ from astrbot.api import logger
 
 # 导入绘图工具箱
 from . import drawing_utils as utils
+from .tracing import traced
 from PIL import Image, ImageDraw
 
 
+@traced()
 async def generate_relationship_card(
     user_a_id: str,
     user_a_name: str,
@@ -187,17 +188,11 @@ async def generate_relationship_card(
                      font=small_font, fill=(220, 220, 220))
         
         # --- 10. 添加时间戳 ---
-        timestamp_text = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        timestamp_font = utils.get_font(22)
-        draw.text((WIDTH - 20, HEIGHT - 20), timestamp_text, font=timestamp_font, fill=(180, 180, 180), anchor="rs")
+        utils.draw_timestamp(draw, WIDTH, HEIGHT, fill=(180, 180, 180))
         
         # --- 11. 保存图片 ---
-        output_dir = os.path.join(utils.BASE_DIR, "data/social_cards")
-        os.makedirs(output_dir, exist_ok=True)
         file_name = f"relationship_{user_a_id}_{user_b_id}_{int(datetime.now().timestamp())}.png"
-        output_path = os.path.join(output_dir, file_name)
-        
-        card.convert("RGB").save(output_path, "PNG", quality=95)
+        output_path = utils.save_card(card, "social_cards", file_name)
         return output_path
         
     except Exception as e:
@@ -206,6 +201,7 @@ async def generate_relationship_card(
 
 
 
+@traced()
 async def generate_date_report_card(
     user_a_id: str,
     user_a_name: str,
@@ -394,17 +390,11 @@ async def generate_date_report_card(
             draw.text((WIDTH - 50 - w, y_pos), effect_text, font=small_font, fill=effect_color)
 
         # --- 9. 添加时间戳 ---
-        timestamp_text = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        timestamp_font = utils.get_font(22)
-        draw.text((WIDTH - 20, HEIGHT - 20), timestamp_text, font=timestamp_font, fill=(180, 180, 180), anchor="rs")
+        utils.draw_timestamp(draw, WIDTH, HEIGHT, fill=(180, 180, 180))
 
         # --- 10. 保存图片 ---
-        output_dir = os.path.join(utils.BASE_DIR, "data/date_reports")
-        os.makedirs(output_dir, exist_ok=True)
         file_name = f"date_{user_a_id}_{user_b_id}_{int(datetime.now().timestamp())}.png"
-        output_path = os.path.join(output_dir, file_name)
-
-        card.convert("RGB").save(output_path, "PNG", quality=95)
+        output_path = utils.save_card(card, "date_reports", file_name)
         return output_path
 
     except Exception as e:
@@ -412,6 +402,7 @@ async def generate_date_report_card(
         return None
 
 
+@traced()
 async def generate_social_network_card(
     user_id: str,
     user_name: str,
@@ -505,17 +496,11 @@ async def generate_social_network_card(
                     draw.text((WIDTH - 50 - w, y_pos + 20), special_text, font=small_font, fill=(255, 105, 180))
 
         # --- 7. 添加时间戳 ---
-        timestamp_text = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        timestamp_font = utils.get_font(22)
-        draw.text((WIDTH - 20, HEIGHT - 20), timestamp_text, font=timestamp_font, fill=(180, 180, 180), anchor="rs")
+        utils.draw_timestamp(draw, WIDTH, HEIGHT, fill=(180, 180, 180))
 
         # --- 8. 保存图片 ---
-        output_dir = os.path.join(utils.BASE_DIR, "data/social_network")
-        os.makedirs(output_dir, exist_ok=True)
         file_name = f"network_{user_id}_{int(datetime.now().timestamp())}.png"
-        output_path = os.path.join(output_dir, file_name)
-
-        card.convert("RGB").save(output_path, "PNG", quality=95)
+        output_path = utils.save_card(card, "social_network", file_name)
         return output_path
 
     except Exception as e:
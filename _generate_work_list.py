@@ -8,8 +8,10 @@ from .market import JOBS, MarketManager
 
 # 导入全新的绘图工具箱
 from . import drawing_utils as utils
+from .tracing import traced
 
 
+@traced()
 async def generate_work_list_image(output_path: str) -> bool:
     """
     使用重构后的工具函数生成包含所有工作选项的静态图片。
@@ -0,0 +1,85 @@
+# feifeisupermarket/_generate_work_summary.py
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from .card_layout import (
+    CardLayout, BackgroundLayer, AvatarLayer, TextLayer, RowsLayer, TimestampLayer, render_pillow
+)
+from .shop_items import SHOP_DATA
+from .tracing import traced
+
+# 一键打工（全员）汇总卡片布局
+WORK_SUMMARY_LAYOUT = CardLayout("work_summary", 1280, 720, [
+    BackgroundLayer(decorations=True),
+    AvatarLayer(center_x=240, top=190, size=180),
+    TextLayer("{user_name}", 240, 390, 44, (255, 255, 255), anchor="ma"),
+    TextLayer("「{title}」", 240, 445, 30, (0, 229, 255), anchor="ma", outline=(0, 0, 0), when="title"),
+    TextLayer("一键打工 · {job_name}", 800, 60, 60, (255, 215, 0), anchor="ma"),
+    RowsLayer("worker_rows", 500, 170, row_height=62, value_dx=380, value_dy=-3,
+              label_size=36, value_size=36, highlight_size=38, highlight_color=(50, 255, 50)),
+    RowsLayer("summary_rows", 500, 400, row_height=62, value_dx=220, value_dy=-1,
+              label_size=34, value_size=32, highlight_size=40),
+    TimestampLayer((180, 180, 180)),
+])
+
+# 道具效果 → 道具名称
+_BUFF_NAMES = {
+    item["effect_buff"]: item["name"]
+    for items in SHOP_DATA.values() for item in items.values() if "effect_buff" in item
+}
+
+
+def _build_work_summary_data(user_name: str, avatar_url: str, results: Dict[str, Any],
+                             title: Optional[str]) -> Dict[str, Any]:
+    """整理汇总卡片布局所需的数据"""
+    worker_rows = []
+    for worker in results["workers"]:
+        name = worker["name"] if len(worker["name"]) <= 8 else worker["name"][:7] + "…"
+        if worker["success"]:
+            value = f"+{worker['result']:.2f} Astr币"
+        elif worker["result"] == 0:
+            value = "失败（无损失）"
+        else:
+            value = f"失败 {worker['result']:.2f}"
+        worker_rows.append((name, value, worker["success"]))
+
+    buffs_text = " ".join(
+        f"{_BUFF_NAMES.get(buff, buff)}×{count}" for buff, count in results["buffs_used"].items()
+    ) or "无"
+    summary_rows = [
+        ("成功 / 失败:", f"{results['success_count']} / {results['failure_count']}", False),
+        ("道具消耗:", buffs_text, False),
+        ("总净收益:", f"{results['total_profit']:+.2f} Astr币", True),
+        ("当前Astr币:", f"{results['points_after']:.2f}", False),
+    ]
+    return {
+        "user_name": user_name,
+        "avatar_url": avatar_url,
+        "title": title,
+        "job_name": results["job_name"],
+        "worker_rows": worker_rows,
+        "summary_rows": summary_rows,
+    }
+
+
+@traced()
+async def generate_work_summary_card(
+    user_id: str,
+    user_name: str,
+    avatar_url: str,
+    results: Dict[str, Any],
+    title: Optional[str] = None
+) -> Optional[str]:
+    """
+    生成一键打工（全员）汇总卡片。
+
+    Args:
+        results: MarketManager.process_batch_work 的返回值
+
+    Returns:
+        图片路径，失败时返回None
+    """
+    data = _build_work_summary_data(user_name, avatar_url, results, title)
+    file_name = f"work_summary_{user_id}_{int(datetime.now().timestamp())}.png"
+    return await render_pillow(WORK_SUMMARY_LAYOUT, data, "work_cards", file_name)
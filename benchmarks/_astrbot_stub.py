@@ -0,0 +1,157 @@
+# feifeisupermarket/benchmarks/_astrbot_stub.py
+
+"""
+离线基准测试用的 AstrBot 替身。
+
+- install_astrbot_stub(): 在 sys.modules 中注册最小可用的 astrbot.api 等模块，
+  使插件代码无需安装 AstrBot 即可导入
+- load_plugin_package(): 将插件复制到临时目录后以独立包名导入，
+  生成的图片写入临时目录，不会污染仓库
+"""
+
+import importlib.util
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "astrsupermarket_bench"
+
+# 复制到临时目录的资源（数据目录与基准脚本本身不复制）
+_COPY_SKIP = {"data", "benchmarks", "__pycache__", ".git"}
+
+
+def _passthrough_decorator(*args, **kwargs):
+    """@filter.command(...) 之类的装饰器：原样返回被装饰的函数"""
+    def decorator(func):
+        return func
+    return decorator
+
+
+class _Filter:
+    """astrbot.api.event.filter 的替身"""
+
+    class EventMessageType:
+        GROUP_MESSAGE = "group_message"
+        PRIVATE_MESSAGE = "private_message"
+        ALL = "all"
+
+    class PermissionType:
+        ADMIN = "admin"
+        MEMBER = "member"
+
+    command = staticmethod(_passthrough_decorator)
+    command_group = staticmethod(_passthrough_decorator)
+    regex = staticmethod(_passthrough_decorator)
+    event_message_type = staticmethod(_passthrough_decorator)
+    permission_type = staticmethod(_passthrough_decorator)
+    platform_adapter_type = staticmethod(_passthrough_decorator)
+
+
+class _Star:
+    """astrbot.api.star.Star 的替身"""
+
+    def __init__(self, context=None):
+        self.context = context
+
+    async def html_render(self, tmpl, data, options=None):
+        raise RuntimeError("基准测试环境中没有无头浏览器")
+
+
+class _Component:
+    """消息组件的替身（At / Plain / Image 等）"""
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    @classmethod
+    def fromFileSystem(cls, path):
+        return cls(file=path)
+
+    @classmethod
+    def fromURL(cls, url):
+        return cls(url=url)
+
+
+def install_astrbot_stub():
+    """注册 astrbot 相关模块的替身（已安装真实 AstrBot 时不做任何事）"""
+    if "astrbot.api" in sys.modules:
+        return
+
+    def module(name, **attrs):
+        mod = types.ModuleType(name)
+        mod.__dict__.update(attrs)
+        sys.modules[name] = mod
+        return mod
+
+    logger = logging.getLogger("astrbot")
+    astrbot = module("astrbot")
+    api = module("astrbot.api", logger=logger, AstrBotConfig=dict)
+    api_event = module("astrbot.api.event", filter=_Filter, AstrMessageEvent=object, MessageChain=list)
+    api_star = module(
+        "astrbot.api.star", Star=_Star, Context=object,
+        register=lambda *args, **kwargs: (lambda cls: cls), StarTools=object
+    )
+    components = module(
+        "astrbot.api.message_components",
+        **{name: type(name, (_Component,), {}) for name in ("At", "Plain", "Image", "Reply", "Face", "Node")}
+    )
+    api_all = module("astrbot.api.all", logger=logger)
+    for source in (api_event, api_star, components):
+        api_all.__dict__.update({k: v for k, v in source.__dict__.items() if not k.startswith("__")})
+    core = module("astrbot.core")
+    core_utils = module("astrbot.core.utils")
+    session_waiter = module(
+        "astrbot.core.utils.session_waiter",
+        session_waiter=_passthrough_decorator, SessionController=object
+    )
+
+    astrbot.api, astrbot.core = api, core
+    api.event, api.star, api.message_components, api.all = api_event, api_star, components, api_all
+    core.utils = core_utils
+    core_utils.session_waiter = session_waiter
+
+
+def load_plugin_package(work_dir: str = None) -> types.ModuleType:
+    """
+    将插件复制到临时目录并作为包导入。
+
+    Args:
+        work_dir: 复制目标目录，缺省时新建临时目录
+
+    Returns:
+        插件包模块，子模块可通过 importlib.import_module(f"{PACKAGE_NAME}.xxx") 导入
+    """
+    install_astrbot_stub()
+    if PACKAGE_NAME in sys.modules:
+        return sys.modules[PACKAGE_NAME]
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix="astrsupermarket_bench_")
+    package_dir = os.path.join(work_dir, PACKAGE_NAME)
+    os.makedirs(package_dir, exist_ok=True)
+    for entry in os.listdir(PLUGIN_DIR):
+        if entry in _COPY_SKIP or entry.startswith("."):
+            continue
+        src = os.path.join(PLUGIN_DIR, entry)
+        dst = os.path.join(package_dir, entry)
+        if os.path.isdir(src):
+            shutil.copytree(src, dst, dirs_exist_ok=True)
+        else:
+            shutil.copy2(src, dst)
+
+    init_path = os.path.join(package_dir, "__init__.py")
+    if not os.path.exists(init_path):
+        open(init_path, "w").close()
+
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME, init_path, submodule_search_locations=[package_dir]
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = package
+    spec.loader.exec_module(package)
+    return package
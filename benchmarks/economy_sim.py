@@ -0,0 +1,472 @@
+# feifeisupermarket/benchmarks/economy_sim.py
+
+"""
+Astr币经济蒙特卡洛模拟（离线，需要 numpy）
+
+直接导入插件中的概率与奖励表：
+- 签到：qsin.DAILY_REWARD_RANGE / STREAK_BONUS_TIERS
+- 打工：market.JOBS
+- 抽奖：luck.LOTTERY_LEVELS / LOTTERY_REWARDS 及费用、次数上限与道具规则
+- 冒险：adventure_events.ADVENTURE_EVENTS（经 AdventureManager 编译后的事件类型分布）
+- 道具：shop_items.SHOP_DATA 中带 effect_buff 的道具（价格与效果）
+对大量虚拟玩家按天进行向量化模拟，报告：
+- 每种玩法单次的期望收益、标准差与方差
+- 每天的财富分布（均值、方差、分位数、基尼系数、前1%占比）
+
+模拟范围：只统计Astr币，不模拟奴隶买卖、赠送与社交消费；
+冒险获得的物品不计入Astr币，体力只来自初始体力、冒险事件与 --daily-stamina。
+
+用法（在插件目录下）：
+    python benchmarks/economy_sim.py
+    python benchmarks/economy_sim.py --players 200000 --days 90 --buff-rate 0.3
+    python benchmarks/economy_sim.py --job 搬砖 --csv wealth.csv --json summary.json
+"""
+
+import argparse
+import csv
+import importlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+try:
+    import numpy as np
+except ImportError:  # numpy 只是模拟器的依赖，插件本身不需要
+    np = None
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _astrbot_stub import PACKAGE_NAME, load_plugin_package  # noqa: E402
+
+# 以下规则在插件代码中以字面量出现，这里保持一致
+HIGH_RISK_JOB = "偷窃苏特尔的宝库"        # market.py：道具对该工作无效
+ADVENTURE_STAMINA_COST = 20               # adventure.py：每次冒险消耗体力
+CRISIS_EVENT_TYPE = "危机与挑战"          # adventure.py：探险家护符生效的事件类型
+
+SOURCES = ("签到", "打工", "抽奖", "冒险", "道具")
+PERCENTILES = (10, 50, 90, 99)
+
+
+def load_tables() -> dict:
+    """从插件模块中读取模拟所需的全部配置表"""
+    market = importlib.import_module(f"{PACKAGE_NAME}.market")
+    luck = importlib.import_module(f"{PACKAGE_NAME}.luck")
+    qsin = importlib.import_module(f"{PACKAGE_NAME}.qsin")
+    adventure = importlib.import_module(f"{PACKAGE_NAME}.adventure")
+    shop_items = importlib.import_module(f"{PACKAGE_NAME}.shop_items")
+
+    manager = adventure.AdventureManager()
+    buff_prices = {
+        item["effect_buff"]: item["price"]
+        for items in shop_items.SHOP_DATA.values() for item in items.values()
+        if "effect_buff" in item
+    }
+    return {
+        "jobs": market.JOBS,
+        "max_works": market.MAX_OWNED_MEMBERS,
+        "lottery_levels": luck.LOTTERY_LEVELS,
+        "lottery_rewards": luck.LOTTERY_REWARDS,
+        "lottery_cost": luck.LOTTERY_COST,
+        "lottery_daily_limit": luck.LOTTERY_DAILY_LIMIT,
+        "lottery_star_rank": luck.LOTTERY_STAR_RANK,
+        "lottery_low_levels": luck.LOTTERY_LOW_LEVELS,
+        "lottery_better_levels": luck.LOTTERY_BETTER_LEVELS,
+        "daily_reward_range": qsin.DAILY_REWARD_RANGE,
+        "streak_bonus_tiers": qsin.STREAK_BONUS_TIERS,
+        "adventure_events": manager.events,
+        "adventure_type_weights": dict(zip(manager._event_type_sampler.items, manager._event_type_sampler.weights)),
+        "adventure_boost_weights": dict(zip(manager._rare_boost_sampler.items, manager._rare_boost_sampler.weights)),
+        "buff_prices": buff_prices,
+    }
+
+
+def _as_range(value) -> tuple:
+    """效果数值统一为 (最小, 最大)"""
+    if isinstance(value, (list, tuple)):
+        return value[0], value[1]
+    return value, value
+
+
+def _effect_leaves(effects: dict) -> list:
+    """
+    将一个事件的效果展开为等概率的叶子：[(权重, 币下限, 币上限, 体力下限, 体力上限, 是否遣返)]
+    random_reward / random_penalty 中的每个选项各自成为一片叶子；
+    同一叶子中的多个数值效果按区间相加合并（现有事件表中不存在这种组合）。
+    """
+    base = [0, 0, 0, 0]
+    for key, offset in (("points", 0), ("stamina", 2)):
+        if key in effects:
+            lo, hi = _as_range(effects[key])
+            base[offset] += lo
+            base[offset + 1] += hi
+
+    leaves = [(1.0, base)]
+    for key in ("random_reward", "random_penalty"):
+        choices = effects.get(key)
+        if not choices:
+            continue
+        expanded = []
+        for weight, values in leaves:
+            for choice in choices:
+                values_copy = list(values)
+                if choice["type"] in ("points", "stamina"):
+                    offset = 0 if choice["type"] == "points" else 2
+                    lo, hi = _as_range(choice["value"])
+                    values_copy[offset] += lo
+                    values_copy[offset + 1] += hi
+                expanded.append((weight / len(choices), values_copy))
+        leaves = expanded
+
+    is_return = bool(effects.get("return"))
+    return [(weight, *values, is_return) for weight, values in leaves]
+
+
+def compile_adventure(events: dict, type_weights: dict) -> dict:
+    """
+    将冒险事件表展开为扁平的结果分布（每片叶子一个概率），供 searchsorted 批量抽样。
+    """
+    prob, points_lo, points_hi, stamina_lo, stamina_hi, is_return, is_crisis = [], [], [], [], [], [], []
+    for event_type, type_data in events.items():
+        type_weight = type_weights.get(event_type, 0.0)
+        if "outcomes" in type_data:
+            total = sum(o["probability"] for o in type_data["outcomes"].values())
+            branches = [(o["probability"] / total, o.get("effects", {})) for o in type_data["outcomes"].values()]
+        else:
+            branch_events = type_data["events"]
+            branches = [(1.0 / len(branch_events), e.get("effects", {})) for e in branch_events]
+
+        for branch_weight, effects in branches:
+            for leaf_weight, p_lo, p_hi, s_lo, s_hi, leaf_return in _effect_leaves(effects):
+                prob.append(type_weight * branch_weight * leaf_weight)
+                points_lo.append(p_lo)
+                points_hi.append(p_hi)
+                stamina_lo.append(s_lo)
+                stamina_hi.append(s_hi)
+                is_return.append(leaf_return)
+                is_crisis.append(event_type == CRISIS_EVENT_TYPE)
+
+    prob = np.asarray(prob, dtype=float)
+    cdf = np.cumsum(prob / prob.sum())
+    cdf[-1] = 1.0
+    return {
+        "cdf": cdf,
+        "points_lo": np.asarray(points_lo, dtype=np.int64),
+        "points_hi": np.asarray(points_hi, dtype=np.int64),
+        "stamina_lo": np.asarray(stamina_lo, dtype=np.int64),
+        "stamina_hi": np.asarray(stamina_hi, dtype=np.int64),
+        "is_return": np.asarray(is_return, dtype=bool),
+        "is_crisis": np.asarray(is_crisis, dtype=bool),
+    }
+
+
+def compile_lottery(tables: dict) -> dict:
+    """幸运数字 → 等级序号的直接索引表，以及各等级的奖励区间与星级"""
+    levels, rewards = tables["lottery_levels"], tables["lottery_rewards"]
+    names = list(levels.keys())
+    max_number = max(max(numbers) for numbers in levels.values())
+    number_to_level = np.full(max_number + 1, -1, dtype=np.int64)
+    for index, name in enumerate(names):
+        for number in levels[name]:
+            if number_to_level[number] < 0:
+                number_to_level[number] = index
+    return {
+        "max_number": max_number,
+        "number_to_level": number_to_level,
+        "reward_lo": np.asarray([rewards[name][0] for name in names], dtype=np.int64),
+        "reward_hi": np.asarray([rewards[name][1] for name in names], dtype=np.int64),
+        "rank": np.asarray([tables["lottery_star_rank"].get(name, 0) for name in names], dtype=np.int64),
+        "is_low": np.asarray([name in tables["lottery_low_levels"] for name in names], dtype=bool),
+        "better": np.asarray([names.index(name) for name in tables["lottery_better_levels"]], dtype=np.int64),
+    }
+
+
+def compile_jobs(jobs: dict) -> dict:
+    """工作表转为按工作序号索引的数组"""
+    names = list(jobs.keys())
+    reward = [_as_range(jobs[name]["reward"]) for name in names]
+    risk = [_as_range(jobs[name]["risk_cost"]) for name in names]
+    return {
+        "names": names,
+        "success_rate": np.asarray([jobs[name]["success_rate"] for name in names], dtype=float),
+        "reward_lo": np.asarray([r[0] for r in reward], dtype=float),
+        "reward_hi": np.asarray([r[1] for r in reward], dtype=float),
+        "risk_lo": np.asarray([r[0] for r in risk], dtype=float),
+        "risk_hi": np.asarray([r[1] for r in risk], dtype=float),
+        "high_risk": np.asarray([name == HIGH_RISK_JOB for name in names], dtype=bool),
+    }
+
+
+class _Accumulator:
+    """按玩法累计单次收益的和与平方和，用于计算期望与方差"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def add(self, values):
+        self.count += int(values.size)
+        self.total += float(values.sum())
+        self.total_sq += float(np.square(values, dtype=float).sum())
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {"count": 0, "mean": 0.0, "variance": 0.0, "std": 0.0}
+        mean = self.total / self.count
+        variance = max(self.total_sq / self.count - mean * mean, 0.0)
+        return {"count": self.count, "mean": mean, "variance": variance, "std": variance ** 0.5}
+
+
+def _consume(buffs: dict, name: str, mask):
+    """对 mask 中持有该道具效果的玩家消耗一次效果，返回实际生效的 mask"""
+    active = mask & (buffs[name] > 0)
+    buffs[name] -= active
+    return active
+
+
+def _uniform_int(rng, lo, hi):
+    """逐元素在 [lo, hi] 闭区间内取随机整数"""
+    return lo + np.floor(rng.random(lo.shape) * (hi - lo + 1)).astype(np.int64)
+
+
+def _wealth_distribution(points) -> dict:
+    """当天的财富分布：均值、方差、分位数、基尼系数（负数按0计）、前1%占比"""
+    sorted_points = np.sort(points)
+    n = sorted_points.size
+    clipped = np.clip(sorted_points, 0, None)
+    total = clipped.sum()
+    gini = 0.0
+    top1_share = 0.0
+    if total > 0:
+        ranks = np.arange(1, n + 1)
+        gini = float((2 * ranks - n - 1).dot(clipped) / (n * total))
+        top1_share = float(clipped[-max(n // 100, 1):].sum() / total)
+    row = {
+        "mean": float(sorted_points.mean()),
+        "variance": float(sorted_points.var()),
+        "supply": float(sorted_points.sum()),
+        "gini": gini,
+        "top1_share": top1_share,
+    }
+    deciles = np.percentile(sorted_points, list(range(0, 101, 10)))
+    for pct in PERCENTILES:
+        row[f"p{pct}"] = float(np.percentile(sorted_points, pct))
+    row["deciles"] = [float(v) for v in deciles]
+    return row
+
+
+def simulate(tables: dict, players: int = 100000, days: int = 30, seed: int = 0,
+             sign_rate: float = 0.9, works: int = 3, job: str = None, lotteries: int = 3,
+             adventures: int = 2, buff_rate: float = 0.2, initial_points: float = 0.0,
+             initial_stamina: int = 100, daily_stamina: int = 0) -> dict:
+    """
+    按天模拟 players 个玩家，每天依次：购买道具 → 签到 → 打工 → 抽奖 → 冒险。
+
+    Args:
+        buff_rate: 每位玩家每天购买每种相关道具（各一个）的概率，道具效果按插件规则消耗
+        job: 固定工作名称，缺省时每次打工随机选择一项工作
+
+    Returns:
+        dict: {"sources": 各玩法单次收益统计, "days": 每天的财富分布}
+    """
+    rng = np.random.default_rng(seed)
+    job_table = compile_jobs(tables["jobs"])
+    lottery = compile_lottery(tables)
+    adventure = compile_adventure(tables["adventure_events"], tables["adventure_type_weights"])
+    adventure_boost = compile_adventure(tables["adventure_events"], tables["adventure_boost_weights"])
+    reward_lo, reward_hi = tables["daily_reward_range"]
+    works = min(works, tables["max_works"])
+    lotteries = min(lotteries, tables["lottery_daily_limit"])
+    lottery_cost = tables["lottery_cost"]
+    job_index = job_table["names"].index(job) if job else None
+
+    points = np.full(players, float(initial_points))
+    stamina = np.full(players, int(initial_stamina), dtype=np.int64)
+    streak = np.zeros(players, dtype=np.int64)
+    buffs = {name: np.zeros(players, dtype=np.int64) for name in tables["buff_prices"]}
+    plays = {"work_": works, "lottery_": lotteries, "adventure_": adventures}
+    sources = {name: _Accumulator() for name in SOURCES}
+    daily = []
+
+    for day in range(1, days + 1):
+        points_before = points.copy()
+
+        # 1. 购买道具（只购买当天会用到的玩法的道具）
+        for name, price in tables["buff_prices"].items():
+            if not any(plays[prefix] for prefix in plays if name.startswith(prefix)):
+                continue
+            buy = (rng.random(players) < buff_rate) & (points >= price)
+            buffs[name] += buy
+            points -= np.where(buy, price, 0)
+            sources["道具"].add(-np.full(int(buy.sum()), float(price)))
+
+        # 2. 签到
+        signed = rng.random(players) < sign_rate
+        streak = np.where(signed, streak + 1, 0)
+        bonus = np.zeros(players, dtype=np.int64)
+        for min_days, tier_bonus in reversed(tables["streak_bonus_tiers"]):
+            bonus[streak >= min_days] = tier_bonus
+        sign_reward = rng.integers(reward_lo, reward_hi + 1, players) + bonus
+        points += np.where(signed, sign_reward, 0)
+        sources["签到"].add(sign_reward[signed])
+
+        # 3. 打工
+        for _ in range(works):
+            j = np.full(players, job_index) if job_index is not None else rng.integers(len(job_table["names"]), size=players)
+            normal_job = ~job_table["high_risk"][j]
+            guaranteed = _consume(buffs, "work_guarantee_success", normal_job)
+            success = guaranteed | (rng.random(players) < job_table["success_rate"][j])
+
+            reward = rng.uniform(job_table["reward_lo"][j], job_table["reward_hi"][j])
+            boosted = _consume(buffs, "work_reward_boost", success & normal_job)
+            reward = np.where(boosted, reward * (1 + rng.uniform(0.01, 0.5, players)), reward)
+
+            protected = _consume(buffs, "work_no_penalty", ~success & normal_job)
+            risk = np.where(protected, 0.0, rng.uniform(job_table["risk_lo"][j], job_table["risk_hi"][j]))
+
+            delta = np.round(np.where(success, reward, -risk), 2)
+            points += delta
+            sources["打工"].add(delta)
+
+        # 4. 抽奖
+        for _ in range(lotteries):
+            play = points >= lottery_cost
+            min_3star = _consume(buffs, "lottery_min_3star", play)
+            double = _consume(buffs, "lottery_double_reward", play)
+            best_of_two = _consume(buffs, "lottery_best_of_two", play)
+
+            draws = []
+            for _draw in range(2):
+                level = lottery["number_to_level"][rng.integers(1, lottery["max_number"] + 1, players)]
+                upgrade = min_3star & lottery["is_low"][level]
+                level = np.where(upgrade, lottery["better"][rng.integers(len(lottery["better"]), size=players)], level)
+                draws.append(level)
+            level = np.where(best_of_two & (lottery["rank"][draws[1]] > lottery["rank"][draws[0]]), draws[1], draws[0])
+
+            reward = _uniform_int(rng, lottery["reward_lo"][level], lottery["reward_hi"][level])
+            reward = np.where(double, reward * 2, reward)
+            delta = np.where(play, reward - lottery_cost, 0)
+            points += delta
+            sources["抽奖"].add(delta[play].astype(float))
+
+        # 5. 冒险（与 run_adventures 一致：体力在全部冒险结束后统一扣除，遣返事件中断后续冒险）
+        stamina += daily_stamina
+        times = np.minimum(adventures, np.maximum(stamina, 0) // ADVENTURE_STAMINA_COST)
+        running = times > 0
+        ran = np.zeros(players, dtype=np.int64)
+        points_gain = np.zeros(players, dtype=np.int64)
+        stamina_gain = np.zeros(players, dtype=np.int64)
+        for k in range(adventures):
+            active = running & (k < times)
+            if not active.any():
+                break
+            boosted = _consume(buffs, "adventure_rare_boost", active)
+            u = rng.random(players)
+            leaf = np.where(
+                boosted,
+                np.searchsorted(adventure_boost["cdf"], u, side="right"),
+                np.searchsorted(adventure["cdf"], u, side="right"),
+            )
+            negated = _consume(buffs, "adventure_negate_crisis", active & adventure["is_crisis"][leaf])
+            effective = active & ~negated
+
+            event_points = np.where(effective, _uniform_int(rng, adventure["points_lo"][leaf], adventure["points_hi"][leaf]), 0)
+            points_gain += event_points
+            stamina_gain += np.where(effective, _uniform_int(rng, adventure["stamina_lo"][leaf], adventure["stamina_hi"][leaf]), 0)
+            ran += active
+            running &= ~(effective & adventure["is_return"][leaf])
+            sources["冒险"].add(event_points[active].astype(float))
+        points += points_gain
+        stamina += stamina_gain - ran * ADVENTURE_STAMINA_COST
+
+        row = _wealth_distribution(points)
+        row["day"] = day
+        row["net_inflow"] = float((points - points_before).mean())
+        daily.append(row)
+
+    return {
+        "sources": {name: acc.summary() for name, acc in sources.items()},
+        "days": daily,
+    }
+
+
+def _print_report(result: dict, args, elapsed: float):
+    print(f"玩家 {args.players}，{args.days} 天，耗时 {elapsed:.2f}s\n")
+    print(f"{'玩法':<6}{'次数':>12}{'期望':>10}{'标准差':>10}{'方差':>12}")
+    for name, stats in result["sources"].items():
+        print(f"{name:<6}{stats['count']:>12}{stats['mean']:>10.2f}{stats['std']:>10.2f}{stats['variance']:>12.2f}")
+
+    days = result["days"]
+    step = max(len(days) // 20, 1)
+    shown = days[::step] if days[-1] in days[::step] else days[::step] + [days[-1]]
+    print(f"\n{'天':>4}{'均值':>10}{'方差':>12}{'日净流入':>10}" + "".join(f"{'p' + str(p):>9}" for p in PERCENTILES) + f"{'基尼':>7}{'前1%':>7}")
+    for row in shown:
+        print(
+            f"{row['day']:>4}{row['mean']:>10.1f}{row['variance']:>12.1f}{row['net_inflow']:>10.2f}"
+            + "".join(f"{row['p' + str(p)]:>9.1f}" for p in PERCENTILES)
+            + f"{row['gini']:>7.3f}{row['top1_share']:>7.1%}"
+        )
+
+
+def _write_csv(path: str, days: list):
+    """每天一行：分布统计 + 0~100 分位的财富曲线"""
+    deciles = [f"d{p}" for p in range(0, 101, 10)]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["day", "mean", "variance", "net_inflow", "supply", "gini", "top1_share"] + deciles)
+        for row in days:
+            writer.writerow(
+                [row["day"], row["mean"], row["variance"], row["net_inflow"], row["supply"], row["gini"], row["top1_share"]]
+                + row["deciles"]
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Astr币经济蒙特卡洛模拟")
+    parser.add_argument("--players", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sign-rate", type=float, default=0.9, help="每天签到的概率")
+    parser.add_argument("--works", type=int, default=3, help="每天打工次数（不超过可拥有的群友数量）")
+    parser.add_argument("--job", help="固定工作名称，缺省时随机选择")
+    parser.add_argument("--lotteries", type=int, default=3, help="每天抽奖次数")
+    parser.add_argument("--adventures", type=int, default=2, help="每天冒险次数（受体力限制）")
+    parser.add_argument("--buff-rate", type=float, default=0.2, help="每天购买每种相关道具的概率")
+    parser.add_argument("--initial-points", type=float, default=0.0)
+    parser.add_argument("--initial-stamina", type=int, default=100)
+    parser.add_argument("--daily-stamina", type=int, default=0, help="每天额外恢复的体力（模拟食物）")
+    parser.add_argument("--csv", metavar="PATH", help="将每天的财富分布曲线写入CSV")
+    parser.add_argument("--json", metavar="PATH", help="将完整结果写入JSON")
+    args = parser.parse_args()
+
+    if np is None:
+        print("经济模拟需要 numpy：pip install numpy", file=sys.stderr)
+        return 1
+
+    with tempfile.TemporaryDirectory(prefix="astrsupermarket_sim_") as work_dir:
+        load_plugin_package(work_dir)
+        tables = load_tables()
+    if args.job and args.job not in tables["jobs"]:
+        parser.error(f"未知的工作：{args.job}（可选：{'、'.join(tables['jobs'])}）")
+
+    start = time.perf_counter()
+    result = simulate(
+        tables, players=args.players, days=args.days, seed=args.seed, sign_rate=args.sign_rate,
+        works=args.works, job=args.job, lotteries=args.lotteries, adventures=args.adventures,
+        buff_rate=args.buff_rate, initial_points=args.initial_points,
+        initial_stamina=args.initial_stamina, daily_stamina=args.daily_stamina,
+    )
+    elapsed = time.perf_counter() - start
+
+    _print_report(result, args, elapsed)
+    if args.csv:
+        _write_csv(args.csv, result["days"])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,494 @@
+# feifeisupermarket/benchmarks/load_harness.py
+
+"""
+整个插件的合成负载测试与回放
+
+不需要 QQ 连接：以替身代替 astrbot.api，用伪造的 AstrMessageEvent / Context 直接调用
+SignPlugin 的指令处理函数（get_group_member_info、event.send、html_render 均为替身）。
+按配置生成负载：大量用户分布在多个群中（活跃度按幂律分布），按权重混合发出
+签到、抽奖、冒险、赠送、购买、排行榜等指令，并报告：
+- 吞吐量（指令/秒）
+- 各指令与整体的延迟 p50 / p95 / p99（毫秒）与出错次数
+- 内存增长（RSS 与 tracemalloc 当前分配，按进度采样）
+- 插件内部的保存与名称查询耗时（来自 metrics.py）
+
+负载由 --seed 决定，插件的随机流使用同一种子；--record 保存指令序列与插件随机数，
+--replay 按录制结果原样重放（并发为1时结果完全一致），便于离线复现热点路径的退化。
+
+用法（在插件目录下）：
+    python benchmarks/load_harness.py
+    python benchmarks/load_harness.py --users 5000 --groups 300 --ops 20000 --concurrency 16
+    python benchmarks/load_harness.py --mix 签到=5 抽奖=3 排行榜=1 --render pillow -v
+    python benchmarks/load_harness.py --record run.json.gz
+    python benchmarks/load_harness.py --replay run.json.gz --baseline base.json
+对比模式下，若整体或任一指令的 p95 比基线慢超过阈值，则以退出码 1 结束。
+"""
+
+import argparse
+import asyncio
+import gzip
+import importlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import traceback
+import tracemalloc
+import types
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _astrbot_stub import PACKAGE_NAME, load_plugin_package  # noqa: E402
+
+SELF_ID = "10000"
+GROUP_ID_BASE = 700000000
+USER_ID_BASE = 100000000
+NAMES = ["小明", "Alice", "妃爱", "一个名字特别特别长的群友", "Bob", "测试用户", "路人甲", "猫猫", "Zed", "夜空"]
+
+# 默认指令权重
+DEFAULT_MIX = {"签到": 4, "抽奖": 3, "冒险": 2, "赠送": 1, "购买": 1, "排行榜": 1}
+LEADERBOARD_TYPES = ["财富", "签到", "欧皇"]
+ACTIVITY_EXPONENT = 0.8  # 用户活跃度的幂律指数
+MEMORY_SAMPLES = 10  # 内存采样次数
+
+
+# ---------------------------------------------------------------------------
+# 伪造的事件与上下文
+# ---------------------------------------------------------------------------
+
+class FakeResult:
+    """plain_result / image_result 的返回值"""
+
+    def __init__(self, kind: str, payload):
+        self.kind = kind
+        self.chain = [payload]
+
+
+class FakeApi:
+    """协议端 API 替身：get_group_member_info 返回按用户ID生成的群名片"""
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    async def call_action(self, action: str, **params):
+        self.stats["api_calls"] += 1
+        if action == "get_group_member_info":
+            user_id = int(params["user_id"])
+            return {"card": f"{NAMES[user_id % len(NAMES)]}{user_id % 1000}", "nickname": str(user_id)}
+        return {}
+
+
+class FakeEvent:
+    """
+    AstrMessageEvent 替身，实现插件用到的全部方法。
+    同时注册为 AiocqhttpMessageEvent，使 get_user_name 走群名片查询路径。
+    """
+
+    def __init__(self, api: FakeApi, sent: list, group_id: str, sender_id: str,
+                 message_str: str, at_ids=()):
+        self.bot = types.SimpleNamespace(api=api)
+        self._sent = sent
+        self._group_id = group_id
+        self._sender_id = sender_id
+        self.message_str = message_str
+        self.unified_msg_origin = f"aiocqhttp:GroupMessage:{group_id}"
+        self._messages = [_components().At(qq=SELF_ID)] + [_components().At(qq=at_id) for at_id in at_ids]
+        self.stopped = False
+
+    def get_group_id(self):
+        return self._group_id
+
+    def get_sender_id(self):
+        return self._sender_id
+
+    def get_sender_name(self):
+        return f"{NAMES[int(self._sender_id) % len(NAMES)]}{int(self._sender_id) % 1000}"
+
+    def get_self_id(self):
+        return SELF_ID
+
+    def get_platform_name(self):
+        return "aiocqhttp"
+
+    def get_messages(self):
+        return self._messages
+
+    def plain_result(self, text):
+        return FakeResult("plain", text)
+
+    def image_result(self, path):
+        return FakeResult("image", path)
+
+    def chain_result(self, chain):
+        return FakeResult("chain", chain)
+
+    def make_result(self):
+        return FakeResult("chain", None)
+
+    def stop_event(self):
+        self.stopped = True
+
+    async def send(self, message):
+        self._sent.append(message)
+
+
+class FakeContext:
+    """Star 的 Context 替身，记录主动发送的消息"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, origin, chain):
+        self.sent.append((origin, chain))
+        return True
+
+
+def _components():
+    return importlib.import_module("astrbot.api.message_components")
+
+
+def install_platform_stub():
+    """注册 aiocqhttp 事件类型的替身，使插件中的 isinstance 判断命中 FakeEvent"""
+    name = "astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event"
+    parts = name.split(".")
+    for i in range(2, len(parts) + 1):
+        sys.modules.setdefault(".".join(parts[:i]), types.ModuleType(".".join(parts[:i])))
+    sys.modules[name].AiocqhttpMessageEvent = FakeEvent
+
+
+# ---------------------------------------------------------------------------
+# 负载生成
+# ---------------------------------------------------------------------------
+
+def build_population(users: int, groups: int, rng: random.Random) -> dict:
+    """为每个群分配成员，返回 {"members": {群: [用户]}, "actors": [(群, 用户)], "weights": 累积权重}"""
+    members = {str(GROUP_ID_BASE + g): [] for g in range(groups)}
+    group_ids = list(members)
+    for u in range(users):
+        user_id = str(USER_ID_BASE + u)
+        # 每个用户加入1~3个群
+        for group_id in rng.sample(group_ids, min(len(group_ids), rng.choice((1, 1, 1, 2, 3)))):
+            members[group_id].append(user_id)
+
+    actors = [(group_id, user_id) for group_id, ids in members.items() for user_id in ids]
+    rng.shuffle(actors)
+    cumulative, total = [], 0.0
+    for rank in range(len(actors)):
+        total += 1.0 / (rank + 1) ** ACTIVITY_EXPONENT
+        cumulative.append(total)
+    return {"members": members, "actors": actors, "weights": cumulative}
+
+
+def generate_ops(population: dict, mix: dict, count: int, rng: random.Random) -> list:
+    """生成指令序列 [{"command", "group_id", "user_id", "target_id", "arg"}]"""
+    commands = list(mix)
+    command_weights = [mix[c] for c in commands]
+    actors, weights, members = population["actors"], population["weights"], population["members"]
+    ops = []
+    for _ in range(count):
+        command = rng.choices(commands, command_weights)[0]
+        group_id, user_id = rng.choices(actors, cum_weights=weights)[0]
+        op = {"command": command, "group_id": group_id, "user_id": user_id, "target_id": None, "arg": None}
+        if command in ("赠送", "购买"):
+            others = [m for m in members[group_id] if m != user_id]
+            if not others:
+                op["command"] = command = "签到"
+            else:
+                op["target_id"] = rng.choice(others)
+        if command == "赠送":
+            op["arg"] = rng.choice((1, 5, 10, 20, 50))
+        elif command == "冒险":
+            op["arg"] = rng.choice((1, 1, 1, 2, 5))
+        elif command == "排行榜":
+            op["arg"] = rng.choice(LEADERBOARD_TYPES)
+        ops.append(op)
+    return ops
+
+
+def _invoke(plugin, op: dict, api: FakeApi, sent: list):
+    """把一条指令转换为对处理函数的调用，返回异步生成器"""
+    command, arg, target = op["command"], op["arg"], op["target_id"]
+    at_ids = (target,) if target else ()
+    message = command if arg is None else f"{command} {arg}"
+    event = FakeEvent(api, sent, op["group_id"], op["user_id"], message, at_ids)
+    if command == "签到":
+        return plugin.sign_in(event)
+    if command == "抽奖":
+        return plugin.lottery(event)
+    if command == "冒险":
+        return plugin.adventure(event, arg)
+    if command == "赠送":
+        return plugin.gift_points(event)
+    if command == "购买":
+        return plugin.buy_member(event)
+    if command == "排行榜":
+        return plugin.show_leaderboard(event, arg)
+    raise ValueError(f"未知指令: {command}")
+
+
+# ---------------------------------------------------------------------------
+# 运行与统计
+# ---------------------------------------------------------------------------
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def _latency_summary(timings: list) -> dict:
+    return {
+        "count": len(timings),
+        "p50_ms": round(_percentile(timings, 0.5) * 1000, 2),
+        "p95_ms": round(_percentile(timings, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(timings, 0.99) * 1000, 2),
+    }
+
+
+async def run_load(ops: list, args, rng_recording: dict = None) -> dict:
+    """创建插件实例并执行指令序列"""
+    main_module = importlib.import_module(f"{PACKAGE_NAME}.main")
+    rng_module = importlib.import_module(f"{PACKAGE_NAME}.rng")
+    metrics_module = importlib.import_module(f"{PACKAGE_NAME}.metrics")
+    process_rss_mb = importlib.import_module(f"{PACKAGE_NAME}.memory_inspector").process_rss_mb
+
+    # 插件的随机流：回放时使用录制结果，否则使用与负载相同的种子（录制时开启录制模式）
+    main_module.RNG_SEED = args.seed
+    # 慢指令分段日志默认关闭，避免负载下刷屏
+    main_module.SLOW_TRACE_THRESHOLD_SECONDS = args.slow_trace if args.slow_trace is not None else float("inf")
+    if rng_recording is not None:
+        main_module.RNGService = lambda seed=None, record=False: rng_module.RNGService.from_recording(rng_recording)
+    else:
+        main_module.RNGService = lambda seed=None, record=False: rng_module.RNGService(seed, record=bool(args.record))
+
+    context = FakeContext()
+    plugin = main_module.SignPlugin(context)
+    resource_dir = os.path.join(plugin.plugin_dir, "resource")
+    stub_image = os.path.join(resource_dir, sorted(os.listdir(resource_dir))[0])
+
+    async def fake_html_render(tmpl, data, options=None):
+        if args.render == "pillow":
+            raise RuntimeError("load harness: HTML渲染已禁用")
+        return stub_image
+    plugin.html_render = fake_html_render
+
+    async def no_avatar(user_id):
+        return None  # 不访问网络，使用默认头像
+    importlib.import_module(f"{PACKAGE_NAME}._generate_card").get_avatar = no_avatar
+
+    if args.render == "skip":
+        async def skip_render(group_id, priority, func, *a, **kw):
+            return None  # 所有卡片回退到文本回复，只测逻辑与存储
+        plugin.render_scheduler.submit = plugin.render_scheduler.submit_or_raise = skip_render
+
+    metrics_module.metrics.reset()
+    api_stats = {"api_calls": 0}
+    api = FakeApi(api_stats)
+    sent = []
+    timings = {}
+    errors = {}
+    first_tracebacks = {}
+    replies = 0
+    memory = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_op(op: dict):
+        nonlocal replies
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                async for _ in _invoke(plugin, op, api, sent):
+                    replies += 1
+            except Exception as e:
+                kind = type(e).__name__
+                command_errors = errors.setdefault(op["command"], {})
+                command_errors[kind] = command_errors.get(kind, 0) + 1
+                first_tracebacks.setdefault((op["command"], kind), traceback.format_exc())
+            timings.setdefault(op["command"], []).append(time.perf_counter() - start)
+
+    def sample_memory(done: int):
+        current = tracemalloc.get_traced_memory()[0] / (1024 * 1024) if args.tracemalloc else None
+        memory.append({"ops": done, "rss_mb": round(process_rss_mb(), 1),
+                       "traced_mb": None if current is None else round(current, 1)})
+
+    rss_before = process_rss_mb()
+    sample_every = max(1, len(ops) // MEMORY_SAMPLES)
+    batch_size = args.concurrency * 4
+    next_sample = 0
+    started = time.perf_counter()
+    for offset in range(0, len(ops), batch_size):
+        if offset >= next_sample:
+            sample_memory(offset)
+            next_sample += sample_every
+        await asyncio.gather(*(run_op(op) for op in ops[offset:offset + batch_size]))
+    elapsed = time.perf_counter() - started
+    rss_after = process_rss_mb()
+
+    recording = plugin.rng.get_recording() if args.record else None
+    storage = metrics_module.metrics.summary("storage") + metrics_module.metrics.summary("name")
+    data_sizes = {
+        name: round(os.path.getsize(os.path.join(plugin.data_dir, name)) / 1024, 1)
+        for name in sorted(os.listdir(plugin.data_dir)) if name.endswith(".yaml")
+    }
+    await plugin.terminate()
+
+    all_timings = [t for values in timings.values() for t in values]
+    return {
+        "ops": len(ops),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ops": round(len(ops) / elapsed, 1) if elapsed else 0.0,
+        "replies": replies,
+        "proactive_sends": len(sent) + len(context.sent),
+        "api_calls": api_stats["api_calls"],
+        "overall": _latency_summary(all_timings),
+        "commands": {command: _latency_summary(values) for command, values in sorted(timings.items())},
+        "errors": errors,
+        "tracebacks": {f"{command}:{kind}": text for (command, kind), text in first_tracebacks.items()},
+        "memory": {"rss_before_mb": round(rss_before, 1), "rss_after_mb": round(rss_after, 1),
+                   "rss_growth_mb": round(rss_after - rss_before, 1), "samples": memory},
+        "internal": [
+            {"name": f"{row['category']}:{row['name']}", "count": row["count"],
+             "avg_ms": round(row["avg"] * 1000, 2), "total_s": round(row["total"], 3)}
+            for row in storage
+        ],
+        "data_kb": data_sizes,
+        "rng_recording": recording,
+    }
+
+
+def _print_report(result: dict, verbose: bool = False):
+    print(f"\n指令数 {result['ops']}，耗时 {result['elapsed_s']:.2f}s，"
+          f"吞吐量 {result['throughput_ops']:.1f} 条/秒，回复 {result['replies']} 条，"
+          f"群名片查询 {result['api_calls']} 次")
+    print(f"\n{'command':<10}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    rows = list(result["commands"].items()) + [("overall", result["overall"])]
+    for command, stats in rows:
+        error_count = sum(result["errors"].get(command, {}).values()) if command != "overall" else \
+            sum(sum(e.values()) for e in result["errors"].values())
+        print(f"{command:<10}{stats['count']:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+              f"{stats['p99_ms']:>10.1f}{error_count:>8}")
+    for command, kinds in result["errors"].items():
+        print(f"  {command} 出错: {kinds}")
+    if verbose:
+        for key, text in result["tracebacks"].items():
+            print(f"\n首次出错 {key}:\n{text}")
+
+    memory = result["memory"]
+    print(f"\nRSS {memory['rss_before_mb']:.1f} MB → {memory['rss_after_mb']:.1f} MB"
+          f"（增长 {memory['rss_growth_mb']:+.1f} MB）")
+    for sample in memory["samples"]:
+        traced = f"，tracemalloc {sample['traced_mb']:.1f} MB" if sample["traced_mb"] is not None else ""
+        print(f"  第 {sample['ops']:>7} 条: RSS {sample['rss_mb']:.1f} MB{traced}")
+
+    if result["internal"]:
+        print("\n插件内部耗时（按总耗时）：")
+        for row in result["internal"]:
+            print(f"  {row['name']:<28}{row['count']:>8} 次  平均 {row['avg_ms']:>8.2f} ms  合计 {row['total_s']:>8.2f} s")
+    print(f"\n数据文件大小 (KB): {result['data_kb']}")
+
+
+def _compare(result: dict, baseline: dict, threshold: float) -> bool:
+    """打印与基线的对比，返回是否存在超过阈值的退化"""
+    regressed = False
+    print(f"\n{'command':<10}{'base p95':>10}{'now p95':>10}{'delta':>9}")
+    rows = list(result["commands"].items()) + [("overall", result["overall"])]
+    base_rows = dict(baseline.get("commands", {}), overall=baseline.get("overall", {}))
+    for command, stats in rows:
+        base = base_rows.get(command)
+        if not base or not base.get("p95_ms"):
+            continue
+        delta = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"]
+        flag = ""
+        if delta > threshold:
+            regressed = True
+            flag = "  <-- regression"
+        print(f"{command:<10}{base['p95_ms']:>10.1f}{stats['p95_ms']:>10.1f}{delta:>+8.0%}{flag}")
+    return regressed
+
+
+def _parse_mix(items) -> dict:
+    if not items:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for item in items:
+        command, _, weight = item.partition("=")
+        if command not in DEFAULT_MIX:
+            raise SystemExit(f"不支持的指令: {command}（可选: {'、'.join(DEFAULT_MIX)}）")
+        mix[command] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="插件整体合成负载测试")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--ops", type=int, default=5000, help="发出的指令总数")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时处理的指令数量")
+    parser.add_argument("--mix", nargs="+", metavar="指令=权重", help="指令权重，如 签到=4 抽奖=3")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--render", choices=("skip", "html", "pillow"), default="skip",
+                        help="skip: 卡片全部回退为文本（默认）；html: 经过渲染调度，html_render 立即返回现成图片；"
+                             "pillow: HTML渲染一律失败，实际绘制 Pillow 卡片")
+    parser.add_argument("--slow-trace", type=float, metavar="SECONDS", help="输出超过该耗时的指令分段明细")
+    parser.add_argument("-v", "--verbose", action="store_true", help="打印每种错误首次出现时的调用栈")
+    parser.add_argument("--tracemalloc", action="store_true", help="同时记录 Python 分配的内存（较慢）")
+    parser.add_argument("--record", metavar="PATH", help="保存指令序列与插件随机数（gzip JSON）")
+    parser.add_argument("--replay", metavar="PATH", help="重放 --record 保存的结果")
+    parser.add_argument("--json", metavar="PATH", help="将完整结果写入JSON")
+    parser.add_argument("--save-baseline", metavar="PATH", help="将结果保存为基线")
+    parser.add_argument("--baseline", metavar="PATH", help="与基线对比")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 退化阈值（比例）")
+    args = parser.parse_args()
+
+    rng_recording = None
+    if args.replay:
+        with gzip.open(args.replay, "rt", encoding="utf-8") as f:
+            recorded = json.load(f)
+        ops, rng_recording = recorded["ops"], recorded["rng"]
+        args.seed = recorded.get("seed", args.seed)
+        print(f"重放 {args.replay}：{len(ops)} 条指令")
+    else:
+        rng = random.Random(args.seed)
+        population = build_population(args.users, args.groups, rng)
+        ops = generate_ops(population, _parse_mix(args.mix), args.ops, rng)
+        print(f"生成负载：{args.users} 个用户，{args.groups} 个群，{len(ops)} 条指令，并发 {args.concurrency}")
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    with tempfile.TemporaryDirectory(prefix="astrsupermarket_load_") as work_dir:
+        load_plugin_package(work_dir)
+        install_platform_stub()
+        result = asyncio.run(run_load(ops, args, rng_recording))
+
+    _print_report(result, args.verbose)
+
+    if args.record:
+        with gzip.open(args.record, "wt", encoding="utf-8") as f:
+            json.dump({"seed": args.seed, "ops": ops, "rng": result["rng_recording"]}, f,
+                      ensure_ascii=False, separators=(",", ":"))
+        print(f"\n指令序列与随机数已保存到 {args.record}")
+    result.pop("rng_recording", None)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"created_at": datetime.now().isoformat(timespec="seconds"), **result},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if _compare(result, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
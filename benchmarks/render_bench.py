@@ -0,0 +1,300 @@
+# feifeisupermarket/benchmarks/render_bench.py
+
+"""
+卡片生成基准测试
+
+离线运行所有 Pillow 卡片生成函数（以替身代替 astrbot.api，头像使用本地图片预取），
+为每个生成函数报告：
+- 耗时 p50 / p95（毫秒）
+- 进程峰值内存 RSS（MB，每个生成函数在独立子进程中运行）
+- 输出图片大小（KB）
+
+用法（在插件目录下）：
+    python benchmarks/render_bench.py                       # 运行全部
+    python benchmarks/render_bench.py --only sign_card backpack
+    python benchmarks/render_bench.py --save-baseline base.json
+    python benchmarks/render_bench.py --baseline base.json --threshold 0.2
+对比模式下，若任一生成函数的 p95 比基线慢超过阈值，则以退出码 1 结束。
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _astrbot_stub import PACKAGE_NAME, load_plugin_package  # noqa: E402
+
+AVATAR_URL = "http://bench.local/avatar.png"
+NAMES = ["小明", "Alice", "妃爱", "一个名字特别特别长的群友", "Bob", "测试用户", "路人甲", "猫猫", "Zed", "夜空"]
+
+
+def _user(rng: random.Random, i: int) -> dict:
+    return {"id": str(10000 + i), "name": NAMES[i % len(NAMES)], "value": rng.randint(0, 99999)}
+
+
+def _sign_card(pkg, rng):
+    return {
+        "user_id": "10001", "user_name": "妃爱", "avatar_url": AVATAR_URL,
+        "total_days": 123, "streak_days": 8, "daily_reward": 25, "streak_bonus": 50,
+        "total_points": 4321.5, "sign_time": "2024-01-01 08:00:00", "title": "签到达人",
+    }
+
+
+def _market_status(pkg, rng):
+    return {
+        "user_id": "10001", "user_name": "妃爱", "avatar_url": AVATAR_URL, "card_type": "status",
+        "card_data": {
+            "owner_id": "10002", "owner_name": "Alice", "has_worked_for_owner": False,
+            "owned_members": [{"name": NAMES[i], "has_worked": i % 2 == 0} for i in range(3)],
+        },
+        "title": "商城大亨",
+    }
+
+
+def _leaderboard(pkg, rng):
+    top = sorted((_user(rng, i) for i in range(10)), key=lambda u: -u["value"])
+    return {"board_type": "财富", "top_users": top, "requester_data": {"rank": 42, "name": "妃爱", "value": 1234}}
+
+
+def _achievements(pkg, rng):
+    all_achievements = importlib.import_module(f"{PACKAGE_NAME}.achievements").ACHIEVEMENTS
+    unlocked = [ach_id for i, ach_id in enumerate(all_achievements) if i % 2 == 0]
+    return {"user_name": "妃爱", "unlocked_ids": unlocked, "all_achievements": all_achievements}
+
+
+def _shop(pkg, rng):
+    shop_data = importlib.import_module(f"{PACKAGE_NAME}.shop_items").SHOP_DATA
+    return {"category": next(iter(shop_data)), "user_points": 5000, "user_avatar_url": AVATAR_URL}
+
+
+def _backpack(pkg, rng):
+    shop_data = importlib.import_module(f"{PACKAGE_NAME}.shop_items").SHOP_DATA
+    bag = {category: {item_id: rng.randint(1, 20) for item_id in items} for category, items in shop_data.items()}
+    return {"user_bag": bag, "user_points": 5000, "stamina": 80, "max_stamina": 100}
+
+
+def _adventure(pkg, rng):
+    events = [
+        {"name": f"事件{i}", "description": "在森林深处发现了一个闪闪发光的宝箱，打开后获得了意想不到的收获。",
+         "effects": {"points": f"+{rng.randint(10, 99)} Astr币", "stamina": f"-{rng.randint(1, 9)} 体力"}}
+        for i in range(8)
+    ]
+    return {"results": {
+        "start_time": "2024-01-01 08:00:00", "adventure_times": 8,
+        "stamina_cost": 80, "stamina_before": 100, "stamina_after": 20,
+        "total_points_gain": 321, "points_before": 1000, "points_after": 1321,
+        "items_gained": [{"name": f"道具{i}", "category": "食物"} for i in range(5)],
+        "auto_used_items": [{"name": "面包"}, {"name": "咖啡"}, {"name": "饭团"}],
+        "events": events, "new_achievement": "冒险家", "message": "",
+    }}
+
+
+def _work_summary(pkg, rng):
+    workers = [
+        {"name": NAMES[i], "success": i != 1, "result": round(rng.uniform(20, 60), 2) if i != 1 else -12.5}
+        for i in range(3)
+    ]
+    return {
+        "user_id": "10001", "user_name": "妃爱", "avatar_url": AVATAR_URL, "title": "商城大亨",
+        "results": {
+            "job_name": "奶茶店", "workers": workers, "total_profit": 88.8, "success_count": 2, "failure_count": 1,
+            "buffs_used": {"work_reward_boost": 1, "work_no_penalty": 1}, "points_after": 1234.5,
+        },
+    }
+
+
+def _relationship(pkg, rng):
+    return {
+        "user_a_id": "10001", "user_a_name": "妃爱", "user_a_avatar": AVATAR_URL,
+        "user_b_id": "10002", "user_b_name": "Alice", "user_b_avatar": AVATAR_URL,
+        "relationship_data": {
+            "special_relation": "挚友",
+            "user_a_to_b_favorability": 88, "user_a_to_b_level": "挚友",
+            "user_b_to_a_favorability": 76, "user_b_to_a_level": "好友",
+        },
+        "user_a_title": "签到达人", "user_b_title": "冒险家",
+    }
+
+
+def _date_report(pkg, rng):
+    side = {"favorability_change": 12, "favorability_before": 40, "favorability_after": 52,
+            "level_up": True, "level_before": "熟人", "level_after": "好友"}
+    return {
+        "user_a_id": "10001", "user_a_name": "妃爱", "user_a_avatar": AVATAR_URL,
+        "user_b_id": "10002", "user_b_name": "Alice", "user_b_avatar": AVATAR_URL,
+        "date_results": {
+            "date_time": "2024-01-01 20:00:00", "user_a": side, "user_b": dict(side, favorability_change=-3),
+            "events": [{"name": f"约会事件{i}", "description": "一起去看了一场电影，气氛很好。",
+                        "a_to_b_change": rng.randint(-5, 10), "b_to_a_change": rng.randint(-5, 10)}
+                       for i in range(3)],
+        },
+    }
+
+
+def _social_network(pkg, rng):
+    network = [
+        {"user_id": str(10002 + i), "name": NAMES[i % len(NAMES)], "favorability": 100 - i * 7,
+         "level": "好友", "special_relation": "挚友" if i == 0 else None}
+        for i in range(10)
+    ]
+    return {"user_id": "10001", "user_name": "妃爱", "avatar_url": AVATAR_URL,
+            "network_data": network, "user_title": "社交达人"}
+
+
+def _group_social(pkg, rng):
+    stats_type = importlib.import_module(f"{PACKAGE_NAME}.social_graph").GroupSocialStats
+    user_ids = [str(10001 + i) for i in range(40)]
+    couples = sorted(
+        ((a, b, rng.randint(60, 100), rng.randint(60, 100)) for a, b in zip(user_ids[0:10:2], user_ids[1:10:2])),
+        key=lambda c: -min(c[2], c[3]),
+    )
+    popular = sorted(((uid, rng.randint(200, 900), rng.randint(3, 15)) for uid in user_ids[10:15]),
+                     key=lambda p: -p[1])
+    stats = stats_type(
+        member_count=len(user_ids), relation_count=180, mutual_count=23, mutual_threshold=50,
+        top_couples=couples, most_popular=popular,
+        clusters=[user_ids[0:12], user_ids[12:20], user_ids[20:25], user_ids[25:27]],
+    )
+    names = {uid: NAMES[i % len(NAMES)] for i, uid in enumerate(user_ids)}
+    return {"group_id": "123456", "stats": stats, "names": names}
+
+
+# {名称: (模块, 函数名, 输入构造函数)}
+CASES = {
+    "sign_card": ("_generate_card", "generate_sign_card_pillow", _sign_card),
+    "market_status": ("_generate_market", "generate_market_card_pillow", _market_status),
+    "leaderboard": ("_generate_leaderboard", "generate_leaderboard_image", _leaderboard),
+    "achievements": ("_generate_achievements", "generate_achievements_image", _achievements),
+    "shop": ("_generate_shop", "generate_shop_card", _shop),
+    "backpack": ("_generate_shop", "generate_backpack_card", _backpack),
+    "adventure": ("_generate_adventure", "generate_adventure_report_card", _adventure),
+    "work_summary": ("_generate_work_summary", "generate_work_summary_card", _work_summary),
+    "relationship": ("_generate_social", "generate_relationship_card", _relationship),
+    "date_report": ("_generate_social", "generate_date_report_card", _date_report),
+    "social_network": ("_generate_social", "generate_social_network_card", _social_network),
+    "group_social": ("_generate_group_social", "generate_group_social_card", _group_social),
+    "command_card": ("_command_card", "generate_command_card", lambda pkg, rng: {}),
+}
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def run_case(name: str, iterations: int, warmup: int, preload: bool, work_dir: str = None) -> dict:
+    """在当前进程中运行一个生成函数并返回统计结果"""
+    pkg = load_plugin_package(work_dir)
+    utils = importlib.import_module(f"{PACKAGE_NAME}.drawing_utils")
+    process_rss_mb = importlib.import_module(f"{PACKAGE_NAME}.memory_inspector").process_rss_mb
+
+    if preload:
+        utils.preload_assets()
+    utils.set_prefetched_images({AVATAR_URL: utils.get_default_avatar().resize((640, 640))})
+
+    module_name, func_name, make_kwargs = CASES[name]
+    func = getattr(importlib.import_module(f"{PACKAGE_NAME}.{module_name}"), func_name)
+    kwargs = make_kwargs(pkg, random.Random(0))
+
+    async def run():
+        timings, sizes = [], []
+        for i in range(warmup + iterations):
+            start = time.perf_counter()
+            path = await func(**kwargs)
+            elapsed = time.perf_counter() - start
+            if not path:
+                raise RuntimeError(f"{func_name} 未返回图片路径")
+            if i >= warmup:
+                timings.append(elapsed)
+                sizes.append(os.path.getsize(path))
+        return timings, sizes
+
+    timings, sizes = asyncio.run(run())
+    return {
+        "p50_ms": round(_percentile(timings, 0.5) * 1000, 2),
+        "p95_ms": round(_percentile(timings, 0.95) * 1000, 2),
+        "peak_rss_mb": round(process_rss_mb(peak=True), 1),
+        "output_kb": round(sum(sizes) / len(sizes) / 1024, 1),
+    }
+
+
+def _run_isolated(name: str, args) -> dict:
+    """在独立子进程中运行一个生成函数，使峰值内存互不干扰"""
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", name,
+           "--iterations", str(args.iterations), "--warmup", str(args.warmup)]
+    if args.preload:
+        cmd.append("--preload")
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": (proc.stderr.strip().splitlines() or ["未知错误"])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """打印与基线的对比，返回是否存在超过阈值的退化"""
+    regressed = False
+    print(f"\n{'generator':<16}{'base p95':>10}{'now p95':>10}{'delta':>9}")
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "error" in base or "error" in result:
+            continue
+        delta = (result["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        flag = ""
+        if delta > threshold:
+            regressed = True
+            flag = "  <-- regression"
+        print(f"{name:<16}{base['p95_ms']:>10.1f}{result['p95_ms']:>10.1f}{delta:>+8.0%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="卡片生成基准测试")
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="只运行指定的生成函数")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--preload", action="store_true", help="先预加载字体与背景（模拟渲染池工作进程）")
+    parser.add_argument("--save-baseline", metavar="PATH", help="将结果保存为基线")
+    parser.add_argument("--baseline", metavar="PATH", help="与基线对比")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 退化阈值（比例）")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with tempfile.TemporaryDirectory(prefix="astrsupermarket_bench_") as work_dir:
+            print(json.dumps(run_case(args.child, args.iterations, args.warmup, args.preload, work_dir)))
+        return
+
+    results = {}
+    print(f"{'generator':<16}{'p50 ms':>10}{'p95 ms':>10}{'rss MB':>10}{'out KB':>10}")
+    for name in args.only or CASES:
+        result = _run_isolated(name, args)
+        results[name] = result
+        if "error" in result:
+            print(f"{name:<16}  ERROR: {result['error']}")
+        else:
+            print(f"{name:<16}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+                  f"{result['peak_rss_mb']:>10.1f}{result['output_kb']:>10.1f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"created_at": datetime.now().isoformat(timespec="seconds"),
+                       "iterations": args.iterations, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if _compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# feifeisupermarket/buffs.py
+
+"""
+AstrAstr超级市场 - 道具效果（buff）引擎
+
+每种效果有固定的定义（描述、叠加规则、叠加上限、有效期）。用户数据中的 buffs 字典保持紧凑：
+- 不会过期的效果：{效果名: 次数}（与旧数据格式相同）
+- 有有效期的效果：{效果名: [次数, 过期时间戳]}
+
+查询与消耗都是一次字典操作；次数用完的条目在消耗时直接删除，
+过期的条目在下次访问时顺带清理，热路径上不再需要整体重建字典。
+"""
+
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+STACK_ADD = "add"  # 次数累加，有效期从最近一次获得时重新计算
+STACK_MAX = "max"  # 次数取较大值（不累加），有效期重新计算
+
+
+class BuffDefinition(NamedTuple):
+    """道具效果定义"""
+    name: str
+    description: str
+    stacking: str = STACK_ADD
+    max_stack: Optional[int] = None  # 次数上限，None 表示不限
+    duration_seconds: Optional[float] = None  # 有效期，None 表示不过期
+
+
+# 目前所有效果都按次数生效、可无限叠加且不过期（与原有玩法一致）
+BUFF_DEFINITIONS: Dict[str, BuffDefinition] = {
+    definition.name: definition for definition in (
+        BuffDefinition("work_guarantee_success", "打工必定成功"),
+        BuffDefinition("work_no_penalty", "打工失败不扣币"),
+        BuffDefinition("work_reward_boost", "打工奖励提升"),
+        BuffDefinition("lottery_min_3star", "抽奖至少3星"),
+        BuffDefinition("lottery_double_reward", "抽奖奖励翻倍"),
+        BuffDefinition("lottery_best_of_two", "抽奖取最佳结果"),
+        BuffDefinition("adventure_negate_crisis", "冒险危机保护"),
+        BuffDefinition("adventure_rare_boost", "稀有奇遇提升"),
+    )
+}
+
+
+class BuffEngine:
+    """
+    道具效果引擎：所有方法直接操作用户数据中的 buffs 字典。
+
+    Args:
+        definitions: 效果定义表
+        clock: 返回当前时间戳的函数（用于有效期判断，便于测试替换）
+    """
+
+    def __init__(self, definitions: Dict[str, BuffDefinition] = BUFF_DEFINITIONS,
+                 clock: Callable[[], float] = time.time):
+        self.definitions = definitions
+        self._clock = clock
+
+    def describe(self, name: str) -> str:
+        """效果的用户友好描述"""
+        definition = self.definitions.get(name)
+        return definition.description if definition else name
+
+    def _read(self, buffs: dict, name: str) -> Tuple[int, Optional[float]]:
+        """读取效果的 (次数, 过期时间)，无效或已过期的条目会被删除"""
+        value = buffs.get(name)
+        if value is None:
+            return 0, None
+        if isinstance(value, (list, tuple)):
+            count, expires_at = value[0], value[1]
+            if expires_at is not None and expires_at <= self._clock():
+                count = 0
+        else:
+            count, expires_at = value, None
+        if count <= 0:
+            del buffs[name]
+            return 0, None
+        return count, expires_at
+
+    @staticmethod
+    def _write(buffs: dict, name: str, count: int, expires_at: Optional[float]):
+        if count <= 0:
+            buffs.pop(name, None)
+        elif expires_at is None:
+            buffs[name] = count
+        else:
+            buffs[name] = [count, expires_at]
+
+    def peek(self, buffs: dict, name: str) -> int:
+        """效果的剩余次数（不消耗）"""
+        return self._read(buffs, name)[0]
+
+    def consume(self, buffs: dict, name: str) -> bool:
+        """如果效果有剩余次数则消耗一次并返回 True"""
+        count, expires_at = self._read(buffs, name)
+        if count <= 0:
+            return False
+        self._write(buffs, name, count - 1, expires_at)
+        return True
+
+    def grant(self, buffs: dict, name: str, charges: int = 1) -> int:
+        """按定义的叠加规则获得效果，返回获得后的次数"""
+        definition = self.definitions.get(name) or BuffDefinition(name, name)
+        count, _ = self._read(buffs, name)
+        if definition.stacking == STACK_MAX:
+            count = max(count, charges)
+        else:
+            count += charges
+        if definition.max_stack is not None:
+            count = min(count, definition.max_stack)
+        expires_at = None
+        if definition.duration_seconds is not None:
+            expires_at = self._clock() + definition.duration_seconds
+        self._write(buffs, name, count, expires_at)
+        return count
+
+    def describe_active(self, buffs: dict) -> List[str]:
+        """生效中效果的展示文本，如 ["【打工必定成功】× 2"]"""
+        now = self._clock()
+        lines = []
+        for name, (count, expires_at) in self.active(buffs).items():
+            line = f"【{self.describe(name)}】× {count}"
+            if expires_at is not None:
+                line += f"（剩余 {max(1, int((expires_at - now) // 60))} 分钟）"
+            lines.append(line)
+        return lines
+
+    def active(self, buffs: dict) -> Dict[str, Tuple[int, Optional[float]]]:
+        """所有生效中的效果 {效果名: (次数, 过期时间)}，同时清理无效条目"""
+        result = {}
+        for name in list(buffs):
+            count, expires_at = self._read(buffs, name)
+            if count > 0:
+                result[name] = (count, expires_at)
+        return result
+
+
+buff_engine = BuffEngine()
@@ -0,0 +1,507 @@
+# feifeisupermarket/card_layout.py
+
+"""
+AstrAstr超级市场 - 声明式卡片布局
+
+一张卡片由若干图层（背景、图片、头像、文本、列表、徽章、时间戳）按顺序描述，
+同一份布局可以交给 Pillow 或 HTML 两种后端执行：
+- 布局第一次使用时编译为绘制计划并缓存（按布局名称）
+- 不依赖请求数据的静态图层（背景、遮罩、装饰、固定文字）在 Pillow 后端中
+  按背景图预先合成一次，之后每次请求只复制底图并绘制动态图层
+- HTML 后端从同一份布局生成 Jinja 模板，模板与静态资源的 base64 编码同样只生成一次
+
+文本中可以使用 {字段名} 引用请求数据，例如 "{streak_days}天"；
+图层的 when 参数指定一个数据字段，该字段为真时才绘制此图层。
+注意：静态图层总是被合成在所有动态图层之下。
+"""
+
+import html
+import os
+import re
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+from astrbot.api import logger
+
+from . import drawing_utils as utils
+from .tracing import span
+
+_FIELD_PATTERN = re.compile(r"\{(\w+)\}")
+
+# 每个布局最多缓存的静态底图数量（按背景图区分）
+STATIC_BASE_CACHE_SIZE = 8
+
+
+def _css_color(color: Tuple[int, ...]) -> str:
+    """将 (r, g, b[, a]) 转为CSS颜色"""
+    if len(color) == 4:
+        return f"rgba({color[0]}, {color[1]}, {color[2]}, {color[3] / 255:.2f})"
+    return f"rgb({color[0]}, {color[1]}, {color[2]})"
+
+
+def _format_text(text: str, data: Dict[str, Any]) -> str:
+    """用请求数据填充文本中的 {字段名}"""
+    return _FIELD_PATTERN.sub(lambda m: str(data.get(m.group(1), "")), text)
+
+
+def _jinja_text(text: str) -> str:
+    """将 {字段名} 转为 Jinja 表达式，其余部分做HTML转义"""
+    parts = []
+    last = 0
+    for match in _FIELD_PATTERN.finditer(text):
+        parts.append(html.escape(text[last:match.start()]))
+        parts.append("{{ " + match.group(1) + " }}")
+        last = match.end()
+    parts.append(html.escape(text[last:]))
+    return "".join(parts)
+
+
+def _asset_var(path: str) -> str:
+    """静态资源在模板中的变量名"""
+    return "asset_" + re.sub(r"\W", "_", os.path.splitext(path)[0]) + "_base64"
+
+
+# --- 图层定义 ---
+
+class Layer:
+    """图层基类"""
+
+    def __init__(self, when: Optional[str] = None):
+        self.when = when
+
+    def is_dynamic(self) -> bool:
+        """图层内容是否依赖请求数据"""
+        return self.when is not None
+
+    def enabled(self, data: Dict[str, Any]) -> bool:
+        return self.when is None or bool(data.get(self.when))
+
+    def assets(self) -> Dict[str, Tuple[str, bool]]:
+        """HTML后端需要的静态资源 {模板变量: (相对路径, 是否优化)}"""
+        return {}
+
+    async def draw(self, card: Image.Image, draw: ImageDraw.Draw, data: Dict[str, Any]):
+        raise NotImplementedError
+
+    def to_html(self, layout: "CardLayout") -> str:
+        raise NotImplementedError
+
+    def _wrap_when(self, snippet: str) -> str:
+        if self.when is None:
+            return snippet
+        return f"{{% if {self.when} %}}{snippet}{{% endif %}}"
+
+
+class BackgroundLayer(Layer):
+    """随机背景 + 半透明遮罩 + 可选的三张装饰图（必须是第一个图层）"""
+
+    def __init__(self, decorations: bool = True):
+        super().__init__()
+        self.decorations = decorations
+
+    def assets(self) -> Dict[str, Tuple[str, bool]]:
+        if not self.decorations:
+            return {}
+        return {f"catch0{i}_base64": (f"dec/catch0{i}.png", True) for i in (1, 2, 3)}
+
+    def to_html(self, layout: "CardLayout") -> str:
+        snippet = '<div class="overlay"></div>'
+        if self.decorations:
+            snippet += (
+                '{% if catch01_base64 %}<img class="layer" style="left:40px; top:40px; width:150px; height:150px;" '
+                'src="data:image/png;base64,{{ catch01_base64 }}">{% endif %}'
+                '{% if catch02_base64 %}<img class="layer" style="right:20px; bottom:0; width:300px;" '
+                'src="data:image/png;base64,{{ catch02_base64 }}">{% endif %}'
+                '{% if catch03_base64 %}<img class="layer" style="left:40px; bottom:40px; width:220px; height:110px; opacity:0.85;" '
+                'src="data:image/png;base64,{{ catch03_base64 }}">{% endif %}'
+            )
+        return snippet
+
+
+class ImageLayer(Layer):
+    """插件目录下的一张固定图片"""
+
+    def __init__(self, path: str, x: int, y: int, width: int, height: int, opacity: float = 1.0,
+                 when: Optional[str] = None):
+        super().__init__(when)
+        self.path = path
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+        self.opacity = opacity
+
+    def assets(self) -> Dict[str, Tuple[str, bool]]:
+        return {_asset_var(self.path): (self.path, True)}
+
+    async def draw(self, card, draw, data):
+        full_path = os.path.join(utils.BASE_DIR, self.path)
+        if not os.path.exists(full_path):
+            return
+        img = Image.open(full_path).convert("RGBA")
+        if self.opacity < 1.0:
+            alpha = img.getchannel('A').point(lambda i: i * self.opacity)
+            img.putalpha(alpha)
+        img = img.resize((self.width, self.height), Image.LANCZOS)
+        card.paste(img, (self.x, self.y), img)
+
+    def to_html(self, layout):
+        var = _asset_var(self.path)
+        snippet = (
+            f'{{% if {var} %}}<img class="layer" style="left:{self.x}px; top:{self.y}px; '
+            f'width:{self.width}px; height:{self.height}px; opacity:{self.opacity};" '
+            f'src="data:image/png;base64,{{{{ {var} }}}}">{{% endif %}}'
+        )
+        return self._wrap_when(snippet)
+
+
+class AvatarLayer(Layer):
+    """圆形带边框的用户头像"""
+
+    def __init__(self, center_x: int, top: int, size: int = 200,
+                 url_key: str = "avatar_url", base64_key: str = "avatar_base64"):
+        super().__init__()
+        self.center_x, self.top, self.size = center_x, top, size
+        self.url_key, self.base64_key = url_key, base64_key
+
+    def is_dynamic(self) -> bool:
+        return True
+
+    async def draw(self, card, draw, data):
+        avatar_img = await utils.download_image(data.get(self.url_key, ""))
+        if avatar_img is None:
+            avatar_img = utils.get_default_avatar()
+        frame = utils.make_avatar_frame(avatar_img, self.size)
+        card.paste(frame, (self.center_x - self.size // 2 - 8, self.top - 8), frame)
+
+    def to_html(self, layout):
+        return (
+            f'<img class="layer avatar" style="left:{self.center_x - self.size // 2 - 8}px; top:{self.top - 8}px; '
+            f'width:{self.size}px; height:{self.size}px;" '
+            f'src="data:image/jpeg;base64,{{{{ {self.base64_key} }}}}">'
+        )
+
+
+class TextLayer(Layer):
+    """单行文本，anchor 取 la（左对齐）/ ma（居中）/ ra（右对齐）"""
+
+    def __init__(self, text: str, x: int, y: int, size: int, color: Tuple[int, ...],
+                 anchor: str = "la", outline: Optional[Tuple[int, ...]] = None, when: Optional[str] = None):
+        super().__init__(when)
+        self.text = text
+        self.x, self.y = x, y
+        self.size = size
+        self.color = color
+        self.anchor = anchor
+        self.outline = outline
+
+    def is_dynamic(self) -> bool:
+        return super().is_dynamic() or bool(_FIELD_PATTERN.search(self.text))
+
+    async def draw(self, card, draw, data):
+        text = _format_text(self.text, data)
+        font = utils.get_font(self.size)
+        w, _ = utils.get_text_dimensions(text, font)
+        x = self.x
+        if self.anchor == "ma":
+            x -= w // 2
+        elif self.anchor == "ra":
+            x -= w
+        if self.outline:
+            utils.text_with_outline(draw, (x, self.y), text, font, self.color, self.outline)
+        else:
+            draw.text((x, self.y), text, font=font, fill=self.color)
+
+    def to_html(self, layout):
+        if self.anchor == "ra":
+            position = f"right:{layout.width - self.x}px;"
+        elif self.anchor == "ma":
+            position = f"left:{self.x}px; transform:translateX(-50%);"
+        else:
+            position = f"left:{self.x}px;"
+        shadow = ""
+        if self.outline:
+            c = _css_color(self.outline)
+            shadow = f" text-shadow:-2px -2px 0 {c}, 2px -2px 0 {c}, -2px 2px 0 {c}, 2px 2px 0 {c};"
+        snippet = (
+            f'<div class="layer" style="{position} top:{self.y}px; font-size:{self.size}px; '
+            f'color:{_css_color(self.color)};{shadow}">{_jinja_text(self.text)}</div>'
+        )
+        return self._wrap_when(snippet)
+
+
+class RowsLayer(Layer):
+    """标签/数值列表，数据为 [(标签, 数值, 是否高亮), ...]"""
+
+    def __init__(self, key: str, x: int, y: int, row_height: int, value_dx: int, value_dy: int = 0,
+                 label_size: int = 35, value_size: int = 42, highlight_size: int = 45,
+                 label_color: Tuple[int, ...] = (224, 224, 224),
+                 value_color: Tuple[int, ...] = (255, 255, 255),
+                 highlight_color: Tuple[int, ...] = (255, 215, 0)):
+        super().__init__()
+        self.key = key
+        self.x, self.y = x, y
+        self.row_height = row_height
+        self.value_dx, self.value_dy = value_dx, value_dy
+        self.label_size, self.value_size, self.highlight_size = label_size, value_size, highlight_size
+        self.label_color, self.value_color, self.highlight_color = label_color, value_color, highlight_color
+
+    def is_dynamic(self) -> bool:
+        return True
+
+    async def draw(self, card, draw, data):
+        label_font = utils.get_font(self.label_size)
+        value_font = utils.get_font(self.value_size)
+        highlight_font = utils.get_font(self.highlight_size)
+        current_y = self.y
+        for label, value, highlight in data.get(self.key, []):
+            draw.text((self.x, current_y), label, font=label_font, fill=self.label_color)
+            draw.text(
+                (self.x + self.value_dx, current_y + self.value_dy), str(value),
+                font=highlight_font if highlight else value_font,
+                fill=self.highlight_color if highlight else self.value_color
+            )
+            current_y += self.row_height
+
+    def to_html(self, layout):
+        row_top = f"loop.index0 * {self.row_height}"
+        return (
+            f"{{% for label, value, highlight in {self.key} %}}"
+            f'<div class="layer" style="left:{self.x}px; top:{{{{ {self.y} + {row_top} }}}}px; '
+            f'font-size:{self.label_size}px; color:{_css_color(self.label_color)};">{{{{ label }}}}</div>'
+            f'<div class="layer" style="left:{self.x + self.value_dx}px; '
+            f'top:{{{{ {self.y + self.value_dy} + {row_top} }}}}px; '
+            f'font-size:{{% if highlight %}}{self.highlight_size}{{% else %}}{self.value_size}{{% endif %}}px; '
+            f'color:{{% if highlight %}}{_css_color(self.highlight_color)}{{% else %}}{_css_color(self.value_color)}{{% endif %}};">'
+            f"{{{{ value }}}}</div>"
+            f"{{% endfor %}}"
+        )
+
+
+class BadgeLayer(Layer):
+    """带白边的圆形徽章"""
+
+    def __init__(self, text: str, center_x: int, center_y: int, diameter: int = 80, size: int = 30,
+                 fill: Tuple[int, ...] = (255, 107, 107), color: Tuple[int, ...] = (255, 255, 255),
+                 when: Optional[str] = None):
+        super().__init__(when)
+        self.text = text
+        self.center_x, self.center_y = center_x, center_y
+        self.diameter, self.size = diameter, size
+        self.fill, self.color = fill, color
+
+    def is_dynamic(self) -> bool:
+        return super().is_dynamic() or bool(_FIELD_PATTERN.search(self.text))
+
+    async def draw(self, card, draw, data):
+        d = self.diameter
+        badge = Image.new("RGBA", (d, d), (0, 0, 0, 0))
+        badge_draw = ImageDraw.Draw(badge)
+        badge_draw.ellipse((0, 0, d, d), fill=self.fill)
+        badge_draw.ellipse((3, 3, d - 3, d - 3), outline=self.color, width=3)
+
+        text = _format_text(self.text, data)
+        font = utils.get_font(self.size)
+        w, h = utils.get_text_dimensions(text, font)
+        badge_draw.text(((d - w) / 2, (d - h) / 2 - 2), text, font=font, fill=self.color)
+        card.paste(badge, (self.center_x - d // 2, self.center_y - d // 2), badge)
+
+    def to_html(self, layout):
+        d = self.diameter
+        snippet = (
+            f'<div class="layer badge" style="left:{self.center_x - d // 2}px; top:{self.center_y - d // 2}px; '
+            f'width:{d}px; height:{d}px; font-size:{self.size}px; background:{_css_color(self.fill)}; '
+            f'color:{_css_color(self.color)};">{_jinja_text(self.text)}</div>'
+        )
+        return self._wrap_when(snippet)
+
+
+class TimestampLayer(Layer):
+    """右下角的生成时间"""
+
+    def __init__(self, color: Tuple[int, ...] = (180, 180, 180)):
+        super().__init__()
+        self.color = color
+
+    def is_dynamic(self) -> bool:
+        return True
+
+    async def draw(self, card, draw, data):
+        w, h = card.size
+        utils.draw_timestamp(draw, w, h, fill=self.color)
+
+    def to_html(self, layout):
+        return (
+            f'<div class="layer" style="right:20px; bottom:20px; font-size:22px; '
+            f'color:{_css_color(self.color)};">{{{{ timestamp }}}}</div>'
+        )
+
+
+class CardLayout:
+    """一张卡片的声明式布局"""
+
+    def __init__(self, name: str, width: int, height: int, layers: List[Layer]):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.layers = layers
+
+
+# --- 编译与执行 ---
+
+_HTML_SHELL = '''<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        @font-face {
+            font-family: 'CustomFont';
+            src: url(data:font/truetype;base64,{{ font_base64 }});
+        }
+        body, html { margin: 0; padding: 0; font-family: 'CustomFont', sans-serif; overflow: hidden; }
+        .card-container {
+            position: relative; width: %(width)dpx; height: %(height)dpx; overflow: hidden;
+            background-image: url('data:image/jpeg;base64,{{ bg_base64 }}');
+            background-size: cover; background-position: center;
+        }
+        .overlay { position: absolute; top: 0; left: 0; width: 100%%; height: 100%%; background: rgba(0, 0, 0, 0.7); }
+        .layer { position: absolute; white-space: nowrap; }
+        .avatar { border-radius: 50%%; object-fit: cover; border: 8px solid rgba(255, 255, 255, 0.9); }
+        .badge {
+            border-radius: 50%%; display: flex; justify-content: center; align-items: center;
+            box-sizing: border-box; border: 3px solid white;
+        }
+    </style>
+</head>
+<body>
+    <div class="card-container">
+%(layers)s
+    </div>
+</body>
+</html>
+'''
+
+
+class CompiledLayout:
+    """布局的编译结果：静态/动态图层划分、HTML模板与静态底图缓存"""
+
+    def __init__(self, layout: CardLayout):
+        self.layout = layout
+        if not layout.layers or not isinstance(layout.layers[0], BackgroundLayer):
+            raise ValueError(f"布局 {layout.name} 的第一个图层必须是 BackgroundLayer")
+        self.background: BackgroundLayer = layout.layers[0]
+        rest = layout.layers[1:]
+        self.static_layers = [layer for layer in rest if not layer.is_dynamic()]
+        self.dynamic_layers = [layer for layer in rest if layer.is_dynamic()]
+
+        self.assets: Dict[str, Tuple[str, bool]] = {}
+        for layer in layout.layers:
+            self.assets.update(layer.assets())
+
+        self._html_template: Optional[str] = None
+        self._static_bases: "OrderedDict[Tuple[str, float], Image.Image]" = OrderedDict()
+
+    @property
+    def html_template(self) -> str:
+        if self._html_template is None:
+            snippets = "\n".join(layer.to_html(self.layout) for layer in self.layout.layers)
+            self._html_template = _HTML_SHELL % {
+                "width": self.layout.width, "height": self.layout.height, "layers": snippets
+            }
+        return self._html_template
+
+    async def get_static_base(self) -> Optional[Image.Image]:
+        """获取（必要时合成）某张随机背景对应的静态底图"""
+        bg_path = utils.get_random_background_path()
+        if bg_path is None:
+            return None
+        cache_key = (bg_path, os.path.getmtime(bg_path))
+        base = self._static_bases.get(cache_key)
+        if base is not None:
+            self._static_bases.move_to_end(cache_key)
+            return base
+
+        bg_img = Image.open(bg_path).convert("RGBA")
+        base, draw = utils.create_base_card(
+            self.layout.width, self.layout.height,
+            add_decorations=self.background.decorations, background=bg_img
+        )
+        if base is None:
+            return None
+        for layer in self.static_layers:
+            await layer.draw(base, draw, {})
+
+        self._static_bases[cache_key] = base
+        while len(self._static_bases) > STATIC_BASE_CACHE_SIZE:
+            self._static_bases.popitem(last=False)
+        return base
+
+
+_compiled_layouts: Dict[str, CompiledLayout] = {}
+
+
+def compile_layout(layout: CardLayout) -> CompiledLayout:
+    """编译布局（按名称缓存，每个布局只编译一次）"""
+    compiled = _compiled_layouts.get(layout.name)
+    if compiled is None or compiled.layout is not layout:
+        compiled = CompiledLayout(layout)
+        _compiled_layouts[layout.name] = compiled
+    return compiled
+
+
+def get_cache_objects() -> Dict[str, Any]:
+    """返回已编译的布局（含静态底图缓存）与绘图资源缓存（供内存统计使用）"""
+    return {"layouts": _compiled_layouts, **utils.get_cache_objects()}
+
+
+async def render_pillow(layout: CardLayout, data: Dict[str, Any], subdir: str, file_name: str) -> Optional[str]:
+    """
+    使用Pillow后端渲染卡片，保存到 data/<subdir>/<file_name>。
+
+    Returns:
+        图片路径，失败时返回None
+    """
+    try:
+        compiled = compile_layout(layout)
+        base = await compiled.get_static_base()
+        if base is None:
+            return None
+        card = base.copy()
+        draw = ImageDraw.Draw(card)
+        for layer in compiled.dynamic_layers:
+            if layer.enabled(data):
+                await layer.draw(card, draw, data)
+        return utils.save_card(card, subdir, file_name)
+    except Exception as e:
+        logger.error(f"Pillow渲染布局 {layout.name} 失败: {e}", exc_info=True)
+        return None
+
+
+async def render_html(star_instance, layout: CardLayout, data: Dict[str, Any],
+                      render_options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    使用HTML后端（Star.html_render）渲染卡片。
+    字体、背景、装饰等静态资源的base64编码会被缓存。
+
+    Returns:
+        html_render 的返回值（图片路径或URL）
+    """
+    compiled = compile_layout(layout)
+    bg_path = utils.get_random_background_path()
+    template_data = {
+        "font_base64": utils.file_to_base64(utils.FONT_PATH),
+        "bg_base64": utils.file_to_base64(bg_path, optimize=True) if bg_path else "",
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    for var, (path, optimize) in compiled.assets.items():
+        full_path = os.path.join(utils.BASE_DIR, path)
+        template_data[var] = utils.file_to_base64(full_path, optimize) if os.path.exists(full_path) else None
+    template_data.update(data)
+
+    options = render_options or {
+        "width": layout.width, "height": layout.height, "deviceScaleFactor": 1.5,
+        "quality": 85, "omitBackground": True, "fullPage": True
+    }
+    with span("html_render"):
+        return await star_instance.html_render(compiled.html_template, template_data, options)
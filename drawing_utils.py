@@ -9,13 +9,16 @@ AstrAstr超级市场 - Pillow 绘图工具箱
 - 图像处理（圆形裁剪）
 - 文本绘制（尺寸计算、带轮廓文本）
 - 复合组件绘制（基础卡片、用户头像区域）
+- 输出与编码（保存卡片、静态资源base64缓存）
 """
 
 import os
+import base64
 import random
 import aiohttp
+from datetime import datetime
 from io import BytesIO
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from PIL import Image, ImageDraw, ImageFont
 
 from astrbot.api import logger
@@ -24,6 +27,15 @@ from astrbot.api import logger
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FONT_PATH = os.path.join(BASE_DIR, "可爱字体.ttf")
 
+# --- 预加载资源缓存（仅在调用 preload_assets 后启用，供渲染进程池使用） ---
+_font_cache: Dict[int, ImageFont.FreeTypeFont] = {}
+_background_cache: List[Image.Image] = []
+_decoration_cache: Optional[Tuple[Optional[Image.Image], Optional[Image.Image], Optional[Image.Image]]] = None
+_assets_preloaded = False
+
+# 预先取得的网络图片（URL -> Image），由渲染进程池在执行任务前注入
+_prefetched_images: Dict[str, Image.Image] = {}
+
 # --- 1. 资源加载函数 ---
 
 def get_font(size: int) -> Optional[ImageFont.FreeTypeFont]:
@@ -31,11 +43,16 @@ def get_font(size: int) -> Optional[ImageFont.FreeTypeFont]:
     获取指定大小的字体。
     所有作图函数统一调用此函数以保证字体一致。
     """
+    if _assets_preloaded and size in _font_cache:
+        return _font_cache[size]
     try:
         if not os.path.exists(FONT_PATH):
             logger.error(f"核心字体文件丢失: {FONT_PATH}，尝试使用备用字体。")
             return ImageFont.truetype("arial.ttf", size)
-        return ImageFont.truetype(FONT_PATH, size)
+        font = ImageFont.truetype(FONT_PATH, size)
+        if _assets_preloaded:
+            _font_cache[size] = font
+        return font
     except Exception as e:
         logger.error(f"加载字体 '{FONT_PATH}' 失败: {e}，尝试使用备用字体。")
         try:
@@ -44,23 +61,37 @@ def get_font(size: int) -> Optional[ImageFont.FreeTypeFont]:
             logger.error("备用字体 'arial.ttf' 也加载失败。")
             return None
 
-def get_random_background() -> Optional[Image.Image]:
+def get_random_background_path() -> Optional[str]:
     """
-    从 backgrounds 文件夹中随机获取一张背景图片。
+    从 backgrounds 文件夹中随机选择一张背景图片，返回其路径。
     """
     try:
         backgrounds_dir = os.path.join(BASE_DIR, "backgrounds")
         valid_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif']
-        
-        bg_files = [f for f in os.listdir(backgrounds_dir) 
+
+        bg_files = [f for f in os.listdir(backgrounds_dir)
                    if os.path.isfile(os.path.join(backgrounds_dir, f))
                    and os.path.splitext(f.lower())[1] in valid_extensions]
-        
+
         if not bg_files:
             logger.error(f"背景图片文件夹 '{backgrounds_dir}' 为空或没有有效图片。")
             return None
-        
-        random_bg_path = os.path.join(backgrounds_dir, random.choice(bg_files))
+
+        return os.path.join(backgrounds_dir, random.choice(bg_files))
+    except Exception as e:
+        logger.error(f"获取背景图片失败: {e}")
+        return None
+
+def get_random_background() -> Optional[Image.Image]:
+    """
+    从 backgrounds 文件夹中随机获取一张背景图片。
+    """
+    if _background_cache:
+        return random.choice(_background_cache)
+    random_bg_path = get_random_background_path()
+    if random_bg_path is None:
+        return None
+    try:
         return Image.open(random_bg_path).convert("RGBA")
     except Exception as e:
         logger.error(f"获取背景图片失败: {e}")
@@ -70,6 +101,8 @@ def get_decoration_images() -> Tuple[Optional[Image.Image], Optional[Image.Image
     """
     从 dec 文件夹获取三张固定的装饰图片。
     """
+    if _decoration_cache is not None:
+        return _decoration_cache
     try:
         dec_dir = os.path.join(BASE_DIR, "dec")
         catch01_path = os.path.join(dec_dir, "catch01.png")
@@ -85,9 +118,9 @@ def get_decoration_images() -> Tuple[Optional[Image.Image], Optional[Image.Image
         logger.error(f"获取装饰图片失败: {e}")
         return None, None, None
 
-async def download_image(url: str) -> Optional[Image.Image]:
+async def download_image_bytes(url: str) -> Optional[bytes]:
     """
-    从 URL 异步下载图片并返回 PIL Image 对象。
+    从 URL 异步下载图片的原始字节。
     """
     if not url or not url.startswith("http"):
         return None
@@ -95,8 +128,7 @@ async def download_image(url: str) -> Optional[Image.Image]:
         async with aiohttp.ClientSession() as session:
             async with session.get(url, timeout=10) as response:
                 if response.status == 200:
-                    image_data = await response.read()
-                    return Image.open(BytesIO(image_data)).convert("RGBA")
+                    return await response.read()
                 else:
                     logger.error(f"下载图片失败: {url}, 状态码: {response.status}")
                     return None
@@ -104,6 +136,57 @@ async def download_image(url: str) -> Optional[Image.Image]:
         logger.error(f"下载图片 '{url}' 出错: {e}")
         return None
 
+async def download_image(url: str) -> Optional[Image.Image]:
+    """
+    从 URL 异步下载图片并返回 PIL Image 对象。
+    如果该URL已被预先取得（渲染进程池场景），直接返回预取的图片。
+    """
+    if url in _prefetched_images:
+        return _prefetched_images[url].copy()
+    image_data = await download_image_bytes(url)
+    if image_data is None:
+        return None
+    try:
+        return Image.open(BytesIO(image_data)).convert("RGBA")
+    except Exception as e:
+        logger.error(f"解析图片 '{url}' 出错: {e}")
+        return None
+
+
+def set_prefetched_images(images: Dict[str, Image.Image]):
+    """
+    设置预先取得的网络图片，download_image 会优先使用这些图片。
+    传入空字典即可清空。
+    """
+    _prefetched_images.clear()
+    _prefetched_images.update(images)
+
+
+def preload_assets():
+    """
+    预加载字体、背景图和装饰图片并常驻内存。
+    供渲染进程池的工作进程在启动时调用一次，之后的渲染不再重复读取磁盘。
+    """
+    global _assets_preloaded, _decoration_cache
+    _assets_preloaded = True
+
+    backgrounds_dir = os.path.join(BASE_DIR, "backgrounds")
+    valid_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif']
+    try:
+        _background_cache.clear()
+        for f in sorted(os.listdir(backgrounds_dir)):
+            path = os.path.join(backgrounds_dir, f)
+            if os.path.isfile(path) and os.path.splitext(f.lower())[1] in valid_extensions:
+                _background_cache.append(Image.open(path).convert("RGBA"))
+    except Exception as e:
+        logger.error(f"预加载背景图片失败: {e}")
+
+    _decoration_cache = get_decoration_images()
+
+    # 预热常用字号
+    for size in (22, 24, 26, 28, 30, 32, 35, 36, 40, 42, 45, 48, 50, 60, 70):
+        get_font(size)
+
 def get_default_avatar() -> Optional[Image.Image]:
     """
     当用户头像获取失败时，提供一张默认头像。
@@ -145,6 +228,20 @@ def crop_to_circle(im: Image.Image) -> Image.Image:
     result.putalpha(mask)
     return result
 
+def make_avatar_frame(avatar_img: Image.Image, size: int = 200) -> Image.Image:
+    """
+    将头像缩放并裁剪为圆形，外加一圈白色边框。
+    返回的画布比头像大16像素（四周各留8像素给边框）。
+    """
+    avatar_img = avatar_img.resize((size, size), Image.LANCZOS)
+    avatar_img = crop_to_circle(avatar_img)
+
+    avatar_canvas = Image.new("RGBA", (size + 16, size + 16), (0, 0, 0, 0))
+    draw_border = ImageDraw.Draw(avatar_canvas)
+    draw_border.ellipse((0, 0, size + 15, size + 15), outline=(255, 255, 255, 230), width=8)
+    avatar_canvas.paste(avatar_img, (8, 8), avatar_img)
+    return avatar_canvas
+
 # --- 3. 文本绘制函数 ---
 
 def get_text_dimensions(text: str, font: ImageFont.FreeTypeFont) -> Tuple[int, int]:
@@ -172,15 +269,24 @@ def text_with_outline(draw, pos, text, font, text_color, outline_color, outline_
     # 最后在顶部绘制原始文本
     draw.text(pos, text, font=font, fill=text_color)
 
+def draw_timestamp(draw: ImageDraw.Draw, width: int, height: int, fill: Tuple[int, ...] = (180, 180, 180)):
+    """
+    在卡片右下角绘制生成时间。
+    """
+    timestamp_text = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    draw.text((width - 20, height - 20), timestamp_text, font=get_font(22), fill=fill, anchor="rs")
+
 
 # --- 4. 复合组件绘制函数 ---
 
-def create_base_card(width: int, height: int, add_decorations: bool = False) -> Tuple[Optional[Image.Image], Optional[ImageDraw.Draw]]:
+def create_base_card(width: int, height: int, add_decorations: bool = False,
+                     background: Optional[Image.Image] = None) -> Tuple[Optional[Image.Image], Optional[ImageDraw.Draw]]:
     """
     创建一个包含随机背景、半透明遮罩和可选装饰的基础卡片。
+    可通过 background 指定背景图，否则随机选择。
     返回卡片对象和绘图对象。
     """
-    bg_img = get_random_background()
+    bg_img = background if background is not None else get_random_background()
     if bg_img is None:
         return None, None
         
@@ -251,13 +357,7 @@ async def draw_user_profile(
 
     # 2. 处理头像（裁剪、加边框）
     avatar_size = 200
-    avatar_img = avatar_img.resize((avatar_size, avatar_size), Image.LANCZOS)
-    avatar_img = crop_to_circle(avatar_img)
-    
-    avatar_canvas = Image.new("RGBA", (avatar_size + 16, avatar_size + 16), (0, 0, 0, 0))
-    draw_border = ImageDraw.Draw(avatar_canvas)
-    draw_border.ellipse((0, 0, avatar_size + 15, avatar_size + 15), outline=(255, 255, 255, 230), width=8)
-    avatar_canvas.paste(avatar_img, (8, 8), avatar_img)
+    avatar_canvas = make_avatar_frame(avatar_img, avatar_size)
 
     # 3. 绘制头像
     avatar_x = WIDTH // 4 - avatar_size // 2
@@ -279,4 +379,71 @@ async def draw_user_profile(
         title_text = f"「{title}」"
         title_width, _ = get_text_dimensions(title_text, title_font)
         title_y = avatar_y + avatar_size + 20 + user_name_height + 15
-        text_with_outline(draw, (WIDTH // 4 - title_width // 2, title_y), title_text, title_font, (0, 229, 255), (0,0,0))
\ No newline at end of file
+        text_with_outline(draw, (WIDTH // 4 - title_width // 2, title_y), title_text, title_font, (0, 229, 255), (0,0,0))
+
+
+# --- 5. 输出与编码函数 ---
+
+def save_card(card: Image.Image, subdir: str, file_name: str, convert_rgb: bool = True) -> str:
+    """
+    将卡片保存到 data/<subdir>/<file_name>，返回图片路径。
+    convert_rgb 为 False 时保留透明通道直接保存。
+    """
+    output_dir = os.path.join(BASE_DIR, "data", subdir)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, file_name)
+
+    if convert_rgb:
+        card.convert("RGB").save(output_path, "PNG", quality=95)
+    else:
+        card.save(output_path, "PNG")
+    return output_path
+
+# 静态资源的base64缓存：{(路径, 是否优化): (修改时间, base64字符串)}
+_base64_cache: Dict[Tuple[str, bool], Tuple[float, str]] = {}
+
+def file_to_base64(file_path: str, optimize: bool = False) -> Optional[str]:
+    """
+    读取文件并转换为base64编码（HTML渲染器专用），可选择优化图片。
+    结果按文件修改时间缓存，字体、背景等静态资源只编码一次。
+    """
+    try:
+        mtime = os.path.getmtime(file_path)
+        cache_key = (file_path, optimize)
+        cached = _base64_cache.get(cache_key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        if optimize and file_path.lower().endswith(('.jpg', '.jpeg', '.png')):
+            img = Image.open(file_path)
+            output = BytesIO()
+            if "catch" in file_path.lower() and file_path.lower().endswith('.png'):
+                # 装饰图片保持PNG以保留透明度
+                img.save(output, format='PNG', optimize=True)
+            else:
+                img.thumbnail((1200, 800), Image.LANCZOS)
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+                img.save(output, format='JPEG', quality=80, optimize=True)
+            data = output.getvalue()
+        else:
+            with open(file_path, "rb") as file:
+                data = file.read()
+
+        encoded = base64.b64encode(data).decode('utf-8')
+        _base64_cache[cache_key] = (mtime, encoded)
+        return encoded
+    except Exception as e:
+        logger.error(f"读取文件失败: {file_path}, 错误: {str(e)}")
+        return None
+
+
+def get_cache_objects() -> Dict[str, object]:
+    """返回常驻内存的资源缓存（供内存统计使用）"""
+    return {
+        "fonts": _font_cache,
+        "backgrounds": _background_cache,
+        "decorations": _decoration_cache,
+        "prefetched_images": _prefetched_images,
+        "base64": _base64_cache,
+    }
\ No newline at end of file
@@ -0,0 +1,130 @@
+# feifeisupermarket/favorability.py
+
+"""
+AstrAstr超级市场 - 好感度存储
+
+social_data 中每个用户的 favorability 字典（对其他人的好感度）仍是持久化格式，
+本存储直接引用这些字典并在内存中额外维护：
+- 按用户对索引的记录：一次查询即可得到双方互相的好感度
+- 每个用户好感度达到各关系等级下限的人数（成就检查无需遍历）
+- 取前 k 名使用 heapq.nlargest，不再对整个好感度字典排序
+"""
+
+import heapq
+from typing import Dict, Iterator, List, Tuple
+
+# 各关系等级的好感度下限：熟人、朋友、挚友、唯一的你、灵魂伴侣（见 social_events.RELATION_LEVELS）
+LEVEL_THRESHOLDS = (20, 50, 90, 100, 101)
+
+
+class FavorabilityStore:
+    """按群维护的双向好感度存储"""
+
+    def __init__(self):
+        # {群: {用户: {对方: 好感度}}}，内层字典就是 social_data 中的 favorability 字典
+        self._outgoing: Dict[str, Dict[str, Dict[str, int]]] = {}
+        # {群: {(较小ID, 较大ID): [较小→较大, 较大→较小]}}
+        self._pairs: Dict[str, Dict[Tuple[str, str], List[int]]] = {}
+        # {(群, 用户): [好感度 ≥ 各等级下限的人数]}
+        self._level_counts: Dict[Tuple[str, str], List[int]] = {}
+        # {群: 修改次数}，供按群缓存的统计结果判断是否过期
+        self._versions: Dict[str, int] = {}
+
+    @classmethod
+    def from_social_data(cls, social_data: dict) -> "FavorabilityStore":
+        """由社交数据建立索引"""
+        store = cls()
+        for group_key, group_data in social_data.items():
+            if not isinstance(group_data, dict):
+                continue
+            for user_id, user_data in group_data.items():
+                if isinstance(user_data, dict) and isinstance(user_data.get("favorability"), dict):
+                    store.bind(group_key, user_id, user_data["favorability"])
+        return store
+
+    def bind(self, group_key: str, user_id: str, favorability: Dict[str, int]):
+        """登记用户的好感度字典（已登记的同一字典直接返回）"""
+        group_outgoing = self._outgoing.setdefault(group_key, {})
+        previous = group_outgoing.get(user_id)
+        if previous is favorability:
+            return
+        pairs = self._pairs.setdefault(group_key, {})
+        if previous is not None:
+            # 用户数据被整体替换：先清除旧字典在记录中的方向
+            for target_id in previous:
+                key, direction = self._pair_key(user_id, target_id)
+                if key in pairs:
+                    pairs[key][direction] = 0
+        group_outgoing[user_id] = favorability
+        self._versions[group_key] = self._versions.get(group_key, 0) + 1
+        counts = self._level_counts[(group_key, user_id)] = [0] * len(LEVEL_THRESHOLDS)
+        for target_id, value in favorability.items():
+            key, direction = self._pair_key(user_id, target_id)
+            pairs.setdefault(key, [0, 0])[direction] = value
+            for i, threshold in enumerate(LEVEL_THRESHOLDS):
+                if value >= threshold:
+                    counts[i] += 1
+
+    @staticmethod
+    def _pair_key(user_a_id: str, user_b_id: str) -> Tuple[Tuple[str, str], int]:
+        """用户对的键，以及 A→B 在记录中的位置"""
+        if str(user_a_id) <= str(user_b_id):
+            return (user_a_id, user_b_id), 0
+        return (user_b_id, user_a_id), 1
+
+    def get(self, group_key: str, user_a_id: str, user_b_id: str) -> int:
+        """用户A对用户B的好感度"""
+        return self._outgoing.get(group_key, {}).get(user_a_id, {}).get(user_b_id, 0)
+
+    def get_pair(self, group_key: str, user_a_id: str, user_b_id: str) -> Tuple[int, int]:
+        """(A→B, B→A) 的好感度"""
+        key, direction = self._pair_key(user_a_id, user_b_id)
+        record = self._pairs.get(group_key, {}).get(key)
+        if record is None:
+            return 0, 0
+        return record[direction], record[1 - direction]
+
+    def set(self, group_key: str, user_a_id: str, user_b_id: str, value: int) -> int:
+        """设置用户A对用户B的好感度（用户A须已登记），同步更新记录与等级计数"""
+        favorability = self._outgoing[group_key][user_a_id]
+        old_value = favorability.get(user_b_id, 0)
+        favorability[user_b_id] = value
+
+        key, direction = self._pair_key(user_a_id, user_b_id)
+        self._pairs.setdefault(group_key, {}).setdefault(key, [0, 0])[direction] = value
+        self._versions[group_key] = self._versions.get(group_key, 0) + 1
+
+        counts = self._level_counts[(group_key, user_a_id)]
+        for i, threshold in enumerate(LEVEL_THRESHOLDS):
+            if old_value < threshold <= value:
+                counts[i] += 1
+            elif value < threshold <= old_value:
+                counts[i] -= 1
+        return value
+
+    def top(self, group_key: str, user_id: str, k: int, min_value: int = 1) -> List[Tuple[str, int]]:
+        """用户好感度最高的 k 个人 [(对方, 好感度)]，只包含不低于 min_value 的"""
+        favorability = self._outgoing.get(group_key, {}).get(user_id, {})
+        best = heapq.nlargest(k, favorability.items(), key=lambda item: item[1])
+        return [(target_id, value) for target_id, value in best if value >= min_value]
+
+    def count_at_least(self, group_key: str, user_id: str, threshold: int) -> int:
+        """用户好感度不低于 threshold 的人数（threshold 为等级下限时 O(1)）"""
+        if threshold in LEVEL_THRESHOLDS:
+            counts = self._level_counts.get((group_key, user_id))
+            return counts[LEVEL_THRESHOLDS.index(threshold)] if counts else 0
+        favorability = self._outgoing.get(group_key, {}).get(user_id, {})
+        return sum(1 for value in favorability.values() if value >= threshold)
+
+    def version(self, group_key: str) -> int:
+        """群内好感度的修改次数（没有变化时保持不变）"""
+        return self._versions.get(group_key, 0)
+
+    def members(self, group_key: str) -> List[str]:
+        """群内已登记好感度数据的用户"""
+        return list(self._outgoing.get(group_key, {}))
+
+    def pairs(self, group_key: str) -> Iterator[Tuple[str, str, int, int]]:
+        """遍历群内所有用户对 (较小ID, 较大ID, 较小→较大, 较大→较小)"""
+        for (user_a_id, user_b_id), (a_to_b, b_to_a) in self._pairs.get(group_key, {}).items():
+            yield user_a_id, user_b_id, a_to_b, b_to_a
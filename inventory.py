@@ -0,0 +1,172 @@
+# feifeisupermarket/inventory.py
+
+"""
+AstrAstr超级市场 - 背包与物品索引
+
+- Inventory: 管理 shop_data 中的用户背包，缓存每个用户的物品总数，
+  增减物品时同步维护，不再每次遍历整个背包求和
+- ItemIndex: 预先建立的 物品ID / 名称 / 别名 → 物品ID 索引，
+  供 买入、使用、一键使用、赠礼、缔结 等指令共用，支持前缀与模糊查找
+"""
+
+import bisect
+import difflib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .shop_items import SHOP_DATA, ITEM_ALIASES
+
+BAG_CAPACITY = 100  # 背包总容量
+MAX_ITEM_STACK = 10  # 单个物品的持有上限
+
+
+class ItemIndex:
+    """物品名称索引（不区分大小写）"""
+
+    def __init__(self, shop_data: Dict[str, Dict[str, dict]] = SHOP_DATA,
+                 aliases: Dict[str, str] = ITEM_ALIASES):
+        self._category: Dict[str, str] = {}  # {物品ID: 分类}
+        self._keys: Dict[str, str] = {}  # {小写的ID/名称/别名: 物品ID}
+        for category, items in shop_data.items():
+            for item_id, item in items.items():
+                self._category[item_id] = category
+                self._keys[item_id.lower()] = item_id
+                self._keys[item["name"].lower()] = item_id
+        for alias, item_id in aliases.items():
+            if item_id in self._category:
+                self._keys.setdefault(alias.lower(), item_id)
+        self._sorted_keys = sorted(self._keys)
+
+    def category_of(self, item_id: str) -> Optional[str]:
+        return self._category.get(item_id)
+
+    def _in_categories(self, item_id: str, categories: Optional[Iterable[str]]) -> bool:
+        return categories is None or self._category[item_id] in categories
+
+    def resolve(self, name: str, categories: Optional[Iterable[str]] = None) -> Optional[str]:
+        """按ID、名称或别名精确查找物品ID"""
+        item_id = self._keys.get(str(name).strip().lower())
+        if item_id and self._in_categories(item_id, categories):
+            return item_id
+        return None
+
+    def prefix_matches(self, prefix: str, categories: Optional[Iterable[str]] = None) -> List[str]:
+        """以指定前缀开头的物品ID（按名称排序、去重）"""
+        prefix = str(prefix).strip().lower()
+        if not prefix:
+            return []
+        matches: Dict[str, None] = {}
+        start = bisect.bisect_left(self._sorted_keys, prefix)
+        for key in self._sorted_keys[start:]:
+            if not key.startswith(prefix):
+                break
+            item_id = self._keys[key]
+            if self._in_categories(item_id, categories):
+                matches[item_id] = None
+        return list(matches)
+
+    def suggest(self, name: str, categories: Optional[Iterable[str]] = None, limit: int = 3) -> List[str]:
+        """模糊查找相近的物品ID（包含关系优先，其次按相似度）"""
+        name = str(name).strip().lower()
+        if not name:
+            return []
+        candidates = [key for key in self._sorted_keys if self._in_categories(self._keys[key], categories)]
+        ranked = [key for key in candidates if name in key or key in name]
+        ranked += difflib.get_close_matches(name, candidates, n=limit * 2, cutoff=0.5)
+        suggestions: Dict[str, None] = {}
+        for key in ranked:
+            suggestions[self._keys[key]] = None
+            if len(suggestions) >= limit:
+                break
+        return list(suggestions)
+
+    def lookup(self, name: str, categories: Optional[Iterable[str]] = None) -> Tuple[Optional[str], List[str]]:
+        """
+        查找物品：精确匹配或唯一的前缀匹配时返回物品ID，否则返回候选建议。
+
+        Returns:
+            (物品ID或None, 候选物品ID列表)
+        """
+        item_id = self.resolve(name, categories)
+        if item_id:
+            return item_id, []
+        matches = self.prefix_matches(name, categories)
+        if len(matches) == 1:
+            return matches[0], []
+        return None, matches or self.suggest(name, categories)
+
+
+item_index = ItemIndex()
+
+
+class Inventory:
+    """
+    用户背包管理。背包数据仍保存在 shop_data 中（格式不变），
+    每个用户的物品总数在首次访问时统计一次，之后随增减同步更新。
+    """
+
+    def __init__(self, shop_data: dict, index: ItemIndex = item_index):
+        self.shop_data = shop_data
+        self.index = index
+        self._totals: Dict[Tuple[str, str], int] = {}  # {(群, 用户): 物品总数}
+        self._prepared: Set[Tuple[str, str]] = set()  # 已补全字段的用户
+
+    @staticmethod
+    def _group_key(group_id: str) -> str:
+        return str(group_id) if group_id else "private_chat"
+
+    def user_data(self, group_id: str, user_id: str) -> dict:
+        """获取用户的商店数据，如果不存在则创建；旧数据的字段补全每个用户只做一次"""
+        key = (self._group_key(group_id), user_id)
+        group_shop_data = self.shop_data.setdefault(key[0], {})
+        user_shop_data = group_shop_data.setdefault(user_id, {})
+        if key not in self._prepared:
+            user_shop_data.setdefault("inventory", {})
+            user_shop_data.setdefault("purchase_history", [])
+            user_shop_data.setdefault("use_history", [])
+            for category in SHOP_DATA.keys():
+                user_shop_data["inventory"].setdefault(category, {})
+            self._prepared.add(key)
+        return user_shop_data
+
+    def bag(self, group_id: str, user_id: str) -> Dict[str, Dict[str, int]]:
+        """用户背包 {分类: {物品ID: 数量}}"""
+        return self.user_data(group_id, user_id)["inventory"]
+
+    def total(self, group_id: str, user_id: str) -> int:
+        """背包中的物品总数"""
+        key = (self._group_key(group_id), user_id)
+        total = self._totals.get(key)
+        if total is None:
+            total = sum(sum(items.values()) for items in self.bag(group_id, user_id).values())
+            self._totals[key] = total
+        return total
+
+    def count(self, group_id: str, user_id: str, item_id: str) -> int:
+        """背包中某个物品的数量"""
+        category = self.index.category_of(item_id)
+        return self.bag(group_id, user_id).get(category, {}).get(item_id, 0)
+
+    def free_space(self, group_id: str, user_id: str, item_id: str) -> int:
+        """还能放入多少个该物品（同时受背包总容量与单个物品上限限制）"""
+        return max(0, min(BAG_CAPACITY - self.total(group_id, user_id),
+                          MAX_ITEM_STACK - self.count(group_id, user_id, item_id)))
+
+    def add(self, group_id: str, user_id: str, item_id: str, quantity: int = 1):
+        """放入物品（容量检查由调用方负责）"""
+        total = self.total(group_id, user_id)
+        category_bag = self.bag(group_id, user_id)[self.index.category_of(item_id)]
+        category_bag[item_id] = category_bag.get(item_id, 0) + quantity
+        self._totals[(self._group_key(group_id), user_id)] = total + quantity
+
+    def remove(self, group_id: str, user_id: str, item_id: str, quantity: int = 1) -> bool:
+        """取出物品，数量不足时不做任何修改并返回 False"""
+        category_bag = self.bag(group_id, user_id).get(self.index.category_of(item_id), {})
+        if category_bag.get(item_id, 0) < quantity:
+            return False
+        total = self.total(group_id, user_id)
+        category_bag[item_id] -= quantity
+        self._totals[(self._group_key(group_id), user_id)] = total - quantity
+        return True
+
+    def get_stats(self) -> dict:
+        return {"cached_users": len(self._totals), "prepared_users": len(self._prepared)}
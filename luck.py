@@ -3,9 +3,13 @@ import random
 from datetime import datetime
 from astrbot.api import logger
 import traceback
+from typing import Any, Dict, List, Optional, Tuple
 from astrbot.api.event import MessageChain
 from astrbot.api.message_components import At, Image, Plain
 
+from .sampling import AliasSampler
+from .buffs import buff_engine
+
 # 抽奖等级配置
 LOTTERY_LEVELS = {
     "6星": range(1, 11),       # 1-10
@@ -39,10 +43,158 @@ LEVEL_DESCRIPTIONS = {
     "隐藏": "你触发了隐藏气运，超低概率事件！今天或有意外惊喜降临。"
 }
 
-async def process_lottery(event, group_id: str, user_id: str, user_name: str, user_data: dict, shop_manager=None) -> tuple:
+# 每次抽奖的费用与每日次数上限
+LOTTERY_COST = 15
+LOTTERY_DAILY_LIMIT = 3
+
+# 星级排序（隐藏 > 6星 > ... > 1星），择优券按此取最佳结果
+LOTTERY_STAR_RANK = {"6星": 6, "5星": 5, "4星": 4, "3星": 3, "2星": 2, "1星": 1, "隐藏": 7}
+# 幸运药水：抽到这些等级时改为随机的3星及以上等级
+LOTTERY_LOW_LEVELS = ("1星", "2星")
+LOTTERY_BETTER_LEVELS = ("3星", "4星", "5星", "6星")
+
+
+class LotteryEngine:
+    """
+    表驱动的抽奖引擎（在模块加载时编译一次）：
+    - 幸运数字 → 等级 的直接索引表，不再逐个扫描 range
+    - 幸运药水 / 择优券 的每种组合下幸运数字的精确条件分布，编译为别名抽样器，
+      每次抽奖只需一次 O(1) 抽样
+    幸运四叶草只影响奖励数额，不改变幸运数字的分布。
+    """
+
+    def __init__(self, levels: dict, rewards: dict):
+        self.levels = levels
+        self.rewards = rewards
+        self.max_number = max(max(numbers) for numbers in levels.values())
+
+        # 幸运数字 → 等级（下标即幸运数字，0号位不使用）
+        self._number_to_level: List[Optional[str]] = [None] * (self.max_number + 1)
+        for level_name, numbers in levels.items():
+            for number in numbers:
+                if self._number_to_level[number] is None:
+                    self._number_to_level[number] = level_name
+
+        self._samplers: Dict[Tuple[bool, bool], AliasSampler] = {}
+        for min_3star in (False, True):
+            for best_of_two in (False, True):
+                self._samplers[(min_3star, best_of_two)] = self._compile_sampler(min_3star, best_of_two)
+
+    def level_of(self, lucky_number: int) -> Optional[str]:
+        """幸运数字对应的等级"""
+        if 0 < lucky_number <= self.max_number:
+            return self._number_to_level[lucky_number]
+        return None
+
+    def _compile_sampler(self, min_3star: bool, best_of_two: bool) -> AliasSampler:
+        """计算给定道具组合下最终幸运数字的分布"""
+        numbers = range(1, self.max_number + 1)
+        single = {number: 1 / self.max_number for number in numbers}
+
+        # 幸运药水：低等级的概率平均分给各个3星及以上等级，再平均分给该等级内的幸运数字
+        if min_3star:
+            low_mass = 0.0
+            for number in numbers:
+                if self._number_to_level[number] in LOTTERY_LOW_LEVELS:
+                    low_mass += single[number]
+                    single[number] = 0.0
+            for level_name in LOTTERY_BETTER_LEVELS:
+                level_numbers = list(self.levels[level_name])
+                for number in level_numbers:
+                    single[number] += low_mass / len(LOTTERY_BETTER_LEVELS) / len(level_numbers)
+
+        if not best_of_two:
+            final = single
+        else:
+            # 择优券：两次独立抽取，取星级更高者（星级相同时保留第一次的结果）
+            rank = {number: LOTTERY_STAR_RANK.get(self._number_to_level[number], 0) for number in numbers}
+            mass_by_rank: Dict[int, float] = {}
+            for number in numbers:
+                mass_by_rank[rank[number]] = mass_by_rank.get(rank[number], 0.0) + single[number]
+            final = {}
+            for number in numbers:
+                not_higher = sum(m for r, m in mass_by_rank.items() if r <= rank[number])
+                lower = sum(m for r, m in mass_by_rank.items() if r < rank[number])
+                final[number] = single[number] * (not_higher + lower)
+
+        candidates = [number for number in numbers if final[number] > 0]
+        return AliasSampler(candidates, [final[number] for number in candidates])
+
+    def draw(self, buffs: dict, rng: Any = random) -> dict:
+        """
+        进行一次抽奖，并按插件规则消耗 buffs 中的道具效果（直接修改传入的字典）。
+
+        Returns:
+            dict: {"lucky_number", "level", "reward", "base_reward", "min_3star", "double_reward", "best_of_two"}
+        """
+        effects = {
+            key: buff_engine.consume(buffs, key)
+            for key in ("lottery_min_3star", "lottery_double_reward", "lottery_best_of_two")
+        }
+
+        lucky_number = self._samplers[(effects["lottery_min_3star"], effects["lottery_best_of_two"])].sample(rng)
+        level = self._number_to_level[lucky_number]
+        min_reward, max_reward = self.rewards[level]
+        base_reward = rng.randint(min_reward, max_reward)
+        reward = base_reward * 2 if effects["lottery_double_reward"] and base_reward > 0 else base_reward
+
+        return {
+            "lucky_number": lucky_number,
+            "level": level,
+            "reward": reward,
+            "base_reward": base_reward,
+            "min_3star": effects["lottery_min_3star"],
+            "double_reward": effects["lottery_double_reward"],
+            "best_of_two": effects["lottery_best_of_two"],
+        }
+
+    def draw_batch(self, buffs: dict, count: int, rng: Any = random) -> List[dict]:
+        """连续抽奖 count 次（每次各自消耗道具效果），结果与逐次调用 draw 相同"""
+        return [self.draw(buffs, rng) for _ in range(count)]
+
+
+lottery_engine = LotteryEngine(LOTTERY_LEVELS, LOTTERY_REWARDS)
+
+
+def _get_lottery_image(lucky_number: int) -> Optional[str]:
+    """根据幸运数字范围匹配图片，图片不存在时返回None"""
+    image_filename = ""
+    if 1 <= lucky_number <= 10:
+        image_filename = "a.jpg"
+    elif 11 <= lucky_number <= 44:
+        image_filename = "b.jpg"
+    elif 45 <= lucky_number <= 80:
+        image_filename = "c.jpg"
+    elif 81 <= lucky_number <= 110:
+        image_filename = "d.jpg"
+    elif lucky_number == 111:
+        image_filename = "e.jpg"
+
+    if not image_filename:
+        return None
+    image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "luck", image_filename)
+    if not os.path.exists(image_path):
+        logger.warning(f"抽奖图片不存在: {image_path}, 将只发送文本消息。")
+        return None
+    return image_path
+
+
+def _record_lottery_stats(user_data: dict, level: str):
+    """更新欧气相关的统计数据"""
+    if level in ("6星", "隐藏"):
+        user_data["high_tier_wins"] = user_data.get("high_tier_wins", 0) + 1
+        user_data["consecutive_1star"] = 0
+    elif level == "1星":
+        user_data["consecutive_1star"] = user_data.get("consecutive_1star", 0) + 1
+    else:
+        user_data["consecutive_1star"] = 0
+
+
+async def process_lottery(event, group_id: str, user_id: str, user_name: str, user_data: dict, shop_manager=None, times: int = 1, rng=None) -> tuple:
     """
     处理抽奖逻辑, 返回 (消息组件列表, 更新后的用户数据, 中奖等级)
-    现在支持道具效果
+    现在支持道具效果；times > 1 时一次完成多次抽奖（费用与次数一并结算，调用方只需保存一次），
+    返回的中奖等级为其中星级最高的一次
     
     Args:
         event: 消息事件
@@ -51,6 +203,8 @@ async def process_lottery(event, group_id: str, user_id: str, user_name: str, us
         user_name: 用户名称
         user_data: 用户数据
         shop_manager: 商店管理器实例，由main.py传入
+        times: 本次抽奖次数
+        rng: 抽奖使用的随机流，缺省时使用全局 random
     """
     try:
         today = datetime.now().strftime("%Y-%m-%d")
@@ -60,156 +214,108 @@ async def process_lottery(event, group_id: str, user_id: str, user_name: str, us
         if last_play_date != today:
             play_count = 0
             
-        if play_count >= 3:
-            msg = [At(qq=user_id), Plain(f" 你今天已经抽奖3次了，明天再来吧~")]
+        if play_count >= LOTTERY_DAILY_LIMIT:
+            msg = [At(qq=user_id), Plain(f" 你今天已经抽奖{LOTTERY_DAILY_LIMIT}次了，明天再来吧~")]
+            return (msg, None, None)
+
+        if play_count + times > LOTTERY_DAILY_LIMIT:
+            msg = [At(qq=user_id), Plain(f" 你今天只剩 {LOTTERY_DAILY_LIMIT - play_count} 次抽奖机会了~")]
             return (msg, None, None)
         
-        if user_data["points"] < 15:
-            msg = [At(qq=user_id), Plain(f" 抽奖需要15Astr币，你只有{user_data['points']:.2f}Astr币~")]
+        total_cost = LOTTERY_COST * times
+        if user_data["points"] < total_cost:
+            msg = [At(qq=user_id), Plain(f" 抽奖需要{total_cost}Astr币，你只有{user_data['points']:.2f}Astr币~")]
             return (msg, None, None)
         
         # 扣除抽奖费用
-        user_data["points"] -= 15
+        user_data["points"] -= total_cost
         user_data["lottery_date"] = today
-        user_data["lottery_count"] = play_count + 1
-        
-        # --- [修改] 检查并应用道具效果 ---
-        buffs = user_data.get('buffs', {})
-        
-        # 检查最低3星保障
-        min_3star = False
-        if shop_manager and buffs.get("lottery_min_3star", 0) > 0:
-            min_3star = True
-            buffs["lottery_min_3star"] -= 1
-            logger.info(f"用户 {user_id} 使用了幸运药水效果，本次抽奖至少3星")
-        
-        # 检查奖励翻倍效果
-        double_reward = False
-        if shop_manager and buffs.get("lottery_double_reward", 0) > 0:
-            double_reward = True
-            buffs["lottery_double_reward"] -= 1
-            logger.info(f"用户 {user_id} 使用了幸运四叶草效果，本次奖励翻倍")
-        
-        # 检查双抽取最佳效果
-        best_of_two = False
-        if shop_manager and buffs.get("lottery_best_of_two", 0) > 0:
-            best_of_two = True
-            buffs["lottery_best_of_two"] -= 1
-            logger.info(f"用户 {user_id} 使用了双生星愿效果，本次抽两次取最佳")
+        user_data["lottery_count"] = play_count + times
         
-        # 清理空的buff项
-        user_data["buffs"] = {k: v for k, v in buffs.items() if v > 0}
-        
-        # --- [修改] 抽奖逻辑，考虑道具效果 ---
-        results = []
-        
-        # 进行一次或两次抽奖
-        for _ in range(2 if best_of_two else 1):
-            lucky_number = random.randint(1, 111)
-            temp_level = None
-            
-            # 找出对应等级
-            for level_name, number_range in LOTTERY_LEVELS.items():
-                if lucky_number in number_range:
-                    temp_level = level_name
-                    break
-            
-            # 应用最低3星保障
-            if min_3star and temp_level in ["1星", "2星"]:
-                # 随机选择一个3星及以上的等级
-                better_levels = ["3星", "4星", "5星", "6星"]
-                temp_level = random.choice(better_levels)
-                # 重新选择一个对应等级的lucky_number
-                lucky_number = random.choice(list(LOTTERY_LEVELS[temp_level]))
-            
-            results.append((lucky_number, temp_level))
-        
-        # 如果是双抽取最佳，选择星级最高的结果
-        if best_of_two:
-            # 按照星级排序（6星>5星>...>1星）
-            star_rank = {"6星": 6, "5星": 5, "4星": 4, "3星": 3, "2星": 2, "1星": 1, "隐藏": 7}
-            results.sort(key=lambda x: star_rank.get(x[1], 0), reverse=True)
-            
-        # 最终结果
-        lucky_number, level = results[0]
-            
-        if not level:
-            logger.error(f"抽奖数字 {lucky_number} 没有对应的等级")
-            return (None, None, None)
-            
-        # 更新统计数据
-        if level == "6星":
-            user_data["high_tier_wins"] = user_data.get("high_tier_wins", 0) + 1
-            user_data["consecutive_1star"] = 0
-        elif level == "隐藏":
-            user_data["high_tier_wins"] = user_data.get("high_tier_wins", 0) + 1
-            user_data["consecutive_1star"] = 0
-        elif level == "1星":
-            user_data["consecutive_1star"] = user_data.get("consecutive_1star", 0) + 1
-        else:
-            user_data["consecutive_1star"] = 0
+        # --- 抽奖（道具效果由抽奖引擎按次消耗）---
+        buffs = user_data.setdefault('buffs', {}) if shop_manager else {}
+        draws = lottery_engine.draw_batch(buffs, times, rng or random)
 
-        # 计算奖励
-        min_reward, max_reward = LOTTERY_REWARDS[level]
-        reward = random.randint(min_reward, max_reward)
-        
-        # 应用奖励翻倍效果
-        bonus_text = ""
-        if double_reward and reward > 0:
-            original_reward = reward
-            reward *= 2
-            bonus_text = f"[幸运四叶草效果] 奖励翻倍：{original_reward} → {reward}Astr币！\n"
-        
-        user_data["points"] += reward
-        description = LEVEL_DESCRIPTIONS[level]
-        
-        # --- [修改] 根据幸运数字范围匹配图片 ---
-        image_filename = ""
-        if 1 <= lucky_number <= 10:
-            image_filename = "a.jpg"
-        elif 11 <= lucky_number <= 44:
-            image_filename = "b.jpg"
-        elif 45 <= lucky_number <= 80:
-            image_filename = "c.jpg"
-        elif 81 <= lucky_number <= 110:
-            image_filename = "d.jpg"
-        elif lucky_number == 111:
-            image_filename = "e.jpg"
-
-        image_path = None
-        if image_filename:
-            # 准备图片路径
-            image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "luck", image_filename)
-            if not os.path.exists(image_path):
-                logger.warning(f"抽奖图片不存在: {image_path}, 将只发送文本消息。")
-                image_path = None
-        # --- [修改结束] ---
-
-        # 准备消息
-        effect_prefix = ""
-        if best_of_two:
-            effect_prefix = "[双生星愿效果] 从两次抽奖中选择了最佳结果！\n"
-        elif min_3star:
-            effect_prefix = "[幸运药水效果] 保障了至少3星的结果！\n"
-            
-        message_chain_list = [
-            At(qq=user_id),
-            Plain(f" {effect_prefix}{bonus_text}你抽到了 {level} (幸运数字: {lucky_number})! 这是你今天的第 {user_data['lottery_count']} 次抽奖。\n{description}\n")
-        ]
-        
-        if reward > 0:
-            message_chain_list.append(Plain(f"获得奖励: {reward} Astr币\n"))
+        best_level = None
+        for draw in draws:
+            if draw["min_3star"]:
+                logger.info(f"用户 {user_id} 使用了幸运药水效果，本次抽奖至少3星")
+            if draw["double_reward"]:
+                logger.info(f"用户 {user_id} 使用了幸运四叶草效果，本次奖励翻倍")
+            if draw["best_of_two"]:
+                logger.info(f"用户 {user_id} 使用了双生星愿效果，本次抽两次取最佳")
+
+            _record_lottery_stats(user_data, draw["level"])
+            user_data["points"] += draw["reward"]
+            if best_level is None or LOTTERY_STAR_RANK[draw["level"]] > LOTTERY_STAR_RANK[best_level]:
+                best_level = draw["level"]
+
+        if times == 1:
+            message_chain_list = _build_single_draw_message(user_id, user_data, draws[0])
         else:
-            message_chain_list.append(Plain("没有获得Astr币奖励。\n"))
-        
-        message_chain_list.append(Plain(f"当前Astr币: {user_data['points']:.2f}"))
-        
-        if image_path:
-            message_chain_list.append(Image.fromFileSystem(image_path))
-        
-        return (message_chain_list, user_data, level)
+            message_chain_list = _build_batch_draw_message(user_id, user_data, draws)
+
+        return (message_chain_list, user_data, best_level)
         
     except Exception as e:
         logger.error(f"抽奖过程中出错: {str(e)}")
         traceback.print_exc()
         return (None, None, None)
+
+
+def _effect_prefix(draw: dict) -> str:
+    """道具效果提示"""
+    if draw["best_of_two"]:
+        return "[双生星愿效果] 从两次抽奖中选择了最佳结果！\n"
+    if draw["min_3star"]:
+        return "[幸运药水效果] 保障了至少3星的结果！\n"
+    return ""
+
+
+def _build_single_draw_message(user_id: str, user_data: dict, draw: dict) -> list:
+    """单次抽奖的消息"""
+    level, lucky_number, reward = draw["level"], draw["lucky_number"], draw["reward"]
+    bonus_text = ""
+    if draw["double_reward"] and reward > 0:
+        bonus_text = f"[幸运四叶草效果] 奖励翻倍：{draw['base_reward']} → {reward}Astr币！\n"
+
+    message_chain_list = [
+        At(qq=user_id),
+        Plain(f" {_effect_prefix(draw)}{bonus_text}你抽到了 {level} (幸运数字: {lucky_number})! 这是你今天的第 {user_data['lottery_count']} 次抽奖。\n{LEVEL_DESCRIPTIONS[level]}\n")
+    ]
+    
+    if reward > 0:
+        message_chain_list.append(Plain(f"获得奖励: {reward} Astr币\n"))
+    else:
+        message_chain_list.append(Plain("没有获得Astr币奖励。\n"))
+    
+    message_chain_list.append(Plain(f"当前Astr币: {user_data['points']:.2f}"))
+    
+    image_path = _get_lottery_image(lucky_number)
+    if image_path:
+        message_chain_list.append(Image.fromFileSystem(image_path))
+    
+    return message_chain_list
+
+
+def _build_batch_draw_message(user_id: str, user_data: dict, draws: List[dict]) -> list:
+    """多次抽奖的汇总消息（只附带星级最高一次的图片）"""
+    lines = [f" 你进行了 {len(draws)} 次抽奖（今天已抽 {user_data['lottery_count']} 次）："]
+    for i, draw in enumerate(draws, 1):
+        effects = [_effect_prefix(draw).strip()]
+        if draw["double_reward"] and draw["reward"] > 0:
+            effects.append("[幸运四叶草效果] 奖励翻倍")
+        effect_text = " ".join(e for e in effects if e)
+        reward_text = f"+{draw['reward']} Astr币" if draw["reward"] > 0 else "没有获得Astr币"
+        lines.append(f"{i}. {draw['level']} (幸运数字: {draw['lucky_number']}) {reward_text} {effect_text}".rstrip())
+
+    total_reward = sum(draw["reward"] for draw in draws)
+    lines.append(f"共获得: {total_reward} Astr币，花费: {LOTTERY_COST * len(draws)} Astr币")
+    lines.append(f"当前Astr币: {user_data['points']:.2f}")
+
+    message_chain_list = [At(qq=user_id), Plain("\n".join(lines))]
+    best_draw = max(draws, key=lambda draw: LOTTERY_STAR_RANK[draw["level"]])
+    image_path = _get_lottery_image(best_draw["lucky_number"])
+    if image_path:
+        message_chain_list.append(Image.fromFileSystem(image_path))
+    return message_chain_list
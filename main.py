@@ -1,88 +1,258 @@
 import os
-import yaml
 import random
 import time
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime
 
-from astrbot.api.event import filter, AstrMessageEvent
+# 记录模块导入耗时（启动耗时报告）
+_IMPORT_STARTED = time.perf_counter()
+
+from astrbot.api.event import filter, AstrMessageEvent, MessageChain
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger
 from astrbot.api.all import *
 import astrbot.api.message_components as Comp
 
-from ._generate_card import generate_sign_card, generate_sign_card_pillow 
 from .re_sign import perform_re_sign
 from .qsin import process_sign_in 
 from .market import MarketManager, JOBS  # 导入商城管理器
 from .shop_manager import ShopManager
-from ._generate_leaderboard import generate_leaderboard_image
-from ._generate_achievements import generate_achievements_image
-from ._generate_shop import generate_backpack_card
 from .achievements import ACHIEVEMENTS
-from ._generate_shop import generate_shop_card
 from .shop_items import SHOP_DATA
+from .inventory import item_index, BAG_CAPACITY, MAX_ITEM_STACK
+from .buffs import buff_engine
 from .adventure import AdventureManager
-from .social import SocialManager
+from .social import SocialManager, DATE_INVITATION_TIMEOUT_SECONDS
 from .social_events import SPECIAL_RELATION_ITEMS, SPECIAL_RELATION_TYPES
-from ._command_card import generate_command_card
+from .render_scheduler import RenderScheduler, PRIORITY_NORMAL, PRIORITY_LOW
+from .renderer_selector import RendererSelector
+from .session_store import SessionStore
+from .rng import RNGService, STREAM_WORK, STREAM_LOTTERY, STREAM_ADVENTURE, STREAM_DATE, STREAM_ITEM
+from .metrics import metrics, timed, instrument_command, MetricsServer, CATEGORY_NAMES
+from .tracing import tracer, traced
+from .memory_inspector import MemoryInspector, format_bytes, process_rss_mb
+from .startup import StartupReport, LazyComponent, ensure_loaded, preload_components, requires_components
+from .storage import YamlStore
+
+# 图片生成相关模块（依赖 Pillow、aiohttp）在使用处导入，启动后由后台线程预先导入
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 # 清理任务的执行周期（单位：小时），例如每小时检查一次
 CLEANUP_INTERVAL_HOURS = 1 
 # 图片文件的最大保留时间（单位：天），例如只保留最近1天的图片
 MAX_FILE_AGE_DAYS = 1
+# 同时进行的图片渲染数量上限
+RENDER_MAX_CONCURRENCY = 2
+# 渲染排队的最长等待时间（单位：秒），超时后回退到文本回复
+RENDER_QUEUE_TIMEOUT_SECONDS = 8
+# 渲染队列的最大长度，超过后新的渲染请求直接回退到文本回复
+RENDER_MAX_QUEUE_SIZE = 64
+# 多进程渲染池的工作进程数量，0 表示关闭（在主进程内渲染）
+RENDER_FARM_WORKERS = 0
+# 签到卡片首选渲染方式超过该时间（单位：秒）仍未完成时，同时启动备用渲染方式
+RENDER_HEDGE_DELAY_SECONDS = 3
+# 数据加载完成后在后台预先导入的渲染模块，避免第一次作图时才导入
+RENDER_WARM_MODULES = (
+    "._generate_card", "._generate_leaderboard", "._generate_market", "._generate_shop",
+    "._generate_adventure", "._generate_social", "._generate_achievements", "._command_card",
+)
+# 单次冒险指令（含超级冒险）的最大冒险次数
+MAX_ADVENTURE_TIMES = 50
+# 冒险报告文本模式下最多逐条列出的事件数量
+ADVENTURE_TEXT_MAX_EVENTS = 20
+# 随机数总种子，None 表示使用系统熵；设为固定值时各玩法的随机结果可复现
+RNG_SEED = None
+# 随机数录制文件名（保存在数据目录下），非空时录制各玩法的随机数并在插件终止时保存，用于回放复现
+RNG_RECORD_FILE = ""
+# 补签提示的有效时间（单位：秒）与同时等待回复的补签提示上限
+RESIGN_DECISION_TIMEOUT_SECONDS = 60
+MAX_PENDING_RESIGN_DECISIONS = 1000
+# 约会邀请过期检查的周期（单位：秒），到期的邀请会被清理并提醒发起者
+INVITATION_REAP_INTERVAL_SECONDS = 5
+# 性能指标 HTTP 监听端口（Prometheus 文本格式，地址 http://127.0.0.1:<端口>/metrics），0 表示关闭
+METRICS_PORT = 0
+# "性能统计"指令每个类别展示的条目数量
+METRICS_SUMMARY_LIMIT = 8
+# 指令耗时超过该值（单位：秒）时输出分段明细日志，并写入追踪文件
+SLOW_TRACE_THRESHOLD_SECONDS = 2
+# 未超过阈值的指令追踪写入文件的抽样比例（0~1），0 表示只记录慢指令
+TRACE_SAMPLE_RATE = 0.01
+# 追踪文件名（保存在数据目录下，按大小滚动），为空时不写文件
+TRACE_LOG_FILE = "traces.log"
+# "内存统计"指令每部分展示的条目数量
+MEMORY_SUMMARY_LIMIT = 12
+# 内存快照导出目录（保存在数据目录下）与最多保留的导出次数
+MEMORY_DUMP_DIR = "memory_dumps"
+MAX_MEMORY_DUMPS = 10
 
 @register("astrbot_plugin_Astrsupermarket", "和泉智宏", "Astr超级市场", "1.1", "https://github.com/0d00-Ciallo-0721/astrbot_plugin_Astrsupermarket")
 class SignPlugin(Star):
     def __init__(self, context: Context):
         super().__init__(context)
+        self.startup_report = StartupReport()
+        self.startup_report.record("导入模块", _IMPORT_SECONDS)
+        init_started = time.perf_counter()
+
         # 确保必要的目录存在
         self.plugin_dir = os.path.dirname(os.path.abspath(__file__))
         self.data_dir = os.path.join(self.plugin_dir, "data/feifeiQsign")
         os.makedirs(self.data_dir, exist_ok=True)
         
-        # 用户数据文件路径
+        # 用户数据文件路径（多进程安全的读写）
         self.user_data_file = os.path.join(self.data_dir, "user_data.yaml")
+        self.user_data_store = YamlStore(self.user_data_file, "用户数据")
         
-        # 初始化用户数据
-        self.user_data = self._load_user_data()
-        
-        # 初始化一个字典来存储待处理的补签决策
-        self.pending_resign_decisions = {}
-        
-        # 初始化商城管理器
-        self.market = MarketManager(self.data_dir)
-        
-        # 初始化商店管理器（新增）
-        self.shop_manager = ShopManager(self.data_dir)
-        
-        # 初始化大冒险管理器（新增）
-        self.adventure_manager = AdventureManager()
+        # 存储待处理的补签决策（超时自动失效）
+        self.pending_resign_decisions = SessionStore(
+            "resign_decisions", RESIGN_DECISION_TIMEOUT_SECONDS, MAX_PENDING_RESIGN_DECISIONS
+        )
         
-        # 初始化社交管理器
-        self.social_manager = SocialManager(self.data_dir)        
+        # 配置慢指令追踪
+        tracer.configure(
+            slow_threshold=SLOW_TRACE_THRESHOLD_SECONDS,
+            sample_rate=TRACE_SAMPLE_RATE,
+            log_path=os.path.join(self.data_dir, TRACE_LOG_FILE) if TRACE_LOG_FILE else None
+        )
+
+        # 初始化随机数服务（各玩法使用独立的随机流）
+        self.rng = RNGService(seed=RNG_SEED, record=bool(RNG_RECORD_FILE))
+
+        # 用户数据与各管理器延迟加载：启动后由后台线程依次加载，
+        # 加载完成前到达的指令（@requires_components）在线程中加载或等待后台加载完成
+        work_rng = self.rng.stream(STREAM_WORK)
+        item_rng = self.rng.stream(STREAM_ITEM)
+        adventure_rng = self.rng.stream(STREAM_ADVENTURE)
+        date_rng = self.rng.stream(STREAM_DATE)
+        report = self.startup_report
+        self._user_data = LazyComponent("用户数据", self._load_user_data, report)
+        self._market = LazyComponent("商城", lambda: MarketManager(self.data_dir, rng=work_rng), report)
+        self._shop_manager = LazyComponent("商店", lambda: ShopManager(self.data_dir, rng=item_rng), report)
+        self._adventure_manager = LazyComponent("冒险", lambda: AdventureManager(rng=adventure_rng), report)
+        self._social_manager = LazyComponent("社交", lambda: SocialManager(self.data_dir, rng=date_rng), report)
+        self.lazy_components = [
+            self._user_data, self._market, self._shop_manager, self._adventure_manager, self._social_manager
+        ]
+
+        # 初始化多进程渲染池（可选）
+        self.render_farm = None
+        if RENDER_FARM_WORKERS > 0:
+            from .render_farm import RenderFarm
+            self.render_farm = RenderFarm(RENDER_FARM_WORKERS)
+
+        # 初始化图片渲染调度器
+        self.render_scheduler = RenderScheduler(
+            max_concurrency=max(RENDER_MAX_CONCURRENCY, RENDER_FARM_WORKERS),
+            queue_timeout=RENDER_QUEUE_TIMEOUT_SECONDS,
+            max_queue_size=RENDER_MAX_QUEUE_SIZE,
+            farm=self.render_farm
+        )
+
+        # 初始化渲染后端选择器（HTML / Pillow）
+        self.renderer_selector = RendererSelector(hedge_delay=RENDER_HEDGE_DELAY_SECONDS)
+
+        # 初始化内存检查器（管理员指令"内存统计"）
+        self.memory_inspector = MemoryInspector(os.path.join(self.data_dir, MEMORY_DUMP_DIR), MAX_MEMORY_DUMPS)
+        self._register_memory_structures()
         
+        # 后台加载数据与管理器
+        self.startup_task = asyncio.create_task(preload_components(
+            self.lazy_components, report, RENDER_WARM_MODULES, __package__
+        ))
+
         # 启动后台清理任务
         self.cleanup_task = asyncio.create_task(self._periodic_cleanup_task())
+        self.invitation_reaper_task = asyncio.create_task(self._invitation_reaper_task())
+
+        # 启动性能指标监听器（可选）
+        self.metrics_server = None
+        if METRICS_PORT:
+            self.metrics_server = MetricsServer(metrics, port=METRICS_PORT)
+            asyncio.create_task(self.metrics_server.start())
 
+        report.record("插件初始化", time.perf_counter() - init_started)
         logger.info("Astr签到插件已初始化")
 
+    @property
+    def user_data(self) -> dict:
+        return self._user_data.get()
+
+    @property
+    def market(self) -> MarketManager:
+        return self._market.get()
+
+    @property
+    def shop_manager(self) -> ShopManager:
+        return self._shop_manager.get()
+
+    @property
+    def adventure_manager(self) -> AdventureManager:
+        return self._adventure_manager.get()
+
+    @property
+    def social_manager(self) -> SocialManager:
+        return self._social_manager.get()
+
+    def _register_memory_structures(self):
+        """注册内存统计的结构：先注册原始数据，之后的索引与缓存只计入额外持有的对象"""
+        inspector = self.memory_inspector
+        inspector.register("用户数据", lambda: self.user_data)
+        inspector.register("商城数据", lambda: self.market.market_data)
+        inspector.register("商店数据", lambda: self.shop_manager.shop_data)
+        inspector.register("社交数据", lambda: self.social_manager.social_data)
+        inspector.register("群友归属索引", lambda: self.market.ownership)
+        inspector.register("背包计数缓存", lambda: self.shop_manager.inventory)
+        inspector.register("好感度索引", lambda: self.social_manager.favorability)
+        inspector.register("群社交统计缓存", lambda: self.social_manager.social_graph)
+        inspector.register("打工会话", lambda: self.market.work_sessions)
+        inspector.register("补签决策", lambda: self.pending_resign_decisions)
+        inspector.register("约会邀请", lambda: self.social_manager.active_invitations)
+        inspector.register("冒险抽样表", lambda: self.adventure_manager)
+        inspector.register("随机数流", lambda: self.rng)
+        inspector.register("渲染资源缓存", self._get_render_caches)
+        inspector.register("渲染调度", lambda: (self.render_scheduler, self.renderer_selector))
+        inspector.register("性能指标", lambda: metrics)
+
+    async def prepare_command(self):
+        """指令处理前（@requires_components）：等待数据与管理器加载完成，并合并其他进程对数据文件的修改"""
+        await ensure_loaded(self.lazy_components)
+        self._refresh_data_files()
+
+    def _refresh_data_files(self):
+        """数据文件被其他进程修改过时，在指令修改记录之前合并进来（未修改时只检查文件签名）"""
+        try:
+            self.user_data_store.refresh(self.user_data)
+        except Exception as e:
+            logger.error(f"同步用户数据失败: {str(e)}")
+        self.market.refresh_from_disk()
+        self.shop_manager.refresh_from_disk()
+        self.social_manager.refresh_from_disk()
+
+    def _data_stores(self) -> list:
+        """已加载的数据文件"""
+        stores = [self.user_data_store]
+        for component in (self._market, self._shop_manager, self._social_manager):
+            if component.loaded:
+                stores.append(component.get().store)
+        return stores
+
+    @staticmethod
+    def _get_render_caches() -> dict:
+        from .card_layout import get_cache_objects
+        return get_cache_objects()
+
     def _load_user_data(self) -> dict:
         """加载用户数据"""
-        if os.path.exists(self.user_data_file):
-            try:
-                with open(self.user_data_file, 'r', encoding='utf-8') as f:
-                    return yaml.safe_load(f) or {}
-            except Exception as e:
-                logger.error(f"加载用户数据失败: {str(e)}")
-                return {}
-        return {}
+        try:
+            return self.user_data_store.load()
+        except Exception as e:
+            logger.error(f"加载用户数据失败: {str(e)}")
+            return {}
 
+    @timed("storage", "user_data")
     def _save_user_data(self):
-        """保存用户数据"""
+        """保存用户数据（写入前合并其他进程的修改）"""
         try:
-            with open(self.user_data_file, 'w', encoding='utf-8') as f:
-                yaml.dump(self.user_data, f, allow_unicode=True)
+            self.user_data_store.save(self.user_data)
         except Exception as e:
             logger.error(f"保存用户数据失败: {str(e)}")
     
@@ -96,6 +266,11 @@ class SignPlugin(Star):
                 return True
         return False
 
+    async def _send(self, event: AstrMessageEvent, message, name: str):
+        """主动发送一条消息，并记录发送耗时"""
+        with metrics.timer("send", name):
+            await event.send(message)
+
     def get_target_user_id(self, event: AstrMessageEvent) -> str:
         """获取被@的用户ID（排除机器人自身）"""
         messages = event.get_messages()
@@ -131,11 +306,17 @@ class SignPlugin(Star):
                     os.path.join(base_data_path, "social_cards"),     
                     os.path.join(base_data_path, "date_reports"),    
                     os.path.join(base_data_path, "social_network"),   
-                    os.path.join(base_data_path, "command_cards")     
+                    os.path.join(base_data_path, "command_cards"),
+                    os.path.join(base_data_path, "work_cards")
                 ]
 
                 for directory in directories_to_clean:
                     self._cleanup_directory(directory, age_threshold_seconds)
+
+                # 顺带清理长时间无人访问的过期会话（约会邀请由单独的任务处理）
+                market = await self._market.aget()
+                for store in (self.pending_resign_decisions, market.work_sessions):
+                    store.expire()
                 
                 logger.info("本轮图片清理完成。")
 
@@ -147,6 +328,31 @@ class SignPlugin(Star):
                 await asyncio.sleep(60)
 
     
+    async def _invitation_reaper_task(self):
+        """定期处理到期的约会邀请，并提醒发起者邀请已超时。"""
+        while True:
+            try:
+                await asyncio.sleep(INVITATION_REAP_INTERVAL_SECONDS)
+                if not self._social_manager.loaded:
+                    continue
+                # 只推进时间轮中已经经过的槽位，不会遍历全部邀请
+                self.social_manager.cleanup_expired_invitations()
+                for notice in self.social_manager.pop_timeout_notices():
+                    chain = MessageChain([
+                        Comp.At(qq=notice["initiator_id"]),
+                        Comp.Plain(f" 你向 {notice['target_name']} 发出的约会邀请已超时，对方没有回应。")
+                    ])
+                    try:
+                        with metrics.timer("send", "约会超时提醒"):
+                            await self.context.send_message(notice["origin"], chain)
+                    except Exception as e:
+                        logger.warning(f"发送约会邀请超时提醒失败: {e}")
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"约会邀请过期任务发生未知错误: {e}")
+
     def _cleanup_directory(self, directory_path: str, age_threshold_seconds: float):
         """清理指定目录下的过期文件。"""
         if not os.path.isdir(directory_path):
@@ -227,6 +433,8 @@ class SignPlugin(Star):
 
     # 修改后的签到命令
     @filter.command("签到", alias={"每日签到", "daily"})
+    @instrument_command("签到")
+    @requires_components
     async def sign_in(self, event: AstrMessageEvent):
         """每日签到指令"""
         # 检查是否@了机器人
@@ -249,23 +457,13 @@ class SignPlugin(Star):
         user_id = event.get_sender_id()
         decision_key = (group_id, user_id)
 
-        # 检查该用户是否有待处理的决策
-        if not hasattr(self, 'pending_resign_decisions') or decision_key not in self.pending_resign_decisions:
-            return
-
-        # 检查决策是否超时
-        prompt_time = self.pending_resign_decisions[decision_key]["prompted_at"]
-        if datetime.now() - prompt_time > timedelta(seconds=60):
-            del self.pending_resign_decisions[decision_key]
-            # 超时后不主动发送消息，避免刷屏
+        # 取出该用户待处理的决策（超时的决策已自动失效，不主动发送消息，避免刷屏）
+        if self.pending_resign_decisions.pop(decision_key) is None:
             return
 
         # 确认是有效回复，停止事件传播
         event.stop_event()
 
-        # 清理待处理的决策
-        del self.pending_resign_decisions[decision_key]
-
         user_name = event.get_sender_name() or f"用户{user_id}"
         avatar_url = f"http://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640" if event.get_platform_name() == "aiocqhttp" else ""
         
@@ -276,16 +474,16 @@ class SignPlugin(Star):
             if success:
                 await self.unlock_specific_achievement(event, user_id, 'signin_4')
                 if isinstance(result, str) and (result.startswith("http") or os.path.exists(result)):
-                    await event.send(event.image_result(result))
+                    await self._send(event, event.image_result(result), "补签回复")
                 else:
-                    await event.send(event.plain_result(str(result)))
-                await event.send(event.plain_result("补签完成，现在为您进行今日签到..."))
+                    await self._send(event, event.plain_result(str(result)), "补签回复")
+                await self._send(event, event.plain_result("补签完成，现在为您进行今日签到..."), "补签回复")
                 continue_sign_in = True
             else:
-                await event.send(event.plain_result(str(result)))
+                await self._send(event, event.plain_result(str(result)), "补签回复")
         
         elif msg == "跳过":
-            await event.send(event.plain_result("已跳过补签，为您直接签到（连续签到将重置为1天）..."))
+            await self._send(event, event.plain_result("已跳过补签，为您直接签到（连续签到将重置为1天）..."), "补签回复")
             continue_sign_in = True
         
         # 如果需要继续今日签到
@@ -293,12 +491,14 @@ class SignPlugin(Star):
             from .qsin import _perform_actual_sign_in
             # 调用实际签到函数
             async for sign_result in _perform_actual_sign_in(self, event, group_id, user_id, user_name, avatar_url):
-                # 使用 await event.send() 发送后续消息
-                await event.send(sign_result)
+                # 逐条发送后续消息
+                await self._send(event, sign_result, "补签回复")
 
 
     @filter.command("补签", alias={"buqian", "makeup"})
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("补签")
+    @requires_components
     async def re_sign(self, event: AstrMessageEvent):
         """补签指令，用于补签昨天的签到"""
         # 检查是否@了机器人
@@ -344,6 +544,8 @@ class SignPlugin(Star):
 
     @filter.command("购买")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("购买")
+    @requires_components
     async def buy_member(self, event: AstrMessageEvent):
         """购买群友指令"""
         # 检查是否@了机器人
@@ -392,6 +594,8 @@ class SignPlugin(Star):
 
     @filter.command("强制购买")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("强制购买")
+    @requires_components
     async def confirm_buy_member(self, event: AstrMessageEvent):
         """确认购买已有主人的群友"""
         # 检查是否@了机器人
@@ -432,6 +636,8 @@ class SignPlugin(Star):
     # 修改主文件中的打工指令
     @filter.command("打工")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("打工")
+    @requires_components
     async def work_command(self, event: AstrMessageEvent):
         """让群友打工指令"""
         # 检查是否@了机器人
@@ -479,6 +685,9 @@ class SignPlugin(Star):
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
     async def handle_work_job_selection(self, event: AstrMessageEvent):
         """处理用户选择的工作"""
+        # 打工会话只存在于内存中，商城尚未加载时不可能有会话
+        if not self._market.loaded:
+            return
         # 获取会话信息
         session = self.market.get_work_session(event.unified_msg_origin)
         if not session:
@@ -549,6 +758,8 @@ class SignPlugin(Star):
 
     @filter.command("出售")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("出售")
+    @requires_components
     async def sell_member(self, event: AstrMessageEvent):
         """出售群友指令"""
         # 检查是否@了机器人
@@ -592,6 +803,8 @@ class SignPlugin(Star):
     
     @filter.command("赎身")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("赎身")
+    @requires_components
     async def redeem_self(self, event: AstrMessageEvent):
         """赎身指令"""
         # 检查是否@了机器人
@@ -625,6 +838,8 @@ class SignPlugin(Star):
 
     @filter.command("强制赎身")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("强制赎身")
+    @requires_components
     async def confirm_redeem_self(self, event: AstrMessageEvent):
         """确认不打工直接赎身指令"""
         # 检查是否@了机器人
@@ -654,10 +869,13 @@ class SignPlugin(Star):
 
     @filter.command("一键打工")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("一键打工")
+    @requires_components
     async def one_click_work(self, event: AstrMessageEvent):
         """
         集成了购买、打工、出售的一体化指令。
         用法: @机器人 一键打工 @目标用户 <工作名称或编号>
+        不@任何人时（@机器人 一键打工 <工作名称或编号>），让名下所有可打工的群友一起完成该工作。
         """
         if not self.is_bot_mentioned(event):
             return
@@ -679,12 +897,11 @@ class SignPlugin(Star):
             job_choice = part
             break
 
-        if not target_id:
-            yield event.plain_result("请@一位你要购买的用户。")
-            return
-            
         if not job_choice:
-            yield event.plain_result("指令格式错误！\n正确格式: @机器人 一键打工 @目标用户 <工作名称或编号>")
+            yield event.plain_result(
+                "指令格式错误！\n正确格式: @机器人 一键打工 @目标用户 <工作名称或编号>\n"
+                "或: @机器人 一键打工 <工作名称或编号>（名下所有群友一起打工）"
+            )
             return
 
         job_list = self.market.get_sorted_jobs()
@@ -699,6 +916,39 @@ class SignPlugin(Star):
             return
 
         owner_data = self._get_user_in_group(group_id, owner_id)
+
+        if not target_id:
+            # 未@任何人：名下所有可打工的群友一起打工（一次结算、一次保存、一张汇总卡片）
+            results = await self.market.process_batch_work(event, group_id, owner_id, job_name, owner_data)
+            if not results["success"]:
+                yield event.plain_result(results["message"])
+                return
+
+            self._save_user_data()
+            if results["success_count"] > 0 and job_name == "偷窃苏特尔的宝库":
+                await self.unlock_specific_achievement(event, owner_id, 'work_1')
+            await self.check_and_unlock_achievements(event, owner_id)
+
+            from ._generate_work_summary import generate_work_summary_card
+            avatar_url = f"http://q1.qlogo.cn/g?b=qq&nk={owner_id}&s=640" if event.get_platform_name() == "aiocqhttp" else ""
+            card_path = await self.render_scheduler.submit(
+                group_id, PRIORITY_NORMAL, generate_work_summary_card,
+                user_id=owner_id,
+                user_name=owner_name,
+                avatar_url=avatar_url,
+                results=results,
+                title=owner_data.get("current_title")
+            )
+            if card_path:
+                yield event.image_result(card_path)
+            else:
+                work_lines = "\n".join(worker["message"] for worker in results["workers"])
+                yield event.plain_result(
+                    f"@{owner_name}\n打工[{job_name}] × {len(results['workers'])}:\n{work_lines}\n"
+                    f"✨ 本次总净收益: {results['total_profit']:+.1f} Astr币"
+                )
+            return
+
         initial_points = owner_data['points']
         target_name = await self.market.get_user_name(event, target_id)
 
@@ -755,6 +1005,8 @@ class SignPlugin(Star):
     
     @filter.command("商城状态", alias={"Astr商城"})
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("商城状态")
+    @requires_components
     async def check_market_status(self, event: AstrMessageEvent):
         """查看商城状态指令"""
         # 检查是否@了机器人
@@ -781,7 +1033,8 @@ class SignPlugin(Star):
         avatar_url = f"http://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640" if event.get_platform_name() == "aiocqhttp" else ""
         from ._generate_market import generate_market_card_pillow
         
-        card_path = await generate_market_card_pillow(
+        card_path = await self.render_scheduler.submit(
+            group_id, PRIORITY_NORMAL, generate_market_card_pillow,
             user_id=user_id,
             user_name=user_name,
             avatar_url=avatar_url,
@@ -797,6 +1050,8 @@ class SignPlugin(Star):
     
     @filter.command("抽奖")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("抽奖")
+    @requires_components
     async def lottery(self, event: AstrMessageEvent):
         """抽奖指令（最终修正版）"""
         if not self.is_bot_mentioned(event):
@@ -811,7 +1066,8 @@ class SignPlugin(Star):
             
             # --- [修改] 在调用process_lottery时传入shop_manager ---
             result_tuple = await process_lottery(
-                event, group_id, user_id, user_name, user_data, self.shop_manager
+                event, group_id, user_id, user_name, user_data, self.shop_manager,
+                rng=self.rng.stream(STREAM_LOTTERY)
             )
             
             # 1. 安全性检查：确保返回的是一个有效的元组
@@ -846,6 +1102,7 @@ class SignPlugin(Star):
     
     # 文件: main.py (修正 check_and_unlock_achievements 函数)
 
+    @traced()
     async def check_and_unlock_achievements(self, event: AstrMessageEvent, user_id: str):
         """
         检查并解锁指定用户的所有可用成就。
@@ -887,7 +1144,7 @@ class SignPlugin(Star):
                     if reward_title:
                         congrats_msg_list.append(Plain(f"👑 获得称号: 「{reward_title}」\n"))
                     
-                    await event.send(MessageChain(congrats_msg_list))
+                    await self._send(event, MessageChain(congrats_msg_list), "成就通知")
 
             except Exception as e:
                 logger.error(f"检查成就 {ach_id} 时出错: {e}", exc_info=True)
@@ -922,11 +1179,13 @@ class SignPlugin(Star):
         if ach_data.get('reward_title'):
             congrats_msg.append(Plain(f"\n👑 获得称号: 「{ach_data['reward_title']}」"))
             
-        await event.send(MessageChain(congrats_msg))
+        await self._send(event, MessageChain(congrats_msg), "成就通知")
 
 
 
     @filter.command("排行榜", alias={"ranking"})
+    @instrument_command("排行榜")
+    @requires_components
     async def show_leaderboard(self, event: AstrMessageEvent, board_type: str = "财富"):
         """显示排行榜，支持'财富', '签到', '欧皇'三种类型"""
         # 1. 验证 board_type 是否有效
@@ -982,8 +1241,10 @@ class SignPlugin(Star):
         }
 
         # 5. 调用 _generate_leaderboard.generate_leaderboard_image 生成图片
+        from ._generate_leaderboard import generate_leaderboard_image
         try:
-            image_path = await generate_leaderboard_image(
+            image_path = await self.render_scheduler.submit(
+                group_id, PRIORITY_LOW, generate_leaderboard_image,
                 board_type=board_type,
                 top_users=top_users_data,
                 requester_data=requester_data_for_img
@@ -1000,6 +1261,8 @@ class SignPlugin(Star):
 
 
     @filter.command("我的成就", alias={"achievements"})
+    @instrument_command("我的成就")
+    @requires_components
     async def show_my_achievements(self, event: AstrMessageEvent):
         """显示用户的个人成就墙"""
         # 1. 获取当前用户的 user_id 和 user_data
@@ -1012,8 +1275,10 @@ class SignPlugin(Star):
         unlocked_ids = user_data.get("achievements", [])
 
         # 3. 调用 _generate_achievements.generate_achievements_image 生成图片
+        from ._generate_achievements import generate_achievements_image
         try:
-            image_path = await generate_achievements_image(
+            image_path = await self.render_scheduler.submit(
+                group_id, PRIORITY_LOW, generate_achievements_image,
                 user_name=user_name,
                 unlocked_ids=unlocked_ids,
                 all_achievements=ACHIEVEMENTS
@@ -1031,6 +1296,8 @@ class SignPlugin(Star):
 
     @filter.command("我的称号")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("我的称号")
+    @requires_components
     async def list_my_titles(self, event: AstrMessageEvent):
         """列出用户已获得的所有称号"""
         if not self.is_bot_mentioned(event): return
@@ -1064,6 +1331,8 @@ class SignPlugin(Star):
 
     @filter.command("佩戴称号")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("佩戴称号")
+    @requires_components
     async def equip_title(self, event: AstrMessageEvent, *, title_to_equip: str):
         """佩戴一个已获得的称号"""
         if not self.is_bot_mentioned(event): return
@@ -1089,6 +1358,8 @@ class SignPlugin(Star):
 
     @filter.command("卸下称号")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("卸下称号")
+    @requires_components
     async def unequip_title(self, event: AstrMessageEvent):
         """卸下当前佩戴的称号"""
         if not self.is_bot_mentioned(event): return
@@ -1107,6 +1378,8 @@ class SignPlugin(Star):
 
     @filter.command("赠送", alias={"转账", "送"})
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("赠送")
+    @requires_components
     async def gift_points(self, event: AstrMessageEvent):
         """赠送Astr币给其他用户"""
         if not self.is_bot_mentioned(event):
@@ -1211,7 +1484,14 @@ class SignPlugin(Star):
         
         yield event.plain_result(message)
 
+    @staticmethod
+    def _format_item_suggestions(candidates: list) -> str:
+        """物品查找失败时附加的候选提示"""
+        return f"\n你是不是想找：{'、'.join(candidates)}" if candidates else ""
+
     @filter.command("买入")
+    @instrument_command("买入")
+    @requires_components
     async def buy_item(self, event: AstrMessageEvent, item_id: str = None, quantity: int = 1):
         """购买物品指令"""
         if not self.is_bot_mentioned(event):
@@ -1227,18 +1507,15 @@ class SignPlugin(Star):
         user_id = event.get_sender_id()
         user_data = self._get_user_in_group(group_id, user_id)
         
-        # 检查物品ID是否存在
-        item_exists = False
-        item_category = None
-        
-        # 使用 self.shop_manager.items_definition 来进行查找
-        if item_id in self.shop_manager.items_definition:
-            item_exists = True
-            item_category = self.shop_manager.items_definition[item_id]["category"]
-        
-        if not item_exists:
-            yield event.plain_result(f"商品ID '{item_id}' 不存在，请查看商店后再购买。")
+        # 按ID、名称或别名查找商品
+        item_query = item_id
+        item_id, candidates = self.shop_manager.find_item(item_query)
+        if not item_id:
+            yield event.plain_result(
+                f"商品ID '{item_query}' 不存在，请查看商店后再购买。" + self._format_item_suggestions(candidates)
+            )
             return
+        item_category = self.shop_manager.items_definition[item_id]["category"]
         
         # 执行购买逻辑
         success, message = await self.shop_manager.buy_item(
@@ -1252,6 +1529,8 @@ class SignPlugin(Star):
         yield event.plain_result(message)
 
     @filter.command("使用")
+    @instrument_command("使用")
+    @requires_components
     async def use_item(self, event: AstrMessageEvent, item_name: str, quantity: int = 1):
         """使用物品指令，支持批量使用"""
         if not self.is_bot_mentioned(event):
@@ -1263,62 +1542,37 @@ class SignPlugin(Star):
         user_data = self._get_user_in_group(group_id, user_id)
         
         # 查找与名称匹配的物品ID
-        item_id = None
-        item_category = None
-        for category, items in SHOP_DATA.items():
-            for id, data in items.items():
-                if data['name'] == item_name:
-                    item_id = id
-                    item_category = category
-                    break
-            if item_id:
-                break
-        
+        item_id, candidates = self.shop_manager.find_item(item_name)
         if not item_id:
-            yield event.plain_result(f"物品 '{item_name}' 不存在，请检查物品名称是否正确。")
+            yield event.plain_result(
+                f"物品 '{item_name}' 不存在，请检查物品名称是否正确。" + self._format_item_suggestions(candidates)
+            )
             return
+        item_name = self.shop_manager.items_definition[item_id]["name"]
         
         # 检查数量参数
         if quantity <= 0:
             yield event.plain_result("使用数量必须大于0。")
             return
         
-        # --- [修改] 优化批量使用和消息返回的逻辑 ---
-        total_success = 0
-        failure_messages = []
-        last_success_message = "" # 用于存储最后一次成功的详细消息
+        # 合并计算所有物品的效果（物品不足时使用全部剩余的物品）
+        success, message, used = await self.shop_manager.use_items(event, user_data, item_id, quantity)
 
-        for i in range(quantity):
-            success, message = await self.shop_manager.use_item(
-                event, user_data, item_id
-            )
-            
-            if success:
-                total_success += 1
-                last_success_message = message # 捕获并覆盖为最新的成功消息
-            else:
-                # 如果失败（比如物品不足），停止继续使用
-                failure_messages.append(f"第{i+1}次使用失败：{message}")
-                break
-        
-        if total_success > 0:
+        if success:
             self._save_user_data()  # 保存用户数据（更新buff和体力状态）
-            
-            # 如果只使用了一个，直接显示该次的详细结果
-            if total_success == 1:
-                yield event.plain_result(last_success_message)
+
+            # 如果只使用了一个，直接显示详细结果
+            if used == 1:
+                yield event.plain_result(message)
             else:
-                # 如果使用了多个，显示一个总结，并附上最后一次的详细结果
-                # last_success_message 中已经包含了最终的体力值，所以这是准确的
-                final_message = f"✅ 连续成功使用了 {total_success} 个 {item_name}！\n\n" + \
-                                f"最后一次效果：\n{last_success_message.split('✅ ')[-1]}" # 去掉重复的成功提示
-                yield event.plain_result(final_message)
+                effect = message.split("\n", 1)[-1]  # 去掉重复的成功提示
+                yield event.plain_result(f"✅ 连续成功使用了 {used} 个 {item_name}！\n\n合计效果：\n{effect}")
         else:
-            # 如果一次都未成功
-            error_reason = failure_messages[0] if failure_messages else "未知错误"
-            yield event.plain_result(f"使用 {item_name} 失败：\n{error_reason}")
+            yield event.plain_result(f"使用 {item_name} 失败：\n{message}")
 
     @filter.command("一键使用")
+    @instrument_command("一键使用")
+    @requires_components
     async def batch_use_item(self, event: AstrMessageEvent, item_name: str, quantity: int = 1):
         """一键使用指令：购买并使用物品（支持道具和食物）"""
         if not self.is_bot_mentioned(event):
@@ -1331,47 +1585,31 @@ class SignPlugin(Star):
         user_id = event.get_sender_id()
         user_data = self._get_user_in_group(group_id, user_id)
         
-        item_id = None
-        item_category = None
-        
-        for cat, items in SHOP_DATA.items():
-            if cat in ['道具', '食物']:
-                for id, data in items.items():
-                    if data['name'] == item_name:
-                        item_id, item_category = id, cat
-                        break
-            if item_id: break
-        
+        item_id, candidates = self.shop_manager.find_item(item_name, ['道具', '食物'])
         if not item_id:
-             if item_name in SHOP_DATA.get('道具', {}):
-                item_id, item_category = item_name, '道具'
-                item_name = SHOP_DATA['道具'][item_id]['name']
-             elif item_name in SHOP_DATA.get('食物', {}):
-                item_id, item_category = item_name, '食物'
-                item_name = SHOP_DATA['食物'][item_id]['name']
-
-        if not item_id or not item_category:
-            yield event.plain_result(f"物品 '{item_name}' 不存在或不支持一键使用。")
+            yield event.plain_result(
+                f"物品 '{item_name}' 不存在或不支持一键使用。" + self._format_item_suggestions(candidates)
+            )
             return
+        item_category = self.shop_manager.items_definition[item_id]["category"]
+        item_name = self.shop_manager.items_definition[item_id]["name"]
 
         if quantity <= 0:
             yield event.plain_result("使用数量必须大于0。")
             return
             
-        user_bag = self.shop_manager.get_user_bag(group_id, user_id)
-        if item_category not in user_bag: user_bag[item_category] = {}
-        current_quantity = user_bag[item_category].get(item_id, 0)
+        inventory = self.shop_manager.inventory
+        current_quantity = inventory.count(group_id, user_id, item_id)
         need_to_buy = max(0, quantity - current_quantity)
         
         logger.info(f"用户当前拥有 {current_quantity} 个 {item_name}，需要购买 {need_to_buy} 个")
 
         if need_to_buy > 0:
-            total_items_in_bag = sum(sum(c.values()) for c in user_bag.values())
-            if total_items_in_bag + need_to_buy > 100:
+            if inventory.total(group_id, user_id) + need_to_buy > BAG_CAPACITY:
                 yield event.plain_result(f"背包容量不足！")
                 return
-            if user_bag[item_category].get(item_id, 0) + need_to_buy > 10:
-                yield event.plain_result(f"购买失败！【{item_name}】最多只能拥有10个。")
+            if current_quantity + need_to_buy > MAX_ITEM_STACK:
+                yield event.plain_result(f"购买失败！【{item_name}】最多只能拥有{MAX_ITEM_STACK}个。")
                 return
             
             buy_success, buy_message = await self.shop_manager.buy_item(
@@ -1383,26 +1621,11 @@ class SignPlugin(Star):
             else:
                 logger.info(f"成功购买了 {need_to_buy} 个 {item_name}")
 
-        # --- [修改] 优化批量使用和消息返回的逻辑 ---
-        total_success = 0
-        failure_messages = []
-        last_success_message = ""
+        # 合并计算所有物品的效果
+        success, message, used = await self.shop_manager.use_items(event, user_data, item_id, quantity)
+        logger.info(f"使用 {item_name} x{used}: {'成功' if success else message}")
 
-        for i in range(quantity):
-            success, message = await self.shop_manager.use_item(
-                event, user_data, item_id
-            )
-            
-            if success:
-                total_success += 1
-                last_success_message = message
-                logger.info(f"第 {i+1} 次使用 {item_name} 成功")
-            else:
-                failure_messages.append(message)
-                logger.info(f"第 {i+1} 次使用 {item_name} 失败: {message}")
-                break
-        
-        if total_success > 0:
+        if success:
             self._save_user_data()  # 保存用户数据
             
             purchase_info = ""
@@ -1410,19 +1633,20 @@ class SignPlugin(Star):
                 purchase_info = f"成功购买 {need_to_buy} 个 {item_name}，"
 
             # 构造包含详细信息的最终消息
-            if total_success == 1:
-                final_message = f"{purchase_info}并成功使用！\n\n{last_success_message}"
+            if used == 1:
+                final_message = f"{purchase_info}并成功使用！\n\n{message}"
             else:
-                final_message = f"{purchase_info}并连续成功使用了 {total_success} 个！\n\n" + \
-                                f"最后一次效果：\n{last_success_message.split('✅ ')[-1]}"
+                effect = message.split("\n", 1)[-1]  # 去掉重复的成功提示
+                final_message = f"{purchase_info}并连续成功使用了 {used} 个！\n\n合计效果：\n{effect}"
 
             yield event.plain_result(final_message.strip())
         else:
-            error_reason = failure_messages[0] if failure_messages else "未知错误"
-            yield event.plain_result(f"使用 {item_name} 失败：\n{error_reason}")
+            yield event.plain_result(f"使用 {item_name} 失败：\n{message}")
 
     @filter.command("我的状态")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("我的状态")
+    @requires_components
     async def check_buffs(self, event: AstrMessageEvent):
         """查询用户当前的buff状态"""
         if not self.is_bot_mentioned(event):
@@ -1435,27 +1659,9 @@ class SignPlugin(Star):
         
         # 获取用户数据
         user_data = self._get_user_in_group(group_id, user_id)
-        buffs = user_data.get("buffs", {})
-        
-        # 获取buff描述 - 添加新的冒险系统道具效果
-        buff_descriptions = {
-            "work_guarantee_success": "打工必定成功",
-            "work_no_penalty": "打工失败不扣币",
-            "work_reward_boost": "打工奖励提升",
-            "lottery_min_3star": "抽奖至少3星",
-            "lottery_double_reward": "抽奖奖励翻倍",
-            "lottery_best_of_two": "抽奖双抽取最佳",
-            "adventure_negate_crisis": "冒险危机保护",
-            "adventure_rare_boost": "稀有奇遇提升"
-        }
-        
-        # 构建消息
-        active_buffs = []
-        for buff_name, count in buffs.items():
-            if count > 0:
-                desc = buff_descriptions.get(buff_name, buff_name)
-                active_buffs.append(f"【{desc}】× {count}")
-        
+
+        # 构建消息（过期的效果会被顺带清理）
+        active_buffs = buff_engine.describe_active(user_data.get("buffs", {}))
         if active_buffs:
             buffs_text = "\n".join(active_buffs)
             yield event.plain_result(f"{user_name} 当前激活的效果：\n{buffs_text}")
@@ -1464,6 +1670,8 @@ class SignPlugin(Star):
 
 
     @filter.command("我的背包")
+    @instrument_command("我的背包")
+    @requires_components
     async def show_backpack(self, event: AstrMessageEvent):
         """查看自己的背包物品"""
         if not self.is_bot_mentioned(event):
@@ -1476,8 +1684,10 @@ class SignPlugin(Star):
         user_bag = self.shop_manager.get_user_bag(group_id, user_id)
         
         try:
+            from ._generate_shop import generate_backpack_card
             # 修改为传递体力值参数
-            image_path = await generate_backpack_card(
+            image_path = await self.render_scheduler.submit(
+                group_id, PRIORITY_NORMAL, generate_backpack_card,
                 user_bag, 
                 user_data['points'], 
                 stamina=user_data.get('stamina', 0),
@@ -1514,6 +1724,8 @@ class SignPlugin(Star):
             yield event.plain_result(backpack_text)
 
     @filter.command("商店")
+    @instrument_command("商店")
+    @requires_components
     async def show_shop(self, event: AstrMessageEvent, category: str = "道具"):
         """显示指定类别的商店物品，默认显示道具类别"""
         if not self.is_bot_mentioned(event):
@@ -1530,8 +1742,11 @@ class SignPlugin(Star):
         user_data = self._get_user_in_group(group_id, user_id)
         
         try:
+            from ._generate_shop import generate_shop_card
             # 调用商店卡片生成函数但不传递头像URL
-            image_path = await generate_shop_card(category, user_data['points'])
+            image_path = await self.render_scheduler.submit(
+                group_id, PRIORITY_LOW, generate_shop_card, category, user_data['points']
+            )
             if image_path:
                 yield event.image_result(image_path)
             else:
@@ -1542,6 +1757,8 @@ class SignPlugin(Star):
 
     # 添加冒险指令
     @filter.command("冒险")
+    @instrument_command("冒险")
+    @requires_components
     async def adventure(self, event: AstrMessageEvent, times: int = 1):
         """冒险指令，每次消耗20体力"""
         if not self.is_bot_mentioned(event):
@@ -1557,8 +1774,8 @@ class SignPlugin(Star):
             yield event.plain_result("冒险次数必须大于0。")
             return
         
-        if times > 10:
-            yield event.plain_result("一次最多只能进行10次冒险，以免疲劳过度哦~")
+        if times > MAX_ADVENTURE_TIMES:
+            yield event.plain_result(f"一次最多只能进行{MAX_ADVENTURE_TIMES}次冒险，以免疲劳过度哦~")
             return
         
         # 注意：不再预先检查体力是否足够，而是在run_adventures中处理
@@ -1585,7 +1802,9 @@ class SignPlugin(Star):
         try:
             # 生成冒险报告卡片
             from ._generate_adventure import generate_adventure_report_card
-            image_path = await generate_adventure_report_card(results)
+            image_path = await self.render_scheduler.submit(
+                group_id, PRIORITY_NORMAL, generate_adventure_report_card, results
+            )
             
             if image_path:
                 yield event.image_result(image_path)
@@ -1618,17 +1837,21 @@ class SignPlugin(Star):
                     report_text += f"- {item['name']}: {item['message']}\n"
 
             report_text += "\n【冒险事件】\n"
-            for i, event in enumerate(results["events"]):
-                report_text += f"{i+1}. {event['name']}: {event['description']}\n"
+            for i, adv_event in enumerate(results["events"][:ADVENTURE_TEXT_MAX_EVENTS]):
+                report_text += f"{i+1}. {adv_event['name']}: {adv_event['description']}\n"
                 
                 effects = []
-                for effect_type, effect_desc in event.get("effects", {}).items():
+                for effect_type, effect_desc in adv_event.get("effects", {}).items():
                     # 扩展排除的字段列表
                     if effect_type not in ["item_id", "return", "achievement", "title"] and effect_desc:
                         effects.append(effect_desc)
 
                 if effects:
                     report_text += f"   效果: {', '.join(effects)}\n"
+
+            hidden_events = len(results["events"]) - ADVENTURE_TEXT_MAX_EVENTS
+            if hidden_events > 0:
+                report_text += f"……其余{hidden_events}个事件的效果已计入上方统计\n"
             
             if "new_achievement" in results:
                 report_text += f"\n🏆 新成就解锁: {results['new_achievement']}"
@@ -1636,6 +1859,8 @@ class SignPlugin(Star):
             yield event.plain_result(report_text)
 
     @filter.command("超级冒险")
+    @instrument_command("超级冒险")
+    @requires_components
     async def super_adventure(self, event: AstrMessageEvent):
         """超级冒险指令，使用所有体力进行冒险"""
         if not self.is_bot_mentioned(event):
@@ -1653,7 +1878,7 @@ class SignPlugin(Star):
             return
         
         # 计算最大冒险次数（不再一次性扣除体力）
-        max_times = min(stamina // 20, 10)  # 最多10次
+        max_times = min(stamina // 20, MAX_ADVENTURE_TIMES)
         
         yield event.plain_result(f"将消耗{max_times * 20}点体力进行{max_times}次冒险。")
         
@@ -1678,7 +1903,9 @@ class SignPlugin(Star):
         try:
             # 生成冒险报告卡片
             from ._generate_adventure import generate_adventure_report_card
-            image_path = await generate_adventure_report_card(results)
+            image_path = await self.render_scheduler.submit(
+                group_id, PRIORITY_NORMAL, generate_adventure_report_card, results
+            )
             
             if image_path:
                 yield event.image_result(image_path)
@@ -1711,17 +1938,21 @@ class SignPlugin(Star):
                     report_text += f"- {item['name']}: {item['message']}\n"
 
             report_text += "\n【冒险事件】\n"
-            for i, event in enumerate(results["events"]):
-                report_text += f"{i+1}. {event['name']}: {event['description']}\n"
+            for i, adv_event in enumerate(results["events"][:ADVENTURE_TEXT_MAX_EVENTS]):
+                report_text += f"{i+1}. {adv_event['name']}: {adv_event['description']}\n"
                 
                 effects = []
-                for effect_type, effect_desc in event.get("effects", {}).items():
+                for effect_type, effect_desc in adv_event.get("effects", {}).items():
                     # 扩展排除的字段列表
                     if effect_type not in ["item_id", "return", "achievement", "title"] and effect_desc:
                         effects.append(effect_desc)
 
                 if effects:
                     report_text += f"   效果: {', '.join(effects)}\n"
+
+            hidden_events = len(results["events"]) - ADVENTURE_TEXT_MAX_EVENTS
+            if hidden_events > 0:
+                report_text += f"……其余{hidden_events}个事件的效果已计入上方统计\n"
             
             if "new_achievement" in results:
                 report_text += f"\n🏆 新成就解锁: {results['new_achievement']}"
@@ -1733,6 +1964,8 @@ class SignPlugin(Star):
 
     @filter.command("赠礼")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("赠礼")
+    @requires_components
     async def gift_item(self, event: AstrMessageEvent, *, text: str = ""):
         """赠送礼物给其他用户，提升对方对你的好感度"""
         if not self.is_bot_mentioned(event):
@@ -1757,22 +1990,16 @@ class SignPlugin(Star):
             yield event.plain_result(f"{sender_name}，请@一位你要赠送礼物的用户。")
             return
         
-        # 2. 查找礼物ID
-        item_id = None
-        item_category = None
-        favorability_gain = 0
-        
-        # 在礼物类别中查找
-        for id, data in SHOP_DATA.get("礼物", {}).items():
-            if data["name"] == item_name:
-                item_id = id
-                item_category = "礼物"
-                favorability_gain = data.get("effect", {}).get("favorability_gain", 0)
-                break
-        
+        # 2. 查找礼物ID（在礼物类别中查找）
+        item_id, candidates = self.shop_manager.find_item(item_name, ["礼物"])
         if not item_id:
-            yield event.plain_result(f"物品 '{item_name}' 不存在或不是礼物，请检查名称是否正确。")
+            yield event.plain_result(
+                f"物品 '{item_name}' 不存在或不是礼物，请检查名称是否正确。" + self._format_item_suggestions(candidates)
+            )
             return
+        item_data = self.shop_manager.items_definition[item_id]
+        item_name = item_data["name"]
+        favorability_gain = item_data.get("effect", {}).get("favorability_gain", 0)
         
         # 3. 检查是否为特殊关系礼物
         for relation, relation_item in SPECIAL_RELATION_ITEMS.items():
@@ -1781,9 +2008,8 @@ class SignPlugin(Star):
                 return
         
         # 4. 检查背包中是否有足够的物品
-        user_bag = self.shop_manager.get_user_bag(group_id, sender_id)
-        if item_category not in user_bag or item_id not in user_bag[item_category] or user_bag[item_category][item_id] < quantity:
-            current_count = user_bag.get(item_category, {}).get(item_id, 0)
+        current_count = self.shop_manager.inventory.count(group_id, sender_id, item_id)
+        if current_count < quantity:
             yield event.plain_result(f"{sender_name}，你的背包中没有足够的 '{item_name}'。需要{quantity}个，拥有{current_count}个。")
             return
         
@@ -1830,6 +2056,8 @@ class SignPlugin(Star):
 
     @filter.command("约会")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("约会")
+    @requires_components
     async def start_date(self, event: AstrMessageEvent):
         """邀请另一位用户进行约会，影响双方好感度"""
         if not self.is_bot_mentioned(event):
@@ -1865,10 +2093,10 @@ class SignPlugin(Star):
             yield event.plain_result("你今天已经约会3次了，请明天再来~")
             return
         
-        # 在创建新邀请前，先清理所有过期邀请
-        self.social_manager.cleanup_expired_invitations()
-        # 创建约会邀请
-        success, msg = self.social_manager.create_invitation(group_id, initiator_id, target_id)
+        # 创建约会邀请（过期的邀请由后台任务清理）
+        success, msg = self.social_manager.create_invitation(
+            group_id, initiator_id, target_id, origin=event.unified_msg_origin, target_name=target_name
+        )
         if not success:
             yield event.plain_result(msg)
             return
@@ -1880,7 +2108,7 @@ class SignPlugin(Star):
         # 发送邀请消息，然后指令结束
         yield event.plain_result(
             f"{initiator_name} 向 {target_name} 发出了约会邀请！\n"
-            f"{target_name}，请在60秒内回复'同意'或'拒绝'。"
+            f"{target_name}，请在{DATE_INVITATION_TIMEOUT_SECONDS}秒内回复'同意'或'拒绝'。"
         )
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
     async def handle_date_response(self, event: AstrMessageEvent):
@@ -1890,11 +2118,15 @@ class SignPlugin(Star):
         if msg not in ["同意", "拒绝"]:
             return
 
+        # 约会邀请只存在于内存中，社交尚未加载时不可能有邀请
+        if not self._social_manager.loaded:
+            return
+
         group_id = event.get_group_id()
         responder_id = event.get_sender_id()
 
-        # 检查该用户是否有待处理的邀请
-        invitation = self.social_manager.get_invitation(group_id, responder_id)
+        # 取出该用户待处理的邀请（在任何 await 之前，处理期间不会超时，重复回复也不会再次处理）
+        invitation = self.social_manager.take_invitation(group_id, responder_id)
         if not invitation:
             return  # 没有邀请，忽略此消息
 
@@ -1917,7 +2149,8 @@ class SignPlugin(Star):
             
             # 生成约会报告卡片
             from ._generate_social import generate_date_report_card
-            card_path = await generate_date_report_card(
+            card_path = await self.render_scheduler.submit(
+                group_id, PRIORITY_NORMAL, generate_date_report_card,
                 initiator_id, initiator_name, initiator_avatar,
                 responder_id, responder_name, responder_avatar,
                 date_results
@@ -1951,7 +2184,7 @@ class SignPlugin(Star):
                 result.chain = [Comp.Plain(report_text)]
             
             # 发送结果
-            await event.send(result)
+            await self._send(event, result, "约会回复")
 
             # 检查约会新手成就
             for user_id in [initiator_id, responder_id]:
@@ -1977,13 +2210,12 @@ class SignPlugin(Star):
 
         elif msg == "拒绝":
             yield event.plain_result(f"{responder_name} 拒绝了 {initiator_name} 的约会邀请。")
-
-        # 无论同意或拒绝，都清理掉这个邀请
-        self.social_manager.remove_invitation(group_id, responder_id)
         
     # 添加关系指令
     @filter.command("关系")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("关系")
+    @requires_components
     async def check_relationship(self, event: AstrMessageEvent):
         """查看与指定用户的关系"""
         # 检查是否@了机器人
@@ -2022,7 +2254,8 @@ class SignPlugin(Star):
 
         # 6. 生成关系卡片
         from ._generate_social import generate_relationship_card
-        card_path = await generate_relationship_card(
+        card_path = await self.render_scheduler.submit(
+            group_id, PRIORITY_NORMAL, generate_relationship_card,
             user_id, user_name, user_avatar,
             target_id, target_name, target_avatar,
             relationship_data,
@@ -2057,6 +2290,8 @@ class SignPlugin(Star):
     # 添加我的关系网指令
     @filter.command("我的关系网")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("我的关系网")
+    @requires_components
     async def show_relationship_network(self, event: AstrMessageEvent):
         """查看自己的关系网络"""
         # 检查是否@了机器人
@@ -2088,7 +2323,8 @@ class SignPlugin(Star):
 
         # 5. 生成关系网络卡片
         from ._generate_social import generate_social_network_card
-        card_path = await generate_social_network_card(
+        card_path = await self.render_scheduler.submit(
+            group_id, PRIORITY_NORMAL, generate_social_network_card,
             user_id, user_name, user_avatar, network_data, user_title
         )
 
@@ -2118,9 +2354,60 @@ class SignPlugin(Star):
             yield event.plain_result(network_text)
 
 
+    @filter.command("群关系榜", alias={"社交排行"})
+    @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("群关系榜")
+    @requires_components
+    async def show_group_social_ranking(self, event: AstrMessageEvent):
+        """查看全群的最佳CP、人气王与社交圈子"""
+        # 检查是否@了机器人
+        if not self.is_bot_mentioned(event):
+            return
+
+        # 1. 获取群社交统计（好感度没有变化时直接使用缓存）
+        group_id = event.get_group_id()
+        stats = self.social_manager.get_group_social_stats(group_id)
+
+        # 2. 只查询需要展示的用户名称
+        shown_ids = {user_id for couple in stats.top_couples for user_id in couple[:2]}
+        shown_ids.update(user_id for user_id, _, _ in stats.most_popular)
+        names = {}
+        for user_id in shown_ids:
+            names[user_id] = await self.market.get_user_name(event, user_id) or f"用户{user_id}"
+
+        # 3. 生成群社交排行卡片
+        from ._generate_group_social import generate_group_social_card
+        card_path = await self.render_scheduler.submit(
+            group_id, PRIORITY_LOW, generate_group_social_card, group_id, stats, names
+        )
+
+        if card_path and os.path.exists(card_path):
+            yield event.image_result(card_path)
+            return
+
+        # 回退到文本模式
+        if not stats.relation_count:
+            yield event.plain_result("本群还没有人建立关系。")
+            return
+
+        lines = ["本群社交排行：", "", "【最佳CP】"]
+        for i, (user_a_id, user_b_id, a_to_b, b_to_a) in enumerate(stats.top_couples):
+            lines.append(f"{i + 1}. {names[user_a_id]} & {names[user_b_id]}：{a_to_b} / {b_to_a}")
+        lines.append("【人气王】")
+        for i, (user_id, total, count) in enumerate(stats.most_popular):
+            lines.append(f"{i + 1}. {names[user_id]}：收到好感度 {total}（{count}人）")
+        largest_cluster = len(stats.clusters[0]) if stats.clusters else 0
+        lines.append("")
+        lines.append(f"互相好感度≥{stats.mutual_threshold}：{stats.mutual_count} 对")
+        lines.append(f"社交圈子：{len(stats.clusters)} 个，最大圈子 {largest_cluster} 人")
+        yield event.plain_result("\n".join(lines))
+
+
     # 添加缔结指令
     @filter.command("缔结")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("缔结")
+    @requires_components
     async def form_special_relationship(self, event: AstrMessageEvent, relation_name: str = None):
         """缔结特殊关系"""
         # 检查是否@了机器人
@@ -2162,19 +2449,14 @@ class SignPlugin(Star):
         required_item = SPECIAL_RELATION_ITEMS[relation_name]
 
         # 6. 查找物品ID
-        item_id = None
-        for id, data in SHOP_DATA.get("礼物", {}).items():
-            if data["name"] == required_item:
-                item_id = id
-                break
+        item_id = item_index.resolve(required_item, ["礼物"])
 
         if not item_id:
             yield event.plain_result(f"内部错误：找不到物品 '{required_item}'。")
             return
 
         # 7. 检查背包中是否有该物品
-        user_bag = self.shop_manager.get_user_bag(group_id, user_id)
-        if "礼物" not in user_bag or item_id not in user_bag["礼物"] or user_bag["礼物"][item_id] <= 0:
+        if self.shop_manager.inventory.count(group_id, user_id, item_id) <= 0:
             yield event.plain_result(f"缔结【{relation_name}】关系需要【{required_item}】，请先前往商店购买。")
             return
 
@@ -2199,6 +2481,8 @@ class SignPlugin(Star):
     # 添加解除关系指令
     @filter.command("解除关系")
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    @instrument_command("解除关系")
+    @requires_components
     async def break_special_relationship(self, event: AstrMessageEvent):
         """解除特殊关系"""
         # 检查是否@了机器人
@@ -2229,15 +2513,126 @@ class SignPlugin(Star):
         else:
             yield event.plain_result(msg)
 
+    @filter.command("性能统计")
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    async def show_metrics(self, event: AstrMessageEvent):
+        """管理员查看各指令、保存、渲染与发送的耗时统计"""
+        uptime_minutes = int((time.time() - metrics.started_at) // 60)
+        lines = [f"📊 性能统计（统计时长 {uptime_minutes} 分钟，错误 {metrics.error_total()} 次）"]
+
+        for category, category_name in CATEGORY_NAMES.items():
+            rows = metrics.summary(category, METRICS_SUMMARY_LIMIT)
+            if not rows:
+                continue
+            lines.append(f"\n【{category_name}】按总耗时排序")
+            for row in rows:
+                line = (
+                    f"· {row['name']}：{row['count']}次，平均 {row['avg'] * 1000:.0f}ms，"
+                    f"P95≤{row['p95'] * 1000:.0f}ms，最长 {row['max'] * 1000:.0f}ms"
+                )
+                if row["errors"]:
+                    line += f"，错误 {row['errors']} 次"
+                lines.append(line)
+
+        render_stats = self.render_scheduler.get_stats()
+        lines.append(
+            f"\n渲染队列：排队 {render_stats['queued']}，进行中 {render_stats['running']}，"
+            f"降级 {render_stats['degraded_timeout'] + render_stats['degraded_queue_full']} 次"
+        )
+        merges = conflicts = 0
+        for store in self._data_stores():
+            merges += store.stats["merges"]
+            conflicts += store.stats["conflicts"]
+        if merges:
+            lines.append(f"数据文件：合并其他进程的修改 {merges} 次，冲突 {conflicts} 条")
+        lines.append(f"\n【启动耗时】\n{self.startup_report.format()}")
+        if len(lines) == 3:
+            lines.insert(1, "暂无数据。")
+        yield event.plain_result("\n".join(lines))
+
+    @filter.command("内存统计")
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @requires_components
+    async def show_memory(self, event: AstrMessageEvent, action: str = ""):
+        """管理员查看内存占用：内存统计 [开始追踪|快照|对比|导出|停止追踪]"""
+        inspector = self.memory_inspector
+        if action in ("开始", "开始追踪"):
+            if inspector.start_tracing():
+                yield event.plain_result("已开始内存分配追踪（分配会略微变慢）。\n使用\"内存统计 快照\"记录当前状态，间隔一段时间后再次快照即可对比。")
+            else:
+                yield event.plain_result("内存分配追踪已在进行中。")
+            return
+        if action in ("停止", "停止追踪"):
+            stopped = inspector.stop_tracing()
+            yield event.plain_result("已停止内存分配追踪。" if stopped else "内存分配追踪未开启。")
+            return
+        if action == "导出":
+            path = inspector.dump()
+            yield event.plain_result(f"内存快照已导出到 {path}" if path else "导出内存快照失败，请查看日志。")
+            return
+        if action in ("快照", "对比"):
+            if action == "快照":
+                inspector.take_snapshot(datetime.now().strftime("%m-%d %H:%M:%S"))
+            diff = inspector.diff(MEMORY_SUMMARY_LIMIT)
+            if diff is None:
+                yield event.plain_result(f"已记录快照（共 {inspector.snapshot_count()} 个），再记录一个快照后即可对比。")
+                return
+            yield event.plain_result(self._format_memory_diff(diff))
+            return
+        if action:
+            yield event.plain_result("用法：内存统计 [开始追踪|快照|对比|导出|停止追踪]")
+            return
+
+        rows = inspector.measure()
+        current, peak = inspector.traced_memory()
+        lines = [f"🧠 内存统计（进程常驻 {process_rss_mb():.1f}MB，插件结构合计 {format_bytes(sum(r['bytes'] for r in rows))}）"]
+        if inspector.is_tracing():
+            lines.append(f"分配追踪中：当前 {format_bytes(current)}，峰值 {format_bytes(peak)}")
+        lines.append("\n【各结构占用】")
+        for row in sorted(rows, key=lambda r: r["bytes"], reverse=True)[:MEMORY_SUMMARY_LIMIT]:
+            line = f"· {row['name']}：{format_bytes(row['bytes'])}"
+            if row["entries"] is not None:
+                line += f"（{row['entries']}条）"
+            if not row["complete"]:
+                line += "（未统计完）"
+            lines.append(line)
+        yield event.plain_result("\n".join(lines))
+
+    @staticmethod
+    def _format_memory_diff(diff: dict) -> str:
+        """格式化两个内存快照的对比结果"""
+        lines = [
+            f"📈 内存对比 {diff['before']} → {diff['after']}（间隔 {diff['seconds'] / 60:.0f} 分钟，"
+            f"进程常驻 {diff['rss_delta_mb']:+.1f}MB）",
+            "\n【结构变化】",
+        ]
+        for name, delta, size in diff["structures"]:
+            lines.append(f"· {name}：{format_bytes(delta, signed=True)}（当前 {format_bytes(size)}）")
+        if diff["sources"] is None:
+            lines.append("\n两个快照未都开启分配追踪，使用\"内存统计 开始追踪\"后可按模块查看分配变化。")
+            return "\n".join(lines)
+        lines.append("\n【分配来源变化】")
+        for source, delta, blocks in diff["sources"]:
+            lines.append(f"· {source}：{format_bytes(delta, signed=True)}（{blocks:+d}块）")
+        if diff["lines"]:
+            lines.append("\n【变化最大的代码行】")
+            for location, delta in diff["lines"]:
+                lines.append(f"· {location}：{format_bytes(delta, signed=True)}")
+        return "\n".join(lines)
+
     @filter.command("命令")
+    @instrument_command("命令")
     async def show_command_list(self, event: AstrMessageEvent):
         """显示所有可用命令的帮助卡片"""
         if not self.is_bot_mentioned(event):
             return
 
         try:
+            from ._command_card import generate_command_card
             # 调用作图函数
-            image_path = await generate_command_card()
+            image_path = await self.render_scheduler.submit(
+                event.get_group_id(), PRIORITY_LOW, generate_command_card
+            )
 
             if image_path and os.path.exists(image_path):
                 yield event.image_result(image_path)
@@ -2253,6 +2648,19 @@ class SignPlugin(Star):
         # --- [修改] 优雅地停止后台任务 ---
         if self.cleanup_task and not self.cleanup_task.done():
             self.cleanup_task.cancel()
+        if self.invitation_reaper_task and not self.invitation_reaper_task.done():
+            self.invitation_reaper_task.cancel()
+        if self.startup_task and not self.startup_task.done():
+            self.startup_task.cancel()
         # ----------------------------
-        self._save_user_data()
+        if self.render_farm:
+            self.render_farm.shutdown()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        self.memory_inspector.stop_tracing()
+        if RNG_RECORD_FILE:
+            self.rng.save_recording(os.path.join(self.data_dir, RNG_RECORD_FILE))
+        # 用户数据尚未加载时没有需要保存的修改
+        if self._user_data.loaded:
+            self._save_user_data()
         logger.info("Astr签到插件已终止，数据已保存，清理任务已安全停止。")
@@ -1,13 +1,19 @@
 import os
 import yaml
 import random
+import asyncio
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple, Any
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api.message_components import At
 from astrbot.api import logger
-from ._generate_market import generate_market_card_pillow  # 导入商城卡片生成函数
 from .shop_manager import ShopManager
+from .session_store import SessionStore
+from .ownership import OwnershipIndex
+from .storage import YamlStore
+from .buffs import buff_engine
+from .metrics import timed
+from .tracing import traced
 
 
 # --- 配置常量 ---
@@ -18,6 +24,8 @@ SELL_PRICE = 20  # 出售价格
 REDEEM_COST = 20  # 赎身成本
 MAX_OWNED_MEMBERS = 3  # 最大拥有群友数量
 MAX_DAILY_PURCHASES = 10  # 每日最大购买次数
+WORK_SESSION_TIMEOUT_SECONDS = 300  # 打工会话（等待选择工作）超时时间
+MAX_WORK_SESSIONS = 1000  # 同时存在的打工会话上限
 
 # 工作列表配置
 JOBS = {
@@ -79,40 +87,71 @@ JOBS = {
     }
 }
 
+class _MarketDumper(yaml.Dumper):
+    """worked_for 在内存中是集合，保存时仍写成列表，保持文件格式不变"""
+
+
+_MarketDumper.add_representer(set, lambda dumper, value: dumper.represent_list(sorted(value)))
+
+
+def _restore_worked_for(data: dict) -> dict:
+    """打工记录在内存中使用集合"""
+    for group_data in data.values():
+        for user_market_info in group_data.values():
+            user_market_info["worked_for"] = set(user_market_info.get("worked_for") or ())
+    return data
+
+
 class MarketManager:
-    def __init__(self, data_dir: str):
-        """初始化Astr币商城管理器"""
+    def __init__(self, data_dir: str, rng=None):
+        """初始化Astr币商城管理器（rng: 打工使用的随机流，缺省时使用全局 random）"""
         self.data_dir = data_dir
+        self.rng = rng or random
         self.market_data_file = os.path.join(data_dir, "market_data.yaml")
+        self.store = YamlStore(self.market_data_file, "商城数据", dumper=_MarketDumper, on_load=_restore_worked_for)
         self.market_data = self._load_market_data()
+
+        # 群友归属双向索引（以 owner 字段为准建立）
+        self.ownership = OwnershipIndex.from_market_data(self.market_data)
+        if self.ownership.repaired:
+            self._save_market_data()
         
         # 打工会话状态
-        self.work_sessions = {}  # {session_id: {'owner_id': xx, 'worker_id': xx}}
+        self.work_sessions = SessionStore("work_sessions", WORK_SESSION_TIMEOUT_SECONDS, MAX_WORK_SESSIONS)
         
     def _load_market_data(self) -> dict:
         """加载商城数据"""
-        if os.path.exists(self.market_data_file):
-            try:
-                with open(self.market_data_file, 'r', encoding='utf-8') as f:
-                    return yaml.safe_load(f) or {}
-            except Exception as e:
-                logger.error(f"加载商城数据失败: {str(e)}")
-                return {}
-        return {}
+        try:
+            return self.store.load()
+        except Exception as e:
+            logger.error(f"加载商城数据失败: {str(e)}")
+            return {}
     
+    @timed("storage", "market_data")
     def _save_market_data(self):
-        """保存商城数据"""
+        """保存商城数据（合并了其他进程的修改时重建归属索引）"""
         try:
-            with open(self.market_data_file, 'w', encoding='utf-8') as f:
-                yaml.dump(self.market_data, f, allow_unicode=True)
+            if self.store.save(self.market_data):
+                self.ownership = OwnershipIndex.from_market_data(self.market_data)
         except Exception as e:
             logger.error(f"保存商城数据失败: {str(e)}")
     
+    def refresh_from_disk(self):
+        """合并其他进程对商城数据的修改（合并后重建归属索引），在指令修改数据之前调用"""
+        try:
+            if self.store.refresh(self.market_data):
+                self.ownership = OwnershipIndex.from_market_data(self.market_data)
+        except Exception as e:
+            logger.error(f"同步商城数据失败: {str(e)}")
+
+    @staticmethod
+    def _group_key(group_id: str) -> str:
+        """群聊在商城数据中的键（私聊统一为 private_chat）"""
+        return str(group_id) if group_id else "private_chat"
+
     def _get_group_market_data(self, group_id: str) -> dict:
         """获取指定群聊的商城数据，如果不存在则创建"""
-        if not group_id:
-            return self.market_data.setdefault("private_chat", {})
-        return self.market_data.setdefault(str(group_id), {})
+        return self.market_data.setdefault(self._group_key(group_id), {})
 
     def _get_user_market_data(self, group_id: str, user_id: str) -> dict:
         """获取指定群聊中用户的商城数据，如果不存在则创建"""
@@ -124,26 +163,28 @@ class MarketManager:
                 "owner": None,  # 被谁拥有
                 "daily_purchases": 0,  # 今日购买次数
                 "last_purchase_date": "",  # 上次购买日期
-                "worked_for": [] , # 已经为谁打工过（重置条件：被重新购买）
+                "worked_for": set(),  # 已经为谁打工过（重置条件：被重新购买）
                 "total_work_revenue": 0.0,    # 无情资本家：打工总收入
                 "total_work_failures": 0      # 黑心老板：名下奴隶打工失败次数            
             
             
             }
-            
+            self.ownership.add_member(self._group_key(group_id), user_id)
+
         # 步骤2：获取用户数据，并将日期检查逻辑移到if块之外，确保每次都执行
         user_market_info = group_market_data[user_id]
         today = datetime.now().strftime("%Y-%m-%d")
 
         # 步骤3：检查上次购买日期是否为今天，如果不是则重置购买次数
+        # （只修改内存，随调用方的下一次保存写入；读取时不保存，避免合并重建索引打断调用方）
         if user_market_info.get("last_purchase_date", "") != today:
             user_market_info["daily_purchases"] = 0
             user_market_info["last_purchase_date"] = today
-            self._save_market_data()
                 
         return user_market_info
 
     
+    @timed("name", "get_user_name")
     async def get_user_name(self, event: AstrMessageEvent, user_id: str) -> str:
         """
         获取群内任意用户的名称（优先使用群名片）。
@@ -196,21 +237,61 @@ class MarketManager:
     
     def start_work_session(self, session_id: str, group_id: str, owner_id: str, worker_id: str):
         """开始一个打工会话"""
-        self.work_sessions[session_id] = {
+        self.work_sessions.set(session_id, {
             'group_id': group_id,  # 添加群聊ID
             'owner_id': owner_id,
             'worker_id': worker_id
-        }
+        })
     
     def get_work_session(self, session_id: str) -> Optional[dict]:
-        """获取打工会话"""
+        """获取打工会话（超时的会话视为不存在）"""
         return self.work_sessions.get(session_id)
     
     def end_work_session(self, session_id: str):
         """结束打工会话"""
-        if session_id in self.work_sessions:
-            del self.work_sessions[session_id]
+        self.work_sessions.pop(session_id)
     
+    def _assign_member(self, group_id: str, owner_id: str, worker_id: str):
+        """
+        将群友归属到新主人：先写入双方的持久化字段，最后更新索引
+        （索引可能随时按持久化字段重建，先更新索引的修改会在重建时丢失）
+        """
+        group_key = self._group_key(group_id)
+        owner_info = self._get_user_market_data(group_id, owner_id)
+        worker_info = self._get_user_market_data(group_id, worker_id)
+        self._remove_from_previous_owner(group_id, worker_id)
+        owner_info["owned_members"].append(worker_id)
+        worker_info["owner"] = owner_id
+        self.ownership.assign(group_key, owner_id, worker_id)
+
+    def _release_member(self, group_id: str, worker_id: str):
+        """解除群友的归属（出售或赎身）：先写入双方的持久化字段，最后更新索引"""
+        worker_info = self._get_user_market_data(group_id, worker_id)
+        self._remove_from_previous_owner(group_id, worker_id)
+        worker_info["owner"] = None
+        self.ownership.release(self._group_key(group_id), worker_id)
+
+    def _remove_from_previous_owner(self, group_id: str, worker_id: str):
+        """从当前主人的 owned_members 中移除该群友"""
+        previous_owner = self.ownership.owner_of(self._group_key(group_id), worker_id)
+        if previous_owner is not None:
+            previous_owned = self._get_user_market_data(group_id, previous_owner)["owned_members"]
+            if worker_id in previous_owned:
+                previous_owned.remove(worker_id)
+
+    def get_owner(self, group_id: str, user_id: str) -> Optional[str]:
+        """群友的主人（自由身为 None）"""
+        return self.ownership.owner_of(self._group_key(group_id), user_id)
+
+    def get_group_owners(self, group_id: str) -> List[str]:
+        """群内所有拥有群友的主人"""
+        return self.ownership.owners(self._group_key(group_id))
+
+    def get_free_members(self, group_id: str) -> List[str]:
+        """群内所有参与过商城且当前为自由身的成员"""
+        return self.ownership.free_members(self._group_key(group_id))
+
+    @traced()
     async def process_buy_member(self, event: AstrMessageEvent, group_id: str, buyer_id: str, target_id: str, 
                         user_data: dict, confirm: bool = False) -> Tuple[bool, str, bool]:
         """处理购买群友的逻辑
@@ -241,7 +322,7 @@ class MarketManager:
             return False, f"今日购买次数已达上限({MAX_DAILY_PURCHASES}次)，明天再来吧~", False
         
         # 检查拥有群友数量上限
-        if len(buyer_market_data["owned_members"]) >= MAX_OWNED_MEMBERS:
+        if self.ownership.count_owned(self._group_key(group_id), buyer_id) >= MAX_OWNED_MEMBERS:
             return False, f"你已经拥有{MAX_OWNED_MEMBERS}个群友了，无法继续购买~", False
         
         # 检查目标是否已有主人
@@ -261,19 +342,10 @@ class MarketManager:
         # 执行购买
         user_data["points"] -= cost
         
-        # 如果目标已有主人，从原主人的拥有列表中移除
-        if has_owner:
-            original_owner = target_market_data["owner"]
-            original_owner_data = self._get_user_market_data(group_id, original_owner)
-            if target_id in original_owner_data["owned_members"]:
-                original_owner_data["owned_members"].remove(target_id)
-        
-        
-        # 更新购买者和目标的数据
-        buyer_market_data["owned_members"].append(target_id)
+        # 更新归属（如果目标已有主人，会从原主人的拥有列表中移除）
+        self._assign_member(group_id, buyer_id, target_id)
         buyer_market_data["daily_purchases"] += 1
-        target_market_data["owner"] = buyer_id
-        target_market_data["worked_for"] = []  # 重置打工状态，被重新购买后可以再次打工
+        target_market_data["worked_for"] = set()  # 重置打工状态，被重新购买后可以再次打工
         
         self._save_market_data()
         
@@ -287,6 +359,7 @@ class MarketManager:
             
         return True, f"✅ 购买成功！你已花费 {cost} Astr币购买了 {target_name}。", False
 
+    @traced()
     async def init_work_command(self, event: AstrMessageEvent, group_id: str, owner_id: str, worker_id: str) -> Tuple[bool, str, Optional[str]]:
         """初始化打工命令，返回工作列表
         
@@ -298,14 +371,11 @@ class MarketManager:
             return False, "妹妹是天，不能对妹妹操作", None
         
             # 检查是否拥有该用户
-        owner_market_data = self._get_user_market_data(group_id, owner_id)
-        if worker_id not in owner_market_data["owned_members"]:
+        if not self.ownership.owns(self._group_key(group_id), owner_id, worker_id):
             return False, "对方不是你的群友，无法让其打工~", None
 
         # 检查该用户的商城数据
         worker_market_data = self._get_user_market_data(group_id, worker_id)
-        if worker_market_data["owner"] != owner_id:
-            return False, "对方不是你的群友，无法让其打工~", None
         if owner_id in worker_market_data["worked_for"]:
             return False, "Ta已经为你打工过了，需要重新购买后才能再次打工~", None
 
@@ -321,6 +391,7 @@ class MarketManager:
 
         return True, message, image_path
     
+    @traced()
     async def get_work_list_image_path(self) -> Optional[str]:
         """
         获取打工列表图片的路径。如果图片不存在，则生成它。
@@ -341,6 +412,77 @@ class MarketManager:
         else:
             return None
 
+    def _settle_work(self, job_name: str, buffs: dict) -> Dict[str, Any]:
+        """
+        结算一次打工：判定成败、计算收益或损失，并按规则消耗 buffs 中的道具效果。
+        不修改用户数据与商城数据，由调用方统一写入。
+
+        Returns:
+            dict: {"success", "result"(收益为正，损失为负), "reward", "risk_cost",
+                   "boost_percentage"(能量饮料提升比例，未生效为None), "buffs_used"(生效的道具效果列表)}
+        """
+        job = JOBS[job_name]
+        # 道具对高风险工作无效
+        is_high_risk_job = (job_name == "偷窃苏特尔的宝库")
+        buffs_used = []
+
+        # 1. 判定成功率
+        if not is_high_risk_job and buff_engine.consume(buffs, "work_guarantee_success"):
+            is_success = True
+            buffs_used.append("work_guarantee_success")
+        else:
+            is_success = self.rng.random() < job["success_rate"]
+
+        # 2. 计算收益或损失
+        settlement = {"success": is_success, "result": 0, "reward": 0, "risk_cost": 0,
+                      "boost_percentage": None, "buffs_used": buffs_used}
+        if is_success:
+            reward_val = job["reward"]
+            reward = self.rng.uniform(reward_val[0], reward_val[1]) if isinstance(reward_val, (list, tuple)) else reward_val
+
+            # 应用奖励提升效果（对高风险工作无效）
+            if not is_high_risk_job and buff_engine.consume(buffs, "work_reward_boost"):
+                boost_percentage = self.rng.uniform(0.01, 0.5)  # 1%-50%的随机提升
+                reward *= (1 + boost_percentage)
+                buffs_used.append("work_reward_boost")
+                settlement["boost_percentage"] = boost_percentage
+
+            settlement["reward"] = round(reward, 2)
+            settlement["result"] = settlement["reward"]
+        elif not is_high_risk_job and buff_engine.consume(buffs, "work_no_penalty"):
+            buffs_used.append("work_no_penalty")
+        else:
+            cost_val = job["risk_cost"]
+            risk_cost = self.rng.uniform(cost_val[0], cost_val[1]) if isinstance(cost_val, (list, tuple)) else cost_val
+            settlement["risk_cost"] = round(risk_cost, 2)
+            settlement["result"] = -settlement["risk_cost"]
+        return settlement
+
+    @staticmethod
+    def _format_work_message(job_name: str, worker_name: str, settlement: dict) -> str:
+        """生成打工结果的文本"""
+        job = JOBS[job_name]
+        if settlement["success"]:
+            message = ""
+            if settlement["boost_percentage"] is not None:
+                message = f"[能量饮料效果] 奖励提升了{int(settlement['boost_percentage']*100)}%！\n"
+            return message + job["success_msg"].format(worker_name=worker_name, reward=settlement["reward"])
+        if "work_no_penalty" in settlement["buffs_used"]:
+            message = f"[守护符效果] 虽然打工失败，但不会扣除Astr币！\n"
+            return message + job["failure_msg"].format(worker_name=worker_name, risk_cost=0)
+        return job["failure_msg"].format(worker_name=worker_name, risk_cost=settlement["risk_cost"])
+
+    def _apply_work_settlement(self, owner_user_data: dict, owner_market_data: dict, settlement: dict):
+        """将一次打工结算写入主人的Astr币与商城统计"""
+        owner_user_data["points"] += settlement["result"]
+        if settlement["success"]:
+            # 更新主人总收入
+            owner_market_data["total_work_revenue"] = owner_market_data.get("total_work_revenue", 0.0) + settlement["reward"]
+        elif "work_no_penalty" not in settlement["buffs_used"]:
+            # 更新主人名下失败次数
+            owner_market_data["total_work_failures"] = owner_market_data.get("total_work_failures", 0) + 1
+
+    @traced()
     async def process_work_job(self, event: AstrMessageEvent, job_name: str, owner_user_data: dict) -> Tuple[bool, str, int]:
         """
         处理具体工作的逻辑, 同时支持道具效果和成就统计
@@ -369,75 +511,87 @@ class MarketManager:
 
         worker_name = await self.get_user_name(event, worker_id)
         
-        job = JOBS[job_name]
-        
-        # --- [修正] 检查是否为"打工8"，并应用道具效果 ---
-        is_high_risk_job = (job_name == "偷窃苏特尔的宝库")
-        buffs = owner_user_data.get('buffs', {})
-        
-        # 1. 判定成功率
-        is_success = False
-        if not is_high_risk_job and buffs.get("work_guarantee_success", 0) > 0:
-            is_success = True
-            buffs["work_guarantee_success"] -= 1
-        else:
-            is_success = random.random() < job["success_rate"]
-        
-        # 2. 计算收益或损失
-        result = 0
-        message = ""
-        
-        if is_success:
-            reward_val = job["reward"]
-            reward = random.uniform(reward_val[0], reward_val[1]) if isinstance(reward_val, (list, tuple)) else reward_val
-            
-            # 应用奖励提升效果（对高风险工作无效）
-            if not is_high_risk_job and buffs.get("work_reward_boost", 0) > 0:
-                boost_percentage = random.uniform(0.01, 0.5)  # 1%-50%的随机提升
-                original_reward = reward
-                reward *= (1 + boost_percentage)
-                message = f"[能量饮料效果] 奖励提升了{int(boost_percentage*100)}%！\n"
-                buffs["work_reward_boost"] -= 1
-            
-            reward = round(reward, 2)
-            owner_user_data["points"] += reward
-            
-            # 更新主人总收入
-            owner_market_data["total_work_revenue"] = owner_market_data.get("total_work_revenue", 0.0) + reward
-            
-            message += job["success_msg"].format(worker_name=worker_name, reward=reward)
-            result = reward
-        else:
-            if not is_high_risk_job and buffs.get("work_no_penalty", 0) > 0:
-                message = f"[守护符效果] 虽然打工失败，但不会扣除Astr币！\n"
-                message += job["failure_msg"].format(worker_name=worker_name, risk_cost=0)
-                result = 0
-                buffs["work_no_penalty"] -= 1
-            else:
-                cost_val = job["risk_cost"]
-                risk_cost = random.uniform(cost_val[0], cost_val[1]) if isinstance(cost_val, (list, tuple)) else cost_val
-                risk_cost = round(risk_cost, 2)
-                owner_user_data["points"] -= risk_cost
-                
-                # 更新主人名下失败次数
-                owner_market_data["total_work_failures"] = owner_market_data.get("total_work_failures", 0) + 1
-
-                message = job["failure_msg"].format(worker_name=worker_name, risk_cost=risk_cost)
-                result = -risk_cost
-        
-        # 清理空的buff项
-        owner_user_data["buffs"] = {k: v for k, v in buffs.items() if v > 0}
+        settlement = self._settle_work(job_name, owner_user_data.setdefault('buffs', {}))
+        self._apply_work_settlement(owner_user_data, owner_market_data, settlement)
+        message = self._format_work_message(job_name, worker_name, settlement)
         
         # 无论成功与否，都要记录本次打工
-        worker_market_data["worked_for"].append(owner_id)
+        worker_market_data["worked_for"].add(owner_id)
         
         self.end_work_session(event.unified_msg_origin)
         self._save_market_data()  # 保存市场数据的更改
         
-        return is_success, message, result
+        return settlement["success"], message, settlement["result"]
+
+    def get_eligible_workers(self, group_id: str, owner_id: str) -> List[str]:
+        """主人名下今天还可以打工的群友（尚未为该主人打工过）"""
+        # 按购买顺序返回
+        owner_market_data = self._get_user_market_data(group_id, owner_id)
+        return [
+            worker_id for worker_id in owner_market_data["owned_members"]
+            if owner_id not in self._get_user_market_data(group_id, worker_id)["worked_for"]
+        ]
+
+    @traced()
+    async def process_batch_work(self, event: AstrMessageEvent, group_id: str, owner_id: str,
+                                 job_name: str, owner_user_data: dict) -> Dict[str, Any]:
+        """
+        让主人名下所有可打工的群友一次性完成同一项工作。
+        名称并发获取，道具效果按群友依次消耗并汇总，商城数据只保存一次
+        （用户数据由调用方保存一次）。
+
+        Returns:
+            dict: {"success", "message", "job_name", "workers": [{"id", "name", "success", "result", "message"}],
+                   "total_profit", "success_count", "failure_count", "buffs_used": {buff名: 次数},
+                   "points_before", "points_after"}
+        """
+        if job_name not in JOBS:
+            return {"success": False, "message": f"没有找到'{job_name}'这项工作，请重新选择~"}
+
+        worker_ids = self.get_eligible_workers(group_id, owner_id)
+        if not worker_ids:
+            return {"success": False, "message": "你名下没有可以打工的群友（需要先购买，已打工过的需要重新购买）~"}
+
+        owner_market_data = self._get_user_market_data(group_id, owner_id)
+        worker_names = await asyncio.gather(*(self.get_user_name(event, worker_id) for worker_id in worker_ids))
+
+        buffs = owner_user_data.setdefault('buffs', {})
+        points_before = owner_user_data["points"]
+        workers = []
+        buffs_used: Dict[str, int] = {}
+        for worker_id, worker_name in zip(worker_ids, worker_names):
+            settlement = self._settle_work(job_name, buffs)
+            self._apply_work_settlement(owner_user_data, owner_market_data, settlement)
+            for buff in settlement["buffs_used"]:
+                buffs_used[buff] = buffs_used.get(buff, 0) + 1
+            self._get_user_market_data(group_id, worker_id)["worked_for"].add(owner_id)
+            workers.append({
+                "id": worker_id,
+                "name": worker_name,
+                "success": settlement["success"],
+                "result": settlement["result"],
+                "message": self._format_work_message(job_name, worker_name, settlement),
+            })
+
+        self._save_market_data()
+
+        success_count = sum(1 for worker in workers if worker["success"])
+        return {
+            "success": True,
+            "message": "",
+            "job_name": job_name,
+            "workers": workers,
+            "total_profit": round(owner_user_data["points"] - points_before, 2),
+            "success_count": success_count,
+            "failure_count": len(workers) - success_count,
+            "buffs_used": buffs_used,
+            "points_before": points_before,
+            "points_after": owner_user_data["points"],
+        }
 
 
     
+    @traced()
     async def process_sell_member(self, event: AstrMessageEvent, group_id: str, seller_id: str, 
                                 target_id: str, user_data: dict) -> Tuple[bool, str]:
         """处理出售群友的逻辑"""
@@ -445,17 +599,13 @@ class MarketManager:
         if target_id == event.get_self_id():
             return False, "妹妹是天，不能对妹妹操作"       
         
-        seller_market_data = self._get_user_market_data(group_id, seller_id)
-        target_market_data = self._get_user_market_data(group_id, target_id)
-        
         # 检查是否拥有该群友
-        if target_id not in seller_market_data["owned_members"]:
+        if not self.ownership.owns(self._group_key(group_id), seller_id, target_id):
             return False, "对方不是你的群友，无法出售~"
-        
+
         # 执行出售
         user_data["points"] += SELL_PRICE
-        seller_market_data["owned_members"].remove(target_id)
-        target_market_data["owner"] = None
+        self._release_member(group_id, target_id)
         
         self._save_market_data()
         
@@ -463,6 +613,7 @@ class MarketManager:
         
         return True, f"✅ 出售成功！你已出售 {target_name}，获得 {SELL_PRICE} Astr币。"
     
+    @traced()
     async def process_redeem(self, event: AstrMessageEvent, group_id: str, user_id: str, 
                        user_data: dict, confirm: bool = False) -> Tuple[bool, str]:
         """处理自我赎身的逻辑"""
@@ -490,19 +641,14 @@ class MarketManager:
             return False, f"你的Astr币不足，需要{cost}Astr币才能赎身~"
         
         # 执行赎身
-        owner_id = market_data["owner"]
-        owner_market_data = self._get_user_market_data(group_id, owner_id)
-        
         user_data["points"] -= cost
-        market_data["owner"] = None
-        
-        if user_id in owner_market_data["owned_members"]:
-            owner_market_data["owned_members"].remove(user_id)
+        self._release_member(group_id, user_id)
         
         self._save_market_data()
    
         return True, f"✅ 赎身成功！你已花费 {cost} Astr币赎回自由身。"
     
+    @traced()
     async def get_market_status(self, event: AstrMessageEvent, group_id: str, user_id: str) -> Dict:
         """获取用户在商城中的状态数据字典"""
         if user_id == event.get_self_id():
@@ -0,0 +1,371 @@
+# feifeisupermarket/memory_inspector.py
+
+"""
+AstrAstr超级市场 - 内存检查
+
+用于长时间运行的机器人进程定位内存增长来自哪个子系统：
+- 结构统计：按注册的名称（各管理器的数据、会话存储、索引与缓存）递归统计对象占用的字节数。
+  所有结构共用一个"已统计"集合，按注册顺序归属：先注册原始数据，
+  之后的索引、缓存只计入它们额外持有的对象
+- 分配追踪：基于 tracemalloc，按插件模块（或外部包）汇总分配，支持两次快照之间的差异对比
+- 导出：把 tracemalloc 快照与结构统计写入磁盘，便于离线分析
+
+统计在事件循环中同步执行（遍历的数据结构随时可能被其他协程修改），
+耗时与对象数量成正比，仅供管理员按需调用。
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+import types
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+# 单个结构统计时最多遍历的对象数量，超出时停止并标记为不完整
+MAX_OBJECTS_PER_STRUCTURE = 2_000_000
+# 保留的快照数量
+MAX_SNAPSHOTS = 4
+# 不计入统计的对象类型：函数、模块、类型、事件循环与同步原语等
+# （会话存储的回调是插件实例的绑定方法，顺着它会统计到整个插件）
+_SKIP_TYPES = (
+    type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType,
+    types.CoroutineType, types.GeneratorType, types.AsyncGeneratorType, types.FrameType,
+    asyncio.Future, asyncio.AbstractEventLoop, contextvars.Context, contextvars.ContextVar,
+    logging.Logger, type(threading.Lock()),
+)
+_PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def process_rss_mb(peak: bool = False) -> float:
+    """
+    当前进程的常驻内存（MB）。peak 为 True 或无法读取 /proc（非 Linux）时返回峰值，
+    没有 resource 模块（Windows）时返回 0
+    """
+    if not peak:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        except (OSError, ValueError, AttributeError):
+            pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def format_bytes(size: float, signed: bool = False) -> str:
+    """把字节数格式化为 B/KB/MB/GB"""
+    sign = ("+" if size >= 0 else "-") if signed else ("-" if size < 0 else "")
+    size = abs(size)
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{sign}{size:.0f}{unit}" if unit == "B" else f"{sign}{size:.1f}{unit}"
+        size /= 1024
+    return f"{sign}{size:.2f}GB"
+
+
+def _image_bytes(obj: Any) -> Optional[int]:
+    """Pillow 图片的像素缓冲区不在 sys.getsizeof 中，按尺寸与通道数估算"""
+    size, getbands = getattr(obj, "size", None), getattr(obj, "getbands", None)
+    if not (isinstance(size, tuple) and len(size) == 2 and callable(getbands) and hasattr(obj, "mode")):
+        return None
+    try:
+        return size[0] * size[1] * len(getbands())
+    except Exception:
+        return None
+
+
+def deep_sizeof(root: Any, seen: Optional[set] = None,
+                max_objects: int = MAX_OBJECTS_PER_STRUCTURE) -> Tuple[int, int, bool]:
+    """
+    递归统计对象及其引用的容器、实例属性占用的字节数。
+
+    Args:
+        seen: 已统计对象的 id 集合，多次调用共用时重复引用只计一次
+        max_objects: 最多遍历的对象数量
+
+    Returns:
+        (字节数, 对象数量, 是否完整)
+    """
+    if seen is None:
+        seen = set()
+    total = count = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        obj_id = id(obj)
+        if obj_id in seen or isinstance(obj, _SKIP_TYPES):
+            continue
+        seen.add(obj_id)
+        count += 1
+        if count > max_objects:
+            return total, count - 1, False
+
+        try:
+            total += sys.getsizeof(obj)
+        except TypeError:
+            continue
+        if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        else:
+            image_size = _image_bytes(obj)
+            if image_size is not None:
+                total += image_size
+                continue
+            attrs = getattr(obj, "__dict__", None)
+            if isinstance(attrs, dict):
+                stack.append(attrs)
+            for cls in type(obj).__mro__:
+                for slot in getattr(cls, "__slots__", ()):
+                    if slot in ("__dict__", "__weakref__"):
+                        continue
+                    value = getattr(obj, slot, None)
+                    if value is not None:
+                        stack.append(value)
+    return total, count, True
+
+
+def _source_of(filename: str) -> str:
+    """把分配位置的文件名归到插件模块或外部包"""
+    if filename.startswith(_PLUGIN_DIR):
+        return os.path.relpath(filename, _PLUGIN_DIR)
+    parts = filename.replace("\\", "/").split("/")
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            index = parts.index(marker)
+            return parts[index + 1] if index + 1 < len(parts) else filename
+    if "astrbot" in parts:
+        return "astrbot"
+    return filename if filename.startswith("<") else os.path.basename(filename)
+
+
+class MemoryInspector:
+    """
+    内存检查器
+
+    Args:
+        dump_dir: 导出文件的目录
+        max_dumps: 导出目录中最多保留的导出次数，超出时删除最早的
+    """
+
+    def __init__(self, dump_dir: str, max_dumps: int = 10):
+        self.dump_dir = dump_dir
+        self.max_dumps = max_dumps
+        self._structures: Dict[str, Callable[[], Any]] = {}
+        self._snapshots: Deque[dict] = deque(maxlen=MAX_SNAPSHOTS)
+
+    def register(self, name: str, getter: Callable[[], Any]):
+        """注册一个需要统计的结构，getter 在统计时调用（返回当前的对象）"""
+        self._structures[name] = getter
+
+    # ------------------------------------------------------------------
+    # 结构统计
+    # ------------------------------------------------------------------
+
+    def measure(self) -> List[dict]:
+        """
+        统计所有注册的结构。
+
+        Returns:
+            按注册顺序的 [{"name", "bytes", "objects", "entries", "complete"}]，
+            entries 为结构本身的条目数量（不支持 len 时为 None）
+        """
+        seen = set()
+        rows = []
+        for name, getter in self._structures.items():
+            try:
+                obj = getter()
+                size, objects, complete = deep_sizeof(obj, seen)
+                try:
+                    entries = len(obj)
+                except TypeError:
+                    entries = None
+            except Exception as e:
+                logger.error(f"统计内存结构 {name} 失败: {e}")
+                continue
+            rows.append({"name": name, "bytes": size, "objects": objects,
+                         "entries": entries, "complete": complete})
+        return rows
+
+    # ------------------------------------------------------------------
+    # 分配追踪
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def is_tracing() -> bool:
+        return tracemalloc.is_tracing()
+
+    @staticmethod
+    def start_tracing(frames: int = 1) -> bool:
+        """开始 tracemalloc 追踪，已在追踪时返回 False（追踪期间分配会变慢）"""
+        if tracemalloc.is_tracing():
+            return False
+        tracemalloc.start(max(1, frames))
+        logger.info(f"已开始内存分配追踪（{frames} 层调用栈）")
+        return True
+
+    def stop_tracing(self) -> bool:
+        """停止追踪并丢弃保存的分配快照"""
+        if not tracemalloc.is_tracing():
+            return False
+        tracemalloc.stop()
+        for snapshot in self._snapshots:
+            snapshot["tracemalloc"] = None
+        logger.info("已停止内存分配追踪")
+        return True
+
+    @staticmethod
+    def traced_memory() -> Tuple[int, int]:
+        """(当前, 峰值) 追踪到的分配字节数，未追踪时为 (0, 0)"""
+        return tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+
+    def take_snapshot(self, label: str = "") -> dict:
+        """
+        记录一个快照：结构统计、进程内存，以及追踪中时的 tracemalloc 快照。
+
+        Returns:
+            {"label", "time", "rss_mb", "structures", "tracemalloc"}
+        """
+        snapshot = None
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            ))
+        record = {
+            "label": label or f"#{len(self._snapshots) + 1}",
+            "time": datetime.now(),
+            "rss_mb": process_rss_mb(),
+            "structures": self.measure(),
+            "tracemalloc": snapshot,
+        }
+        self._snapshots.append(record)
+        return record
+
+    def snapshot_count(self) -> int:
+        return len(self._snapshots)
+
+    @staticmethod
+    def top_sources(snapshot: tracemalloc.Snapshot, limit: int = 10) -> List[Tuple[str, int, int]]:
+        """按插件模块/外部包汇总的分配 [(来源, 字节数, 分配块数)]，按字节数降序"""
+        totals: Dict[str, List[int]] = {}
+        for stat in snapshot.statistics("filename"):
+            source = _source_of(stat.traceback[0].filename)
+            entry = totals.setdefault(source, [0, 0])
+            entry[0] += stat.size
+            entry[1] += stat.count
+        rows = [(source, size, count) for source, (size, count) in totals.items()]
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows[:limit]
+
+    def diff(self, limit: int = 10) -> Optional[dict]:
+        """
+        对比最近两个快照。
+
+        Returns:
+            None（快照不足两个时），或
+            {"before", "after", "seconds", "rss_delta_mb",
+             "structures": [(名称, 字节变化, 当前字节数)]（按变化绝对值降序），
+             "sources": [(来源, 字节变化, 分配块变化)] 或 None（两次快照未都在追踪中时），
+             "lines": [(位置, 字节变化)] 或 None}
+        """
+        if len(self._snapshots) < 2:
+            return None
+        before, after = self._snapshots[-2], self._snapshots[-1]
+
+        previous = {row["name"]: row["bytes"] for row in before["structures"]}
+        structures = [
+            (row["name"], row["bytes"] - previous.get(row["name"], 0), row["bytes"])
+            for row in after["structures"]
+        ]
+        structures.sort(key=lambda row: abs(row[1]), reverse=True)
+
+        sources = lines = None
+        if before["tracemalloc"] is not None and after["tracemalloc"] is not None:
+            deltas: Dict[str, List[int]] = {}
+            for stat in after["tracemalloc"].compare_to(before["tracemalloc"], "filename"):
+                entry = deltas.setdefault(_source_of(stat.traceback[0].filename), [0, 0])
+                entry[0] += stat.size_diff
+                entry[1] += stat.count_diff
+            sources = sorted(((s, d[0], d[1]) for s, d in deltas.items() if d[0]),
+                             key=lambda row: abs(row[1]), reverse=True)[:limit]
+            lines = [
+                (f"{_source_of(stat.traceback[0].filename)}:{stat.traceback[0].lineno}", stat.size_diff)
+                for stat in after["tracemalloc"].compare_to(before["tracemalloc"], "lineno")[:limit]
+                if stat.size_diff
+            ]
+
+        return {
+            "before": before["label"],
+            "after": after["label"],
+            "seconds": (after["time"] - before["time"]).total_seconds(),
+            "rss_delta_mb": after["rss_mb"] - before["rss_mb"],
+            "structures": structures[:limit],
+            "sources": sources,
+            "lines": lines,
+        }
+
+    # ------------------------------------------------------------------
+    # 导出
+    # ------------------------------------------------------------------
+
+    def dump(self) -> Optional[str]:
+        """
+        把最近一个快照导出到磁盘：结构统计写入 JSON，tracemalloc 快照写入 .tracemalloc
+        （可用 tracemalloc.Snapshot.load 读取）。没有快照时先记录一个。
+
+        Returns:
+            JSON 文件路径，失败时返回None
+        """
+        record = self._snapshots[-1] if self._snapshots else self.take_snapshot("dump")
+        stamp = record["time"].strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(self.dump_dir, f"memory_{stamp}")
+        try:
+            os.makedirs(self.dump_dir, exist_ok=True)
+            if record["tracemalloc"] is not None:
+                record["tracemalloc"].dump(base + ".tracemalloc")
+            with open(base + ".json", "w", encoding="utf-8") as f:
+                json.dump({
+                    "label": record["label"],
+                    "time": record["time"].isoformat(timespec="seconds"),
+                    "rss_mb": round(record["rss_mb"], 1),
+                    "structures": record["structures"],
+                    "has_tracemalloc": record["tracemalloc"] is not None,
+                }, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.error(f"导出内存快照失败: {e}")
+            return None
+        self._prune_dumps()
+        return base + ".json"
+
+    def _prune_dumps(self):
+        """只保留最近 max_dumps 次导出"""
+        try:
+            stamps = sorted({
+                os.path.splitext(name)[0] for name in os.listdir(self.dump_dir) if name.startswith("memory_")
+            })
+            for stamp in stamps[:-self.max_dumps] if self.max_dumps > 0 else []:
+                for ext in (".json", ".tracemalloc"):
+                    path = os.path.join(self.dump_dir, stamp + ext)
+                    if os.path.exists(path):
+                        os.remove(path)
+        except OSError as e:
+            logger.warning(f"清理旧的内存快照失败: {e}")
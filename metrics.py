@@ -0,0 +1,263 @@
+# feifeisupermarket/metrics.py
+
+"""
+AstrAstr超级市场 - 性能指标
+
+按 (类别, 名称) 记录耗时直方图与错误次数，全部保存在内存中：
+- command: 指令处理函数的整体耗时（@instrument_command 装饰）
+- storage: 数据文件保存耗时
+- render / render_wait: 图片渲染耗时与排队等待时间
+- name: 用户名称查询耗时
+- send: 主动发送消息（event.send / context.send_message）耗时
+
+可通过 render_prometheus() 导出为 Prometheus 文本格式，由可选的本地 HTTP 监听器
+（MetricsServer，基于 aiohttp）提供；管理员指令"性能统计"使用 summary() 展示摘要。
+"""
+
+import bisect
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+from .tracing import tracer
+
+# 直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Prometheus 指标名前缀
+METRIC_PREFIX = "astrsupermarket"
+
+CATEGORY_NAMES = {
+    "command": "指令",
+    "storage": "保存",
+    "render": "渲染",
+    "render_wait": "渲染排队",
+    "name": "名称查询",
+    "send": "发送",
+}
+
+
+class Histogram:
+    """固定桶的耗时直方图"""
+
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """按桶估算分位数（返回所在桶的上限，超出最大桶时返回最大值）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """性能指标注册表"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        self.started_at = time.time()
+
+    def observe(self, category: str, name: str, seconds: float):
+        """记录一次耗时"""
+        histogram = self._histograms.get((category, name))
+        if histogram is None:
+            histogram = self._histograms[(category, name)] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def record_error(self, category: str, name: str):
+        """记录一次错误"""
+        self._errors[(category, name)] = self._errors.get((category, name), 0) + 1
+
+    @contextmanager
+    def timer(self, category: str, name: str):
+        """记录代码块的耗时，代码块抛出异常时同时记录错误"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record_error(category, name)
+            raise
+        finally:
+            self.observe(category, name, time.perf_counter() - start)
+
+    def summary(self, category: Optional[str] = None, limit: int = 10) -> List[dict]:
+        """
+        按总耗时降序的摘要。
+
+        Returns:
+            [{"category", "name", "count", "avg", "p95", "max", "total", "errors"}]
+        """
+        rows = []
+        for (cat, name), histogram in self._histograms.items():
+            if category is not None and cat != category:
+                continue
+            rows.append({
+                "category": cat,
+                "name": name,
+                "count": histogram.count,
+                "avg": histogram.sum / histogram.count if histogram.count else 0.0,
+                "p95": histogram.quantile(0.95),
+                "max": histogram.max,
+                "total": histogram.sum,
+                "errors": self._errors.get((cat, name), 0),
+            })
+        rows.sort(key=lambda row: row["total"], reverse=True)
+        return rows[:limit]
+
+    def error_total(self) -> int:
+        return sum(self._errors.values())
+
+    def render_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        metric = f"{METRIC_PREFIX}_duration_seconds"
+        lines = [
+            f"# HELP {metric} Handler, storage, render and send latency.",
+            f"# TYPE {metric} histogram",
+        ]
+        for (category, name), histogram in sorted(self._histograms.items()):
+            labels = f'category="{_escape_label(category)}",name="{_escape_label(name)}"'
+            cumulative = 0
+            for bucket, bucket_count in zip(self.buckets, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{{labels},le="{bucket}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+        errors = f"{METRIC_PREFIX}_errors_total"
+        lines.append(f"# HELP {errors} Exceptions raised by instrumented code.")
+        lines.append(f"# TYPE {errors} counter")
+        for (category, name), count in sorted(self._errors.items()):
+            lines.append(
+                f'{errors}{{category="{_escape_label(category)}",name="{_escape_label(name)}"}} {count}'
+            )
+
+        uptime = f"{METRIC_PREFIX}_uptime_seconds"
+        lines.append(f"# TYPE {uptime} gauge")
+        lines.append(f"{uptime} {time.time() - self.started_at:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        self._histograms.clear()
+        self._errors.clear()
+        self.started_at = time.time()
+
+
+metrics = MetricsRegistry()
+
+
+def timed(category: str, name: Optional[str] = None) -> Callable:
+    """记录函数耗时的装饰器（支持普通函数与协程函数），名称缺省为函数名；追踪中同时记为一个阶段"""
+    def decorator(func: Callable) -> Callable:
+        label = name or func.__name__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with metrics.timer(category, label), tracer.span(f"{category}:{label}"):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.timer(category, label), tracer.span(f"{category}:{label}"):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_command(command: str) -> Callable:
+    """
+    指令处理函数的装饰器，放在 @filter.command 等装饰器之下（紧贴函数定义）。
+    记录从开始处理到最后一条回复产出的总耗时，处理函数抛出异常时记录错误；
+    同时开启一条追踪，超过阈值的慢指令会输出分段明细（见 tracing.py）。
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with metrics.timer("command", command), tracer.trace(command):
+                    async for result in func(*args, **kwargs):
+                        yield result
+            return wrapper
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with metrics.timer("command", command), tracer.trace(command):
+                return await func(*args, **kwargs)
+        return async_wrapper
+    return decorator
+
+
+class MetricsServer:
+    """
+    在本地端口提供 /metrics 的 HTTP 监听器（需要 aiohttp）
+
+    Args:
+        registry: 指标注册表
+        host: 监听地址，默认只监听本机
+        port: 监听端口
+    """
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self) -> bool:
+        try:
+            from aiohttp import web
+        except ImportError:
+            logger.warning("未安装 aiohttp，性能指标 HTTP 监听器不可用")
+            return False
+
+        async def handle_metrics(request):
+            return web.Response(text=self.registry.render_prometheus(),
+                                content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        runner = web.AppRunner(app)
+        try:
+            await runner.setup()
+            await web.TCPSite(runner, self.host, self.port).start()
+        except OSError as e:
+            logger.error(f"性能指标监听器启动失败（{self.host}:{self.port}）: {e}")
+            await runner.cleanup()
+            return False
+        self._runner = runner
+        logger.info(f"性能指标监听器已启动: http://{self.host}:{self.port}/metrics")
+        return True
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,107 @@
+# feifeisupermarket/ownership.py
+
+"""
+AstrAstr超级市场 - 群友归属索引
+
+market_data 中每个用户的 owned_members（拥有的群友）与 owner（主人）字段仍是持久化格式，
+本索引在内存中按群维护双向映射，供购买、出售、赎身与全群查询使用：
+- 主人 → 群友集合
+- 群友 → 主人
+- 群内出现过的全部成员（用于查询自由身成员）
+"""
+
+from typing import Dict, List, Optional, Set
+
+from astrbot.api import logger
+
+
+class OwnershipIndex:
+    """按群划分的双向归属索引"""
+
+    def __init__(self):
+        self._workers_by_owner: Dict[str, Dict[str, Set[str]]] = {}  # {群: {主人: {群友}}}
+        self._owner_by_worker: Dict[str, Dict[str, str]] = {}  # {群: {群友: 主人}}
+        self._members: Dict[str, Set[str]] = {}  # {群: {成员}}
+        self.repaired = 0  # 建立索引时修正的不一致数量
+
+    @classmethod
+    def from_market_data(cls, market_data: dict) -> "OwnershipIndex":
+        """
+        由商城数据建立索引。以群友的 owner 字段为准，
+        并修正与之不一致的 owned_members 列表（原地修改 market_data）。
+        """
+        index = cls()
+        for group_key, group_data in market_data.items():
+            if not isinstance(group_data, dict):
+                continue
+            for user_id, user_data in group_data.items():
+                index.add_member(group_key, user_id)
+                owner_id = user_data.get("owner")
+                if owner_id is not None:
+                    index.assign(group_key, owner_id, user_id)
+
+            for user_id, user_data in group_data.items():
+                owned = user_data.get("owned_members", [])
+                actual = index.workers_of(group_key, user_id)
+                if set(owned) != actual or len(owned) != len(actual):
+                    # 保留原有顺序，去掉重复与不属于自己的群友，补上遗漏的
+                    fixed = [member for member in dict.fromkeys(owned) if member in actual]
+                    fixed += sorted(actual.difference(fixed))
+                    user_data["owned_members"] = fixed
+                    index.repaired += 1
+
+        if index.repaired:
+            logger.warning(f"群友归属数据存在 {index.repaired} 处不一致，已按主人字段修正")
+        return index
+
+    def add_member(self, group_key: str, user_id: str):
+        """登记群内成员"""
+        self._members.setdefault(group_key, set()).add(user_id)
+
+    def assign(self, group_key: str, owner_id: str, worker_id: str) -> Optional[str]:
+        """将群友归属到新主人，返回原主人（没有则为 None）"""
+        previous = self.release(group_key, worker_id)
+        self._owner_by_worker.setdefault(group_key, {})[worker_id] = owner_id
+        self._workers_by_owner.setdefault(group_key, {}).setdefault(owner_id, set()).add(worker_id)
+        self.add_member(group_key, owner_id)
+        self.add_member(group_key, worker_id)
+        return previous
+
+    def release(self, group_key: str, worker_id: str) -> Optional[str]:
+        """解除群友的归属，返回原主人（没有则为 None）"""
+        owner_id = self._owner_by_worker.get(group_key, {}).pop(worker_id, None)
+        if owner_id is not None:
+            owners = self._workers_by_owner[group_key]
+            owners[owner_id].discard(worker_id)
+            if not owners[owner_id]:
+                del owners[owner_id]
+        return owner_id
+
+    def owner_of(self, group_key: str, worker_id: str) -> Optional[str]:
+        return self._owner_by_worker.get(group_key, {}).get(worker_id)
+
+    def owns(self, group_key: str, owner_id: str, worker_id: str) -> bool:
+        return self.owner_of(group_key, worker_id) == owner_id
+
+    def workers_of(self, group_key: str, owner_id: str) -> Set[str]:
+        """主人拥有的群友（返回副本）"""
+        return set(self._workers_by_owner.get(group_key, {}).get(owner_id, ()))
+
+    def count_owned(self, group_key: str, owner_id: str) -> int:
+        return len(self._workers_by_owner.get(group_key, {}).get(owner_id, ()))
+
+    def owners(self, group_key: str) -> List[str]:
+        """群内所有拥有群友的主人"""
+        return sorted(self._workers_by_owner.get(group_key, {}))
+
+    def free_members(self, group_key: str) -> List[str]:
+        """群内所有自由身（没有主人）的成员"""
+        owned = self._owner_by_worker.get(group_key, {})
+        return sorted(member for member in self._members.get(group_key, ()) if member not in owned)
+
+    def get_stats(self) -> dict:
+        return {
+            "groups": len(self._members),
+            "members": sum(len(members) for members in self._members.values()),
+            "owned": sum(len(workers) for workers in self._owner_by_worker.values()),
+        }
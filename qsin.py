@@ -1,7 +1,6 @@
 # feifeisupermarket/qsin.py
 
 import os
-import random
 from datetime import datetime, timedelta
 
 from astrbot.api.event import AstrMessageEvent
@@ -9,8 +8,22 @@ from astrbot.api import logger
 import astrbot.api.message_components as Comp
 from astrbot.core.utils.session_waiter import session_waiter, SessionController
 
-from ._generate_card import generate_sign_card, generate_sign_card_pillow
 from .re_sign import perform_re_sign
+from .rng import STREAM_SIGN_IN
+from .tracing import span
+
+# 每日签到基础奖励范围（Astr币）
+DAILY_REWARD_RANGE = (10, 30)
+# 连续签到奖励档位：(连续天数下限, 额外奖励)，按天数从高到低排列
+STREAK_BONUS_TIERS = [(7, 50), (3, 20)]
+
+
+def get_streak_bonus(streak_days: int) -> int:
+    """根据连续签到天数计算连续签到奖励"""
+    for min_days, bonus in STREAK_BONUS_TIERS:
+        if streak_days >= min_days:
+            return bonus
+    return 0
 
 # 新增一个内部函数，封装实际的签到逻辑
 async def _perform_actual_sign_in(plugin_instance, event: AstrMessageEvent, group_id: str, user_id: str, user_name: str, avatar_url: str):
@@ -40,13 +53,8 @@ async def _perform_actual_sign_in(plugin_instance, event: AstrMessageEvent, grou
     user["last_sign"] = today
     
     # 计算奖励
-    daily_reward = random.randint(10, 30)
-    streak_bonus = 0
-    
-    if user["streak_days"] >= 7:
-        streak_bonus = 50
-    elif user["streak_days"] >= 3:
-        streak_bonus = 20
+    daily_reward = plugin_instance.rng.stream(STREAM_SIGN_IN).randint(*DAILY_REWARD_RANGE)
+    streak_bonus = get_streak_bonus(user["streak_days"])
         
     user["points"] += (daily_reward + streak_bonus)
     plugin_instance._save_user_data()
@@ -54,26 +62,19 @@ async def _perform_actual_sign_in(plugin_instance, event: AstrMessageEvent, grou
     
     # 生成签到卡片
     try:
-        card_url = await generate_sign_card(
-            star_instance=plugin_instance,
-            user_id=user_id,
-            user_name=user_name,
-            avatar_url=avatar_url,
-            total_days=user["total_days"],
-            streak_days=user["streak_days"],
-            daily_reward=daily_reward,
-            streak_bonus=streak_bonus,
-            total_points=user["points"],
-            sign_time=f"{today} {current_time}",
-            title=user.get("current_title")
-        )
-        
-        if not card_url:
-            card_url = await generate_sign_card_pillow(
-                user_id=user_id, user_name=user_name, avatar_url=avatar_url,
-                total_days=user["total_days"], streak_days=user["streak_days"],
-                daily_reward=daily_reward, streak_bonus=streak_bonus,
-                total_points=user["points"], sign_time=f"{today} {current_time}",
+        from ._generate_card import render_sign_card
+        with span("render_sign_card"):
+            card_url = await render_sign_card(
+                plugin_instance, group_id,
+                user_id=user_id,
+                user_name=user_name,
+                avatar_url=avatar_url,
+                total_days=user["total_days"],
+                streak_days=user["streak_days"],
+                daily_reward=daily_reward,
+                streak_bonus=streak_bonus,
+                total_points=user["points"],
+                sign_time=f"{today} {current_time}",
                 title=user.get("current_title")
             )
 
@@ -113,12 +114,9 @@ async def process_sign_in(plugin_instance, event: AstrMessageEvent):
     
     # 检查是否需要补签
     if user["last_sign"] == day_before_yesterday:
-        # 注册一个待处理的决策
-        if not hasattr(plugin_instance, 'pending_resign_decisions'):
-            plugin_instance.pending_resign_decisions = {}
-            
+        # 注册一个待处理的决策（超时后自动失效）
         decision_key = (group_id, user_id)
-        plugin_instance.pending_resign_decisions[decision_key] = {"prompted_at": datetime.now()}
+        plugin_instance.pending_resign_decisions.set(decision_key, {"prompted_at": datetime.now()})
 
         # 发送提示后直接结束
         yield event.plain_result(
@@ -1,7 +1,6 @@
 import os
 from datetime import datetime, timedelta
 from astrbot.api import logger
-from ._generate_card import generate_sign_card
 
 async def perform_re_sign(plugin_instance, event, group_id: str, user_id: str, user_name: str, avatar_url=None):
     """
@@ -71,8 +70,9 @@ async def perform_re_sign(plugin_instance, event, group_id: str, user_id: str, u
     
     # 生成补签卡片
     try:
-        card_url = await generate_sign_card(
-            star_instance=plugin_instance,
+        from ._generate_card import render_sign_card
+        card_url = await render_sign_card(
+            plugin_instance, group_id,
             user_id=user_id,
             user_name=user_name,
             avatar_url=avatar_url,
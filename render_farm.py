@@ -0,0 +1,141 @@
+# feifeisupermarket/render_farm.py
+
+"""
+AstrAstr超级市场 - 多进程渲染池（可选）
+
+Pillow 合成基本都持有GIL，单个机器人进程无法利用多余的CPU核心。
+启用后，Pillow 卡片生成函数会被转交到独立的工作进程执行：
+- 工作进程启动时只预加载一次字体、背景图与装饰图
+- 任务以可序列化的参数（生成函数原本接收的数据）提交
+- 头像等较大的输入由主进程下载后放入共享内存交给工作进程，避免重复下载与序列化
+- 工作进程把卡片写入与原先相同的输出目录，并返回图片路径
+
+HTML渲染（需要 Star 实例）无法跨进程，仍在主进程执行。
+"""
+
+import asyncio
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Tuple
+
+from astrbot.api import logger
+
+from . import drawing_utils as utils
+
+# 允许交给渲染池执行的模块（均为纯Pillow卡片生成模块）
+_FARM_MODULE_PREFIXES = ("_generate_", "_command_card")
+
+
+def _worker_init():
+    """工作进程初始化：预加载所有静态绘图资源"""
+    utils.preload_assets()
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """附加到主进程创建的共享内存（由主进程负责释放）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.13 以下没有 track 参数
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker_render(module_name: str, func_name: str, args: tuple, kwargs: dict,
+                   image_handles: Dict[str, Tuple[str, int]]) -> Any:
+    """
+    在工作进程中执行一次卡片生成。
+
+    Args:
+        module_name: 生成函数所在模块的完整名称
+        func_name: 生成函数名称
+        args, kwargs: 生成函数的参数
+        image_handles: {图片URL: (共享内存名称, 字节长度)}
+    """
+    from PIL import Image
+
+    images = {}
+    for url, (shm_name, size) in image_handles.items():
+        shm = _attach_shared_memory(shm_name)
+        try:
+            data = bytes(shm.buf[:size])
+        finally:
+            shm.close()
+        images[url] = Image.open(BytesIO(data)).convert("RGBA")
+
+    func = getattr(importlib.import_module(module_name), func_name)
+    utils.set_prefetched_images(images)
+    try:
+        return asyncio.run(func(*args, **kwargs))
+    finally:
+        utils.set_prefetched_images({})
+
+
+class RenderFarm:
+    """基于进程池的Pillow渲染后端"""
+
+    def __init__(self, workers: int):
+        """
+        Args:
+            workers: 工作进程数量
+        """
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_worker_init
+        )
+        self._package = __name__.rsplit(".", 1)[0]
+        self.stats = {"rendered": 0, "fallback": 0}
+
+    def can_run(self, func: Callable, kwargs: dict) -> bool:
+        """判断渲染函数能否交给渲染池执行"""
+        module_name = getattr(func, "__module__", "") or ""
+        if not module_name.startswith(self._package + "."):
+            return False
+        if not module_name.rsplit(".", 1)[-1].startswith(_FARM_MODULE_PREFIXES):
+            return False
+        # HTML渲染需要 Star 实例，只能留在主进程
+        return "star_instance" not in kwargs
+
+    async def _share_images(self, values: List[Any]) -> Tuple[Dict[str, Tuple[str, int]], List[shared_memory.SharedMemory]]:
+        """下载参数中的图片URL并放入共享内存"""
+        urls = {v for v in values if isinstance(v, str) and v.startswith("http")}
+        handles, segments = {}, []
+        downloads = await asyncio.gather(*(utils.download_image_bytes(url) for url in urls))
+        for url, data in zip(urls, downloads):
+            if not data:
+                continue
+            shm = shared_memory.SharedMemory(create=True, size=len(data))
+            shm.buf[:len(data)] = data
+            handles[url] = (shm.name, len(data))
+            segments.append(shm)
+        return handles, segments
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        在渲染池中执行卡片生成，渲染池不可用时回退到主进程执行。
+        """
+        handles, segments = await self._share_images(list(args) + list(kwargs.values()))
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self._executor, _worker_render,
+                func.__module__, func.__name__, args, kwargs, handles
+            )
+            self.stats["rendered"] += 1
+            return result
+        except Exception as e:
+            self.stats["fallback"] += 1
+            logger.error(f"渲染池执行 {func.__name__} 失败，回退到主进程渲染: {e}")
+            return await func(*args, **kwargs)
+        finally:
+            for shm in segments:
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self):
+        """关闭渲染池"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
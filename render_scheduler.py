@@ -0,0 +1,232 @@
+# feifeisupermarket/render_scheduler.py
+
+"""
+AstrAstr超级市场 - 图片渲染调度器
+
+所有卡片生成（Pillow / html_render）都通过此调度器提交，用于：
+- 限制同时进行的渲染数量，避免刷屏时堆积大量CPU密集任务
+- 按优先级调度（签到 > 交互卡片 > 排行榜/帮助等）
+- 同一优先级内按群轮转，防止单个群刷屏占满队列
+- 排队超时后直接返回None，由调用方回退到已有的纯文本回复
+  （submit_or_raise 改为抛出 RenderDegraded，供需要区分"降级"与"渲染失败"的调用方使用）
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional
+
+from astrbot.api import logger
+
+from .metrics import metrics
+
+# --- 渲染优先级（数值越小越优先） ---
+PRIORITY_HIGH = 0    # 签到、补签
+PRIORITY_NORMAL = 1  # 冒险报告、背包、关系、约会等交互卡片
+PRIORITY_LOW = 2     # 排行榜、成就墙、商店、命令帮助
+
+PRIORITY_NAMES = {
+    PRIORITY_HIGH: "high",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_LOW: "low",
+}
+
+
+class RenderDegraded(Exception):
+    """渲染任务未被执行（排队超时或队列已满），与渲染函数本身出错相区分"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason  # "timeout" / "queue_full"
+
+
+class _RenderJob:
+    """一个待执行的渲染任务"""
+
+    __slots__ = ("group_id", "priority", "func", "args", "kwargs",
+                 "enqueued_at", "started", "cancelled", "context")
+
+    def __init__(self, group_id: str, priority: int, func: Callable, args: tuple, kwargs: dict):
+        self.group_id = group_id
+        self.priority = priority
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.monotonic()
+        self.started: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.cancelled = False
+        # 提交时的上下文：任务可能由其他请求结束时调度启动，需在提交者的上下文中运行（如慢指令追踪）
+        self.context = contextvars.copy_context()
+
+
+class RenderScheduler:
+    """带并发上限、优先级与群公平排队的渲染调度器"""
+
+    def __init__(self, max_concurrency: int = 2, queue_timeout: float = 8.0, max_queue_size: int = 64,
+                 farm=None):
+        """
+        Args:
+            max_concurrency: 同时进行的渲染数量上限
+            queue_timeout: 排队等待的最长时间（秒），超时即回退到文本
+            max_queue_size: 排队任务总数上限，超过后新任务直接回退
+            farm: 可选的多进程渲染池（RenderFarm），Pillow卡片会交给它执行
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout = queue_timeout
+        self.max_queue_size = max_queue_size
+        self.farm = farm
+
+        # {优先级: OrderedDict{群ID: deque[_RenderJob]}}，OrderedDict 的顺序即轮转顺序
+        self._queues: Dict[int, "OrderedDict[str, deque]"] = {
+            priority: OrderedDict() for priority in sorted(PRIORITY_NAMES)
+        }
+        self._queued = 0
+        self._running = 0
+
+        # 统计数据
+        self._wait_samples = deque(maxlen=256)
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "degraded_timeout": 0,
+            "degraded_queue_full": 0,
+            "max_wait": 0.0,
+        }
+
+    async def submit(self, group_id: Optional[str], priority: int, func: Callable, *args, **kwargs) -> Optional[Any]:
+        """
+        提交一个渲染任务并等待结果。
+
+        Args:
+            group_id: 群聊ID，用于公平排队（私聊可为None）
+            priority: 优先级，取 PRIORITY_* 常量
+            func: 渲染协程函数，如 generate_leaderboard_image
+            *args, **kwargs: 传给渲染函数的参数
+
+        Returns:
+            渲染函数的返回值；排队超时、队列已满或渲染出错时返回None
+        """
+        try:
+            return await self.submit_or_raise(group_id, priority, func, *args, **kwargs)
+        except RenderDegraded:
+            return None
+
+    async def submit_or_raise(self, group_id: Optional[str], priority: int, func: Callable,
+                              *args, **kwargs) -> Optional[Any]:
+        """
+        同 submit，但排队超时或队列已满时抛出 RenderDegraded（渲染出错仍返回None）
+
+        Raises:
+            RenderDegraded: 任务未被执行
+        """
+        self.stats["submitted"] += 1
+        if priority not in self._queues:
+            priority = PRIORITY_NORMAL
+
+        if self._queued >= self.max_queue_size:
+            self.stats["degraded_queue_full"] += 1
+            logger.warning(f"渲染队列已满({self._queued})，{getattr(func, '__name__', func)} 回退到文本模式")
+            raise RenderDegraded("queue_full")
+
+        job = _RenderJob(str(group_id or "private_chat"), priority, func, args, kwargs)
+        self._enqueue(job)
+        self._dispatch()
+
+        try:
+            task = await asyncio.wait_for(asyncio.shield(job.started), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if job.started.done():
+                # 超时的同一轮循环中任务恰好已经启动：继续等待结果，不算降级
+                task = job.started.result()
+            else:
+                # 仍在排队：标记取消，出队时跳过（惰性删除，无需扫描队列）
+                self._cancel(job)
+                self.stats["degraded_timeout"] += 1
+                logger.warning(
+                    f"渲染排队超过{self.queue_timeout}秒，{getattr(func, '__name__', func)} 回退到文本模式"
+                )
+                raise RenderDegraded("timeout")
+        except asyncio.CancelledError:
+            self._cancel(job)
+            raise
+
+        try:
+            return await task
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"渲染任务 {getattr(func, '__name__', func)} 执行失败: {e}", exc_info=True)
+            return None
+
+    def _enqueue(self, job: _RenderJob):
+        """将任务放入对应优先级、对应群的队列"""
+        group_queues = self._queues[job.priority]
+        if job.group_id not in group_queues:
+            group_queues[job.group_id] = deque()
+        group_queues[job.group_id].append(job)
+        self._queued += 1
+
+    def _cancel(self, job: _RenderJob):
+        """取消一个尚未开始的任务"""
+        if not job.started.done() and not job.cancelled:
+            job.cancelled = True
+            self._queued -= 1
+
+    def _pop_next(self) -> Optional[_RenderJob]:
+        """按优先级取出下一个任务，同优先级内按群轮转"""
+        for group_queues in self._queues.values():
+            while group_queues:
+                group_id, jobs = next(iter(group_queues.items()))
+                job = jobs.popleft()
+                if jobs:
+                    group_queues.move_to_end(group_id)
+                else:
+                    del group_queues[group_id]
+                if not job.cancelled:
+                    return job
+        return None
+
+    def _dispatch(self):
+        """在有空闲槽位时启动排队中的任务"""
+        while self._running < self.max_concurrency:
+            job = self._pop_next()
+            if job is None:
+                return
+            self._queued -= 1
+            self._running += 1
+
+            wait = time.monotonic() - job.enqueued_at
+            self._wait_samples.append(wait)
+            metrics.observe("render_wait", PRIORITY_NAMES[job.priority], wait)
+            if wait > self.stats["max_wait"]:
+                self.stats["max_wait"] = wait
+
+            task = job.context.run(asyncio.ensure_future, self._run(job))
+            job.started.set_result(task)
+
+    async def _run(self, job: _RenderJob) -> Any:
+        """执行任务，结束后释放槽位并继续调度"""
+        try:
+            with metrics.timer("render", getattr(job.func, "__name__", str(job.func))):
+                if self.farm is not None and self.farm.can_run(job.func, job.kwargs):
+                    result = await self.farm.run(job.func, *job.args, **job.kwargs)
+                else:
+                    result = await job.func(*job.args, **job.kwargs)
+            self.stats["completed"] += 1
+            return result
+        finally:
+            self._running -= 1
+            self._dispatch()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取调度器的运行统计"""
+        waits = sorted(self._wait_samples)
+        p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+        return {
+            **self.stats,
+            "queued": self._queued,
+            "running": self._running,
+            "max_concurrency": self.max_concurrency,
+            "wait_p95": round(p95, 4),
+        }
@@ -0,0 +1,194 @@
+# feifeisupermarket/renderer_selector.py
+
+"""
+AstrAstr超级市场 - 渲染后端自适应选择
+
+同一张卡片往往有多个渲染后端（html_render 无头浏览器 / Pillow），
+此模块按滑动窗口统计每个后端的耗时与失败率：
+- 优先使用健康且更快的后端
+- 首选后端超过对冲时限仍未返回时，同时启动下一个后端，谁先成功用谁
+- 首选后端失败时立即改用下一个后端
+- 每隔一定次数让非首选后端先行一次，使其统计数据保持新鲜（例如浏览器恢复后能切回）
+- 渲染调度器降级（排队超时、队列已满）不是后端的问题，不计入失败率
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+from .render_scheduler import RenderDegraded
+
+
+class _BackendStats:
+    """单个渲染后端的滑动窗口统计"""
+
+    def __init__(self, window_size: int):
+        # (耗时, 是否成功)；被对冲取消或被调度器降级的尝试记为 None，仅计入耗时（为实际耗时的下界）
+        self.samples: deque = deque(maxlen=window_size)
+        self.attempts = 0
+        self.wins = 0
+
+    def record(self, latency: float, ok: Optional[bool]):
+        self.attempts += 1
+        self.samples.append((latency, ok))
+
+    def latency_percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        latencies = sorted(latency for latency, _ in self.samples)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * pct))]
+
+    def error_rate(self) -> float:
+        finished = [ok for _, ok in self.samples if ok is not None]
+        if not finished:
+            return 0.0
+        return finished.count(False) / len(finished)
+
+
+class RendererSelector:
+    """按观测到的耗时与失败率在多个渲染后端之间选择，并带对冲请求"""
+
+    def __init__(self, hedge_delay: float = 3.0, window_size: int = 50, min_samples: int = 5,
+                 max_error_rate: float = 0.5, probe_every: int = 20):
+        """
+        Args:
+            hedge_delay: 对冲时限上限（秒）；首选后端有足够样本时取其p95与此值中的较小者
+            window_size: 每个后端保留的样本数量
+            min_samples: 样本数达到此值后才参与按耗时排序与健康判断
+            max_error_rate: 失败率超过此值的后端视为不健康，排到最后
+            probe_every: 每隔多少次选择让非首选后端先行一次
+        """
+        self.hedge_delay = hedge_delay
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.probe_every = probe_every
+
+        self._backends: Dict[str, _BackendStats] = {}
+        self._decisions = 0
+        self.stats = {
+            "renders": 0,
+            "hedged": 0,
+            "fallbacks": 0,
+            "probes": 0,
+            "all_failed": 0,
+            "degraded": 0,
+            "primary": {},
+        }
+
+    def _get_backend(self, name: str) -> _BackendStats:
+        if name not in self._backends:
+            self._backends[name] = _BackendStats(self.window_size)
+        return self._backends[name]
+
+    def _is_healthy(self, backend: _BackendStats) -> bool:
+        return len(backend.samples) < self.min_samples or backend.error_rate() <= self.max_error_rate
+
+    def _rank(self, names: List[str]) -> List[str]:
+        """健康的后端在前，按p50耗时升序；样本不足时保持调用方给出的顺序"""
+        def sort_key(item):
+            index, name = item
+            backend = self._get_backend(name)
+            p50 = backend.latency_percentile(0.5) if len(backend.samples) >= self.min_samples else None
+            return (not self._is_healthy(backend), p50 if p50 is not None else 0.0, index)
+
+        ranked = [name for _, name in sorted(enumerate(names), key=sort_key)]
+
+        self._decisions += 1
+        if len(ranked) > 1 and self.probe_every > 0 and self._decisions % self.probe_every == 0:
+            ranked[0], ranked[1] = ranked[1], ranked[0]
+            self.stats["probes"] += 1
+        return ranked
+
+    def _hedge_timeout(self, name: str) -> float:
+        backend = self._get_backend(name)
+        if len(backend.samples) >= self.min_samples:
+            return min(self.hedge_delay, backend.latency_percentile(0.95))
+        return self.hedge_delay
+
+    async def _attempt(self, name: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """执行一次渲染尝试并记录耗时与结果"""
+        backend = self._get_backend(name)
+        start = time.monotonic()
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            backend.record(time.monotonic() - start, None)
+            raise
+        except RenderDegraded:
+            # 渲染调度器繁忙，后端本身并未出错
+            self.stats["degraded"] += 1
+            backend.record(time.monotonic() - start, None)
+            return None
+        except Exception as e:
+            logger.warning(f"渲染后端 {name} 执行出错: {e}")
+            result = None
+        backend.record(time.monotonic() - start, bool(result))
+        return result
+
+    async def render(self, candidates: List[Tuple[str, Callable[[], Awaitable[Any]]]]) -> Optional[Any]:
+        """
+        使用最合适的后端渲染。
+
+        Args:
+            candidates: [(后端名称, 无参协程工厂)]，按默认偏好排序；
+                        工厂返回空值（None/""）视为失败，抛出 RenderDegraded 视为降级
+
+        Returns:
+            最先成功的后端的结果，全部失败时返回None
+        """
+        self.stats["renders"] += 1
+        factories = dict(candidates)
+        remaining = self._rank([name for name, _ in candidates])
+        primary = remaining[0]
+        self.stats["primary"][primary] = self.stats["primary"].get(primary, 0) + 1
+
+        pending: Dict[asyncio.Task, str] = {}
+
+        def launch():
+            name = remaining.pop(0)
+            pending[asyncio.ensure_future(self._attempt(name, factories[name]))] = name
+
+        launch()
+        try:
+            while pending:
+                timeout = self._hedge_timeout(primary) if remaining else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 首选后端超过对冲时限，同时启动下一个后端
+                    self.stats["hedged"] += 1
+                    launch()
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    result = task.result()
+                    if result:
+                        self._get_backend(name).wins += 1
+                        return result
+                if remaining and not pending:
+                    self.stats["fallbacks"] += 1
+                    launch()
+            self.stats["all_failed"] += 1
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各后端的统计与选择情况"""
+        backends = {}
+        for name, backend in self._backends.items():
+            p50 = backend.latency_percentile(0.5)
+            p95 = backend.latency_percentile(0.95)
+            backends[name] = {
+                "attempts": backend.attempts,
+                "wins": backend.wins,
+                "p50": round(p50, 4) if p50 is not None else None,
+                "p95": round(p95, 4) if p95 is not None else None,
+                "error_rate": round(backend.error_rate(), 4),
+                "healthy": self._is_healthy(backend),
+            }
+        return {**self.stats, "backends": backends}
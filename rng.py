@@ -0,0 +1,175 @@
+# feifeisupermarket/rng.py
+
+"""
+AstrAstr超级市场 - 按子系统划分的随机数流
+
+每个玩法使用独立的命名随机流（打工、抽奖、冒险、约会、签到、物品），互不干扰：
+- 指定种子时，每个流的种子由总种子与流名称派生，运行结果可完全复现
+- 录制模式记录每个流消耗的原始随机数，可保存为压缩文件
+- 回放模式按录制顺序返回随机数，用于复现线上问题或在不同版本间对比同一份负载
+
+random.Random 的 randint / choice / uniform / sample 等方法全部基于 random() 与
+getrandbits() 两个原语，因此只需录制这两者即可逐位复现。
+"""
+
+import gzip
+import hashlib
+import json
+import random
+from typing import Dict, List, Optional, Union
+
+from astrbot.api import logger
+
+# 插件使用的随机流名称
+STREAM_WORK = "work"
+STREAM_LOTTERY = "lottery"
+STREAM_ADVENTURE = "adventure"
+STREAM_DATE = "date"
+STREAM_SIGN_IN = "sign_in"
+STREAM_ITEM = "item"
+STREAMS = (STREAM_WORK, STREAM_LOTTERY, STREAM_ADVENTURE, STREAM_DATE, STREAM_SIGN_IN, STREAM_ITEM)
+
+MODE_LIVE = "live"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+
+class RNGReplayError(RuntimeError):
+    """回放的随机数已用完，或调用顺序与录制时不一致"""
+
+
+def _derive_seed(seed: Union[int, str], name: str) -> int:
+    """由总种子与流名称派生出该流的种子（与流的创建顺序无关）"""
+    digest = hashlib.sha256(f"{seed}:{name}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+class RecordingRandom(random.Random):
+    """记录每一次 random() / getrandbits() 结果的随机流"""
+
+    def __init__(self, seed=None):
+        self.draws: List[Union[float, List[int]]] = []
+        super().__init__(seed)
+
+    def random(self) -> float:
+        value = super().random()
+        self.draws.append(value)
+        return value
+
+    def getrandbits(self, k: int) -> int:
+        value = super().getrandbits(k)
+        # 整数记为 [位数, 值]，与浮点数区分
+        self.draws.append([k, value])
+        return value
+
+
+class ReplayRandom(random.Random):
+    """按录制顺序返回随机数的随机流"""
+
+    def __init__(self, name: str, draws: List[Union[float, List[int]]]):
+        self.name = name
+        self._draws = draws
+        self._position = 0
+        super().__init__(0)
+
+    def _next(self):
+        if self._position >= len(self._draws):
+            raise RNGReplayError(f"随机流 {self.name} 的录制数据已用完（共 {len(self._draws)} 个）")
+        value = self._draws[self._position]
+        self._position += 1
+        return value
+
+    def random(self) -> float:
+        value = self._next()
+        if isinstance(value, list):
+            raise RNGReplayError(f"随机流 {self.name} 第 {self._position} 个随机数应为整数，但调用了 random()")
+        return value
+
+    def getrandbits(self, k: int) -> int:
+        value = self._next()
+        if not isinstance(value, list) or value[0] != k:
+            raise RNGReplayError(f"随机流 {self.name} 第 {self._position} 个随机数与 getrandbits({k}) 不匹配")
+        return value[1]
+
+    @property
+    def remaining(self) -> int:
+        return len(self._draws) - self._position
+
+
+class RNGService:
+    """
+    随机数服务：为每个子系统提供独立的命名随机流。
+
+    Args:
+        seed: 总种子，None 表示使用系统熵（线上默认）
+        record: 是否录制所有流的随机数
+    """
+
+    def __init__(self, seed: Optional[Union[int, str]] = None, record: bool = False):
+        self.seed = seed
+        self.mode = MODE_RECORD if record else MODE_LIVE
+        self._streams: Dict[str, random.Random] = {}
+        self._replay_data: Dict[str, list] = {}
+
+    @classmethod
+    def from_recording(cls, recording: Union[str, dict]) -> "RNGService":
+        """
+        由录制结果创建回放模式的服务。
+
+        Args:
+            recording: save_recording 保存的文件路径，或 get_recording 返回的字典
+        """
+        if isinstance(recording, str):
+            with gzip.open(recording, "rt", encoding="utf-8") as f:
+                recording = json.load(f)
+        service = cls(seed=recording.get("seed"))
+        service.mode = MODE_REPLAY
+        service._replay_data = recording.get("streams", {})
+        return service
+
+    def stream(self, name: str) -> random.Random:
+        """获取（必要时创建）指定名称的随机流"""
+        rng = self._streams.get(name)
+        if rng is None:
+            seed = None if self.seed is None else _derive_seed(self.seed, name)
+            if self.mode == MODE_REPLAY:
+                rng = ReplayRandom(name, self._replay_data.get(name, []))
+            elif self.mode == MODE_RECORD:
+                rng = RecordingRandom(seed)
+            else:
+                rng = random.Random(seed)
+            self._streams[name] = rng
+        return rng
+
+    def get_recording(self) -> dict:
+        """返回录制结果（仅录制模式）"""
+        return {
+            "seed": self.seed,
+            "streams": {
+                name: rng.draws for name, rng in self._streams.items() if isinstance(rng, RecordingRandom)
+            },
+        }
+
+    def save_recording(self, path: str) -> bool:
+        """将录制结果保存为 gzip 压缩的 JSON 文件"""
+        if self.mode != MODE_RECORD:
+            return False
+        try:
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                json.dump(self.get_recording(), f, separators=(",", ":"))
+            return True
+        except Exception as e:
+            logger.error(f"保存随机数录制文件失败: {e}")
+            return False
+
+    def get_stats(self) -> dict:
+        """每个随机流已消耗（录制模式）或剩余（回放模式）的随机数个数"""
+        stats = {"mode": self.mode, "seeded": self.seed is not None, "streams": {}}
+        for name, rng in self._streams.items():
+            if isinstance(rng, RecordingRandom):
+                stats["streams"][name] = {"recorded": len(rng.draws)}
+            elif isinstance(rng, ReplayRandom):
+                stats["streams"][name] = {"remaining": rng.remaining}
+            else:
+                stats["streams"][name] = {}
+        return stats
@@ -0,0 +1,72 @@
+# feifeisupermarket/sampling.py
+
+"""
+AstrAstr超级市场 - 加权随机抽样工具
+
+AliasSampler 使用 Vose 别名法：构建时 O(n)，之后每次抽样 O(1)。
+适用于概率表固定、抽样次数很多的场景（冒险事件、抽奖等级、随机物品等），
+概率表在加载时编译一次，之后不再重复归一化。
+"""
+
+import random
+from typing import Any, Generic, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+class AliasSampler(Generic[T]):
+    """按权重抽取元素的 O(1) 抽样器（权重无需归一化，权重为0的元素永远不会被抽中）"""
+
+    __slots__ = ("items", "weights", "_prob", "_alias", "_n")
+
+    def __init__(self, items: Sequence[T], weights: Sequence[float]):
+        if len(items) != len(weights) or not items:
+            raise ValueError("items 与 weights 必须非空且长度一致")
+        total = float(sum(weights))
+        if total <= 0 or any(w < 0 for w in weights):
+            raise ValueError("权重必须非负且总和大于0")
+
+        self.items: List[T] = list(items)
+        self.weights: List[float] = [w / total for w in weights]
+        n = self._n = len(self.items)
+        self._prob = [0.0] * n
+        self._alias = [0] * n
+
+        scaled = [p * n for p in self.weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # 剩余的槽位概率为1（浮点误差导致的残留也归入此类），权重为0的槽位指向任一有效元素
+        fallback = next(i for i, w in enumerate(self.weights) if w > 0)
+        for i in large + small:
+            if self.weights[i] > 0:
+                self._prob[i], self._alias[i] = 1.0, i
+            else:
+                self._prob[i], self._alias[i] = 0.0, fallback
+
+    def sample(self, rng: Any = random) -> T:
+        """
+        抽取一个元素。
+
+        Args:
+            rng: 提供 random() 方法的随机源，默认使用全局 random 模块
+        """
+        u = rng.random() * self._n
+        i = int(u)
+        if i >= self._n:
+            i = self._n - 1
+        # 复用同一个随机数的小数部分作为第二次判定，每次抽样只消耗一个随机数
+        return self.items[i] if u - i < self._prob[i] else self.items[self._alias[i]]
+
+    def sample_many(self, k: int, rng: Any = random) -> List[T]:
+        """连续抽取 k 个元素（有放回）"""
+        return [self.sample(rng) for _ in range(k)]
+
+    def probability(self, item: T) -> float:
+        """某个元素被抽中的概率"""
+        return sum(w for it, w in zip(self.items, self.weights) if it == item)
@@ -0,0 +1,157 @@
+# feifeisupermarket/session_store.py
+
+"""
+AstrAstr超级市场 - 带过期时间的会话存储
+
+用于打工会话、补签提示、约会邀请等"等待用户回复"的临时状态：
+- 每个条目有自己的过期时间，挂在哈希时间轮的槽位上；
+  插入、查询、删除均为 O(1)，过期处理只扫描时间经过的槽位
+- 不需要后台任务：每次读写时顺带推进时间轮，也可以手动调用 expire()
+- 条目数量有上限，超出时淘汰最早插入的条目
+- 条目过期或被淘汰时调用 on_expire(key, value, reason)，reason 为 "expired" 或 "evicted"
+"""
+
+import math
+import time
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+from astrbot.api import logger
+
+# 时间轮默认精度（秒）与槽位数量：512 个 1 秒的槽位覆盖约 8.5 分钟，
+# 更长的过期时间同样支持（在槽位上多转几圈，到期时按截止时间判断）
+DEFAULT_TICK_SECONDS = 1.0
+DEFAULT_WHEEL_SIZE = 512
+
+
+class SessionStore:
+    """
+    哈希时间轮会话存储
+
+    Args:
+        name: 名称（用于日志与统计）
+        ttl: 默认过期时间（秒）
+        max_entries: 最大条目数量
+        on_expire: 条目过期或被淘汰时的回调 (key, value, reason)，reason 为 "expired"（超时）或 "evicted"（超出数量上限被淘汰）
+        tick: 时间轮精度（秒）
+        wheel_size: 时间轮槽位数量
+        clock: 单调时钟，便于测试替换
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 1000,
+                 on_expire: Optional[Callable[[Hashable, Any, str], None]] = None,
+                 tick: float = DEFAULT_TICK_SECONDS, wheel_size: int = DEFAULT_WHEEL_SIZE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.on_expire = on_expire
+        self._tick = tick
+        self._clock = clock
+        # {key: (value, 截止时间, 槽位)}，dict 保持插入顺序，用于淘汰最早的条目
+        self._entries: Dict[Hashable, Tuple[Any, float, int]] = {}
+        self._slots: List[Set[Hashable]] = [set() for _ in range(wheel_size)]
+        self._current_tick = self._tick_of(clock())
+        self._stats = {"inserted": 0, "expired": 0, "evicted": 0}
+
+    def _tick_of(self, moment: float) -> int:
+        return int(moment // self._tick)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """写入条目（已存在则覆盖并重新计时）"""
+        now = self._clock()
+        self._advance(now)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= now:
+            # 已到期但所在槽位尚未扫描到：按过期处理，保证回调被调用
+            self._remove(key, "expired")
+        if key in self._entries:
+            self._unlink(key)
+        elif len(self._entries) >= self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest, "evicted")
+
+        deadline = now + (self.ttl if ttl is None else ttl)
+        # 向上取整到槽位，保证扫描到该槽位时条目一定已经到期
+        slot = math.ceil(deadline / self._tick) % len(self._slots)
+        self._entries[key] = (value, deadline, slot)
+        self._slots[slot].add(key)
+        self._stats["inserted"] += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取未过期的条目"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        now = self._clock()
+        if entry[1] <= now:
+            self._remove(key, "expired")
+            return default
+        self._advance(now)
+        return entry[0]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """取出并删除条目（已过期的条目视为不存在）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if entry[1] <= self._clock():
+            self._remove(key, "expired")
+            return default
+        self._unlink(key)
+        del self._entries[key]
+        return entry[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] > self._clock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        """遍历未过期的条目"""
+        now = self._clock()
+        return ((key, entry[0]) for key, entry in list(self._entries.items()) if entry[1] > now)
+
+    def expire(self) -> int:
+        """推进时间轮并处理到期条目，返回本次过期的条目数量"""
+        before = self._stats["expired"]
+        self._advance(self._clock())
+        return self._stats["expired"] - before
+
+    def clear(self):
+        """清空所有条目（不触发回调）"""
+        self._entries.clear()
+        for slot in self._slots:
+            slot.clear()
+
+    def get_stats(self) -> dict:
+        return {"name": self.name, "size": len(self._entries), "max_entries": self.max_entries, **self._stats}
+
+    def _advance(self, now: float):
+        """处理从上次推进到现在之间经过的槽位（最多转一圈）"""
+        target_tick = self._tick_of(now)
+        if target_tick <= self._current_tick:
+            return
+        elapsed = min(target_tick - self._current_tick, len(self._slots))
+        for offset in range(1, elapsed + 1):
+            slot = self._slots[(self._current_tick + offset) % len(self._slots)]
+            if not slot:
+                continue
+            for key in [k for k in slot if self._entries[k][1] <= now]:
+                self._remove(key, "expired")
+        self._current_tick = target_tick
+
+    def _unlink(self, key: Hashable):
+        self._slots[self._entries[key][2]].discard(key)
+
+    def _remove(self, key: Hashable, reason: str):
+        value = self._entries[key][0]
+        self._unlink(key)
+        del self._entries[key]
+        self._stats[reason] += 1
+        if self.on_expire:
+            try:
+                self.on_expire(key, value, reason)
+            except Exception as e:
+                logger.error(f"会话存储 {self.name} 的过期回调出错: {e}", exc_info=True)
@@ -166,3 +166,18 @@ SHOP_DATA = {
         }
     }
 }
+
+# 物品别名（指令中可以用别名代替物品名称或ID）
+ITEM_ALIASES = {
+    "饼干": "小饼干",
+    "肯德基": "KFC",
+    "汉堡": "华莱士",
+    "泡面": "方便面",
+    "饮料": "能量饮料",
+    "药水": "幸运药水",
+    "四叶草": "幸运四叶草",
+    "信标": "奇遇信标",
+    "鲜花": "花",
+    "戒指": "卡天亚戒指",
+    "烈酒": "一壶烈酒",
+}
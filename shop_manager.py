@@ -1,6 +1,5 @@
 # feifeisupermarket/shop_manager.py
 import os
-import yaml
 import random  
 from typing import Dict, Optional, Tuple, Any, List
 from datetime import datetime
@@ -8,33 +7,51 @@ from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent
 
 from .shop_items import SHOP_DATA
+from .inventory import Inventory, item_index, BAG_CAPACITY, MAX_ITEM_STACK
+from .storage import YamlStore
+from .buffs import buff_engine
+from .metrics import timed
+from .tracing import traced
+
+# 食物恢复的体力：固定值与随机范围（华莱士单独处理）
+FOOD_STAMINA = {"小饼干": 20, "章鱼烧": 30, "肉包": 40, "KFC": 100, "布丁": 160}
+RANDOM_FOOD_STAMINA = {"拼好饭": (1, 60), "方便面": (1, 20)}
 
 class ShopManager:
-    def __init__(self, data_dir: str):
-        """初始化商店管理器"""
+    def __init__(self, data_dir: str, rng=None):
+        """初始化商店管理器（rng: 使用物品时的随机流，缺省时使用全局 random）"""
         self.data_dir = data_dir
+        self.rng = rng or random
         self.shop_data_file = os.path.join(data_dir, "shop_data.yaml")
+        self.store = YamlStore(self.shop_data_file, "商店数据")
         self.shop_data = self._load_shop_data()
         self.items_definition = self._flatten_items_definition()
+        self.inventory = Inventory(self.shop_data)
         
     def _load_shop_data(self) -> dict:
         """加载商店数据"""
-        if os.path.exists(self.shop_data_file):
-            try:
-                with open(self.shop_data_file, 'r', encoding='utf-8') as f:
-                    return yaml.safe_load(f) or {}
-            except Exception as e:
-                logger.error(f"加载商店数据失败: {str(e)}")
-                return {}
-        return {}
+        try:
+            return self.store.load()
+        except Exception as e:
+            logger.error(f"加载商店数据失败: {str(e)}")
+            return {}
     
+    @timed("storage", "shop_data")
     def _save_shop_data(self):
-        """保存商店数据"""
+        """保存商店数据（合并了其他进程的修改时重建背包计数缓存）"""
         try:
-            with open(self.shop_data_file, 'w', encoding='utf-8') as f:
-                yaml.dump(self.shop_data, f, allow_unicode=True)
+            if self.store.save(self.shop_data):
+                self.inventory = Inventory(self.shop_data)
         except Exception as e:
             logger.error(f"保存商店数据失败: {str(e)}")
+
+    def refresh_from_disk(self):
+        """合并其他进程对商店数据的修改（合并后重建背包计数缓存），在指令修改数据之前调用"""
+        try:
+            if self.store.refresh(self.shop_data):
+                self.inventory = Inventory(self.shop_data)
+        except Exception as e:
+            logger.error(f"同步商店数据失败: {str(e)}")
             
     def _flatten_items_definition(self) -> Dict[str, Dict]:
         """将多层级的物品定义展平成单层，方便查询物品信息"""
@@ -51,36 +68,27 @@ class ShopManager:
         return self.shop_data.setdefault(str(group_id), {})
     
     def _get_user_shop_data(self, group_id: str, user_id: str) -> dict:
-            """
-            获取指定群聊中用户的商店数据，如果不存在则创建，并兼容旧数据
-            """
-            group_shop_data = self._get_group_shop_data(group_id)
-            
-            # 确保用户数据字典存在，如果不存在则创建
-            if user_id not in group_shop_data:
-                group_shop_data[user_id] = {}
-
-            # 获取用户数据引用
-            user_shop_data = group_shop_data[user_id]
-
-            # --- [BUG修复] ---
-            # 使用 setdefault 来确保关键字段存在，这能同时处理新用户和旧数据迁移
-            user_shop_data.setdefault("inventory", {})
-            user_shop_data.setdefault("purchase_history", [])
-            user_shop_data.setdefault("use_history", [])
-            
-            # 确保背包中的每个分类都存在
-            user_inventory = user_shop_data["inventory"]
-            for category in SHOP_DATA.keys():
-                user_inventory.setdefault(category, {})
-                
-            return user_shop_data
+        """
+        获取指定群聊中用户的商店数据，如果不存在则创建，并兼容旧数据
+        （字段补全每个用户只做一次，见 Inventory.user_data）
+        """
+        return self.inventory.user_data(group_id, user_id)
     
     def get_user_bag(self, group_id: str, user_id: str) -> Dict[str, Dict[str, int]]:
         """获取用户背包内容"""
-        user_shop_data = self._get_user_shop_data(group_id, user_id)
-        return user_shop_data["inventory"]
+        return self.inventory.bag(group_id, user_id)
+
+    def find_item(self, name: str, categories: Optional[List[str]] = None) -> Tuple[Optional[str], List[str]]:
+        """
+        按ID、名称或别名查找物品（支持唯一前缀），找不到时返回候选物品。
+
+        Returns:
+            (物品ID或None, 候选物品名称列表)
+        """
+        item_id, candidates = item_index.lookup(name, categories)
+        return item_id, [self.items_definition[candidate]["name"] for candidate in candidates]
     
+    @traced()
     async def buy_item(self, event: AstrMessageEvent, user_data: dict, 
                     category: str, item_id: str, quantity: int = 1) -> Tuple[bool, str]:
         """
@@ -91,14 +99,13 @@ class ShopManager:
             return False, f"商品不存在，请确认类别和物品ID"
         
          # 2. [修改] 容量检查 - 背包总容量100，单个物品10个
-        user_bag = self.get_user_bag(event.get_group_id(), event.get_sender_id())
-        current_item_count = user_bag[category].get(item_id, 0)
-        if current_item_count + quantity > 10:
-            return False, f"购买失败！【{SHOP_DATA[category][item_id]['name']}】最多只能拥有10个。"
+        group_id = event.get_group_id()
+        user_id = event.get_sender_id()
+        if self.inventory.count(group_id, user_id, item_id) + quantity > MAX_ITEM_STACK:
+            return False, f"购买失败！【{SHOP_DATA[category][item_id]['name']}】最多只能拥有{MAX_ITEM_STACK}个。"
 
-        total_items_in_bag = sum(sum(c.values()) for c in user_bag.values())
-        if total_items_in_bag + quantity > 100:
-            return False, "购买失败！背包满了，最多只能存放100件物品。"
+        if self.inventory.total(group_id, user_id) + quantity > BAG_CAPACITY:
+            return False, f"购买失败！背包满了，最多只能存放{BAG_CAPACITY}件物品。"
         
         # 3. 获取物品信息和价格
         item_info = SHOP_DATA[category][item_id]
@@ -112,16 +119,8 @@ class ShopManager:
         user_data["points"] -= total_price
         
         # 6. 更新用户背包
-        group_id = event.get_group_id()
-        user_id = event.get_sender_id()
         user_shop_data = self._get_user_shop_data(group_id, user_id)
-        
-        # 确保物品分类存在
-        if category not in user_shop_data["inventory"]:
-            user_shop_data["inventory"][category] = {}
-        
-        # 增加物品数量
-        user_shop_data["inventory"][category][item_id] = user_shop_data["inventory"][category].get(item_id, 0) + quantity
+        self.inventory.add(group_id, user_id, item_id, quantity)
         
         # 7. 记录购买历史
         purchase_record = {
@@ -150,117 +149,108 @@ class ShopManager:
         Returns:
             (成功与否, 提示消息)
         """
+        success, message, _ = await self.use_items(event, user_data, item_id, 1)
+        return success, message
+
+    @traced()
+    async def use_items(self, event: AstrMessageEvent, user_data: dict, item_id: str,
+                        quantity: int, save: bool = True) -> Tuple[bool, str, int]:
+        """
+        一次性使用多个同种物品：合并计算效果，只记录一条使用历史、只保存一次。
+        背包中数量不足时使用全部剩余的物品。
+        save 为 False 时不保存，由调用方在批量操作结束后统一保存。
+
+        Returns:
+            (成功与否, 提示消息, 实际使用数量)
+        """
         # 1. 检查物品是否存在
         if item_id not in self.items_definition:
-            return False, "物品不存在，请确认物品ID"
+            return False, "物品不存在，请确认物品ID", 0
         
         item_info = self.items_definition[item_id]
         category = item_info["category"]
-                # 新增: 礼物类物品不能直接使用
         
+        # 礼物类物品不能直接使用
         if category == "礼物":
-            return False, f"【{item_info['name']}】是礼物，请使用 '赠礼 {item_info['name']} @目标用户' 来赠送给他人哦~"
+            return False, f"【{item_info['name']}】是礼物，请使用 '赠礼 {item_info['name']} @目标用户' 来赠送给他人哦~", 0
         
         # 2. 检查用户是否拥有该物品
         group_id = event.get_group_id()
         user_id = event.get_sender_id()
         user_shop_data = self._get_user_shop_data(group_id, user_id)
         
-        if (category not in user_shop_data["inventory"] or 
-            item_id not in user_shop_data["inventory"][category] or
-            user_shop_data["inventory"][category][item_id] <= 0):
-            return False, f"你的背包中没有 {item_info['name']}"
+        quantity = min(quantity, self.inventory.count(group_id, user_id, item_id))
+        if quantity <= 0:
+            return False, f"你的背包中没有 {item_info['name']}", 0
         
-        # 3. 应用物品效果
+        # 3. 应用物品效果（合并计算）
         effect_msg = "已使用"
-        
-        # 处理不同类别物品的效果
         if category == "道具":
             effect_buff = item_info.get("effect_buff")
             if effect_buff:
-                if "buffs" not in user_data:
-                    user_data["buffs"] = {}
-                user_data["buffs"][effect_buff] = user_data["buffs"].get(effect_buff, 0) + 1
-                effect_msg = f"生效了！下次{self._get_buff_description(effect_buff)}"
-        
-        # --- [重构] 统一处理食物类物品的体力变化和消息返回 ---
+                buff_engine.grant(user_data.setdefault("buffs", {}), effect_buff, quantity)
+                buff_desc = self._get_buff_description(effect_buff)
+                effect_msg = f"生效了！下次{buff_desc}" if quantity == 1 else f"生效了！【{buff_desc}】次数 +{quantity}"
         elif category == "食物":
-            # 确保user_data中有stamina和max_stamina字段
-            if "stamina" not in user_data:
-                user_data["stamina"] = 100
-            if "max_stamina" not in user_data:
-                user_data["max_stamina"] = 100
-            
-            old_stamina = user_data["stamina"]
-            max_stamina = user_data["max_stamina"]
-            
-            # 计算体力变化量
-            stamina_change = 0
-            is_wallace = False # 标记是否为华莱士
-
-            if item_id == "小饼干":
-                stamina_change = 20
-            elif item_id == "章鱼烧":
-                stamina_change = 30
-            elif item_id == "肉包":
-                stamina_change = 40
-            elif item_id == "KFC":
-                stamina_change = 100
-            elif item_id == "布丁":
-                stamina_change = 160
-            elif item_id == "拼好饭":
-                stamina_change = random.randint(1, 60)
-            elif item_id == "方便面":
-                stamina_change = random.randint(1, 20)
-            elif item_id == "华莱士":
-                is_wallace = True
-                if random.random() < 0.5:  # 50%概率
-                    new_stamina = 0
-                else:
-                    new_stamina = old_stamina + 50
-                stamina_change = new_stamina - old_stamina # 直接计算变化量
-            else:
-                # 未知食物或默认效果
-                stamina_change = 10
-
-            # 统一应用体力变化
-            if not is_wallace:
-                # 对普通食物，应用变化并确保不超过上限
-                user_data["stamina"] = min(old_stamina + stamina_change, max_stamina)
-            else:
-                # 对华莱士，直接设置体力值（同样要检查上限）
-                user_data["stamina"] = min(new_stamina, max_stamina)
-            # 计算实际的体力变化值
-            actual_change = user_data["stamina"] - old_stamina
-            
-            # 根据实际变化值构造统一的消息
-            if actual_change > 0:
-                change_desc = f"增加了 {actual_change}"
-            elif actual_change < 0:
-                change_desc = f"减少了 {abs(actual_change)}"
-            else:
-                change_desc = "没有变化"
-            
-            effect_msg = f"食用后，你的体力{change_desc}点！当前体力：{user_data['stamina']}/{max_stamina}"
+            effect_msg = self._apply_food(user_data, item_id, quantity)
 
         # 4. 减少物品数量
-        user_shop_data["inventory"][category][item_id] -= 1
+        self.inventory.remove(group_id, user_id, item_id, quantity)
         
-        # 5. 记录使用历史
+        # 5. 记录使用历史（多个物品合并为一条）
         use_record = {
             "item_id": item_id,
             "category": category,
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
+        if quantity > 1:
+            use_record["quantity"] = quantity
         user_shop_data["use_history"].append(use_record)
         
         # 6. 保存数据
-        self._save_shop_data()
+        if save:
+            self._save_shop_data()
         
-        return True, f"✅ {item_info['name']} 使用成功！\n{effect_msg}"
+        if quantity == 1:
+            return True, f"✅ {item_info['name']} 使用成功！\n{effect_msg}", 1
+        return True, f"✅ {item_info['name']} ×{quantity} 使用成功！\n{effect_msg}", quantity
+
+    def _apply_food(self, user_data: dict, item_id: str, quantity: int) -> str:
+        """计算食用若干份食物后的体力（上限只截断一次），返回效果描述"""
+        # 确保user_data中有stamina和max_stamina字段
+        user_data.setdefault("stamina", 100)
+        user_data.setdefault("max_stamina", 100)
+        old_stamina = user_data["stamina"]
+        max_stamina = user_data["max_stamina"]
+
+        if item_id == "华莱士":
+            # 每份独立判定：50%概率体力清零，否则+50，只能逐份计算
+            stamina = old_stamina
+            for _ in range(quantity):
+                stamina = 0 if self.rng.random() < 0.5 else min(stamina + 50, max_stamina)
+        else:
+            if item_id in RANDOM_FOOD_STAMINA:
+                low, high = RANDOM_FOOD_STAMINA[item_id]
+                stamina_change = sum(self.rng.randint(low, high) for _ in range(quantity))
+            else:
+                # 未知食物默认恢复10点
+                stamina_change = FOOD_STAMINA.get(item_id, 10) * quantity
+            # 体力只增不减，累加后截断一次与逐份截断的结果相同
+            stamina = min(old_stamina + stamina_change, max_stamina)
+        user_data["stamina"] = stamina
 
+        # 根据实际变化值构造统一的消息
+        actual_change = stamina - old_stamina
+        if actual_change > 0:
+            change_desc = f"增加了 {actual_change}"
+        elif actual_change < 0:
+            change_desc = f"减少了 {abs(actual_change)}"
+        else:
+            change_desc = "没有变化"
+        return f"食用后，你的体力{change_desc}点！当前体力：{stamina}/{max_stamina}"
 
     # 新增方法: 用于社交系统消耗物品
+    @traced()
     async def consume_item(self, group_id: str, user_id: str, item_id: str, quantity: int = 1) -> Tuple[bool, str]:
         """
         从用户背包中消耗指定物品（专用于社交系统等外部调用）
@@ -283,15 +273,11 @@ class ShopManager:
         
         # 2. 检查用户是否拥有足够物品
         user_shop_data = self._get_user_shop_data(group_id, user_id)
-        
-        if (category not in user_shop_data["inventory"] or 
-            item_id not in user_shop_data["inventory"][category] or
-            user_shop_data["inventory"][category][item_id] < quantity):
+
+        # 3. 减少物品数量（数量不足时不做修改）
+        if not self.inventory.remove(group_id, user_id, item_id, quantity):
             return False, f"背包中没有足够的 {item_info['name']}"
         
-        # 3. 减少物品数量
-        user_shop_data["inventory"][category][item_id] -= quantity
-        
         # 4. 记录使用历史
         use_record = {
             "item_id": item_id,
@@ -310,17 +296,7 @@ class ShopManager:
 
     def _get_buff_description(self, buff_name: str) -> str:
         """根据buff名称返回用户友好的描述"""
-        descriptions = {
-            "work_guarantee_success": "打工必定成功",
-            "work_no_penalty": "打工失败不扣币",
-            "work_reward_boost": "打工奖励提升",
-            "lottery_min_3star": "抽奖至少3星",
-            "lottery_double_reward": "抽奖奖励翻倍",
-            "lottery_best_of_two": "抽奖取最佳结果",
-            "adventure_negate_crisis": "冒险危机保护",
-            "adventure_rare_boost": "稀有奇遇提升"
-        }
-        return descriptions.get(buff_name, buff_name)
+        return buff_engine.describe(buff_name)
 
     def check_and_consume_buff(self, user_data: dict, buff_name: str) -> bool:
         """
@@ -333,15 +309,7 @@ class ShopManager:
         Returns:
             是否有此buff
         """
-        if "buffs" not in user_data:
-            return False
-            
-        buffs = user_data["buffs"]
-        if buffs.get(buff_name, 0) > 0:
-            buffs[buff_name] -= 1
-            return True
-                
-        return False
+        return buff_engine.consume(user_data.get("buffs", {}), buff_name)
 
     def get_user_status(self, user_data: dict) -> str:
         """
@@ -355,11 +323,9 @@ class ShopManager:
         """
         status_text = f"{user_data.get('name', '用户')} 当前激活的效果："
         
-        if "buffs" in user_data and user_data["buffs"]:
-            for buff_name, count in user_data["buffs"].items():
-                if count > 0:
-                    buff_desc = self._get_buff_description(buff_name)
-                    status_text += f"\n【{buff_desc}】× {count}"
+        active_buffs = buff_engine.describe_active(user_data.get("buffs", {}))
+        if active_buffs:
+            status_text += "\n" + "\n".join(active_buffs)
         else:
             status_text += "\n无活跃效果"
             
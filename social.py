@@ -1,59 +1,123 @@
 # feifeisupermarket/social.py
 
 import os
-import yaml
 import random
-from datetime import datetime, timedelta 
+from collections import deque
+from datetime import datetime
 from typing import Dict, List, Tuple, Any, Optional
 
 from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent
 
 from .social_events import DATE_EVENTS, RELATION_LEVELS, SPECIAL_RELATION_TYPES, RELATION_TYPE_NAMES
+from .session_store import SessionStore
+from .favorability import FavorabilityStore
+from .storage import YamlStore
+from .social_graph import SocialGraph, GroupSocialStats, DEFAULT_MUTUAL_THRESHOLD
+from .metrics import timed
+
+DATE_INVITATION_TIMEOUT_SECONDS = 60  # 约会邀请的有效时间
+MAX_DATE_INVITATIONS = 1000  # 同时存在的约会邀请上限
+MAX_PENDING_INVITATIONS_PER_GROUP = 20  # 单个群同时等待回应的约会邀请上限
+NOTIFY_INVITATION_TIMEOUT = True  # 邀请超时后是否提醒发起者
 
 class SocialManager:
     """社会生活系统管理器"""
     
-    def __init__(self, data_dir: str):
-        """初始化社会生活管理器"""
+    def __init__(self, data_dir: str, rng=None):
+        """初始化社会生活管理器（rng: 约会使用的随机流，缺省时使用全局 random）"""
         self.data_dir = data_dir
+        self.rng = rng or random
         self.social_data_file = os.path.join(data_dir, "social_data.yaml")
+        self.store = YamlStore(self.social_data_file, "社交数据")
         self.social_data = self._load_data()
-        self.active_invitations: Dict[str, Dict[str, Dict]] = {}
+        self._build_indexes()
+        # 约会邀请 {(群号, 目标ID): {"initiator_id", "created_at"}}，超时自动失效
+        self.active_invitations = SessionStore(
+            "date_invitations", DATE_INVITATION_TIMEOUT_SECONDS, MAX_DATE_INVITATIONS,
+            on_expire=self._on_invitation_expired
+        )
+        # 发起者索引 {(群号, 发起者ID): 目标ID}，用于 O(1) 检查发起者是否已有邀请
+        self._invitations_by_initiator: Dict[Tuple[str, str], str] = {}
+        # 各群等待回应的邀请数量 {群号: 数量}
+        self._pending_per_group: Dict[str, int] = {}
+        # 等待发送的超时提醒（由后台任务取出发送）
+        self._timeout_notices = deque(maxlen=MAX_DATE_INVITATIONS)
         
     def _load_data(self) -> dict:
         """加载社交数据"""
-        if os.path.exists(self.social_data_file):
-            try:
-                with open(self.social_data_file, 'r', encoding='utf-8') as f:
-                    return yaml.safe_load(f) or {}
-            except Exception as e:
-                logger.error(f"加载社交数据失败: {str(e)}")
-                return {}
-        return {}
+        try:
+            return self.store.load()
+        except Exception as e:
+            logger.error(f"加载社交数据失败: {str(e)}")
+            return {}
+
+    def _build_indexes(self):
+        """由 social_data 建立派生索引"""
+        # 好感度索引（双向记录、等级计数，直接引用 social_data 中的字典）
+        self.favorability = FavorabilityStore.from_social_data(self.social_data)
+        # 群社交统计（按群缓存，好感度变化后重新计算）
+        self.social_graph = SocialGraph(self.favorability)
     
-    def cleanup_expired_invitations(self):
-        """清理所有过期的约会邀请"""
-        now = datetime.now()
-        for group_id in list(self.active_invitations.keys()):
-            for target_id in list(self.active_invitations[group_id].keys()):
-                invitation = self.active_invitations[group_id][target_id]
-                if now - invitation['created_at'] > timedelta(seconds=60):
-                    self.remove_invitation(group_id, target_id) 
+    def cleanup_expired_invitations(self) -> int:
+        """清理过期的约会邀请（只处理已经到期的时间轮槽位），返回过期数量"""
+        if not len(self.active_invitations):
+            return 0
+        return self.active_invitations.expire()
+
+    def _forget_invitation(self, key: Tuple[str, str], invitation: dict):
+        """邀请结束时同步清理发起者索引与群计数"""
+        initiator_key = (key[0], invitation["initiator_id"])
+        if self._invitations_by_initiator.get(initiator_key) == key[1]:
+            del self._invitations_by_initiator[initiator_key]
+        remaining = self._pending_per_group.get(key[0], 0) - 1
+        if remaining > 0:
+            self._pending_per_group[key[0]] = remaining
+        else:
+            self._pending_per_group.pop(key[0], None)
 
+    def _on_invitation_expired(self, key: Tuple[str, str], invitation: dict, reason: str):
+        """邀请过期或被淘汰：清理索引；只有真正超时（而非因数量上限被淘汰）时记录给发起者的超时提醒"""
+        self._forget_invitation(key, invitation)
+        if reason == "expired" and NOTIFY_INVITATION_TIMEOUT and invitation.get("origin"):
+            self._timeout_notices.append({
+                "origin": invitation["origin"],
+                "initiator_id": invitation["initiator_id"],
+                "target_id": key[1],
+                "target_name": invitation.get("target_name") or f"用户{key[1]}",
+            })
+
+    def pop_timeout_notices(self) -> List[dict]:
+        """取出所有待发送的超时提醒 [{"origin", "initiator_id", "target_id", "target_name"}]"""
+        notices = list(self._timeout_notices)
+        self._timeout_notices.clear()
+        return notices
+
+    @timed("storage", "social_data")
     def _save_data(self):
-        """保存社交数据"""
+        """保存社交数据（合并了其他进程的修改时重建好感度索引）"""
         try:
-            with open(self.social_data_file, 'w', encoding='utf-8') as f:
-                yaml.dump(self.social_data, f, allow_unicode=True)
+            if self.store.save(self.social_data):
+                self._build_indexes()
         except Exception as e:
             logger.error(f"保存社交数据失败: {str(e)}")
+
+    def refresh_from_disk(self):
+        """合并其他进程对社交数据的修改（合并后重建好感度索引），在指令修改数据之前调用"""
+        try:
+            if self.store.refresh(self.social_data):
+                self._build_indexes()
+        except Exception as e:
+            logger.error(f"同步社交数据失败: {str(e)}")
     
+    @staticmethod
+    def _group_key(group_id: str) -> str:
+        """群组在社交数据中的键（私聊统一为 private_chat）"""
+        return str(group_id) if group_id else "private_chat"
+
     def _get_group_social_data(self, group_id: str) -> dict:
         """获取群组的社交数据，不存在则创建"""
-        if not group_id:
-            return self.social_data.setdefault("private_chat", {})
-        return self.social_data.setdefault(str(group_id), {})
+        return self.social_data.setdefault(self._group_key(group_id), {})
     
     def _get_user_social_data(self, group_id: str, user_id: str) -> dict:
         """获取用户的社交数据，不存在则创建"""
@@ -82,7 +146,8 @@ class SocialManager:
             user_data["daily_date_count"] = 0
         if "last_date_date" not in user_data:
             user_data["last_date_date"] = ""
-            
+
+        self.favorability.bind(self._group_key(group_id), user_id, user_data["favorability"])
         return user_data
     
     def _get_relation_level(self, favorability: int) -> str:
@@ -102,8 +167,11 @@ class SocialManager:
     
     def get_favorability(self, group_id: str, user_a_id: str, user_b_id: str) -> int:
         """获取用户A对用户B的好感度"""
-        user_a_data = self._get_user_social_data(group_id, user_a_id)
-        return user_a_data["favorability"].get(user_b_id, 0)
+        return self.favorability.get(self._group_key(group_id), user_a_id, user_b_id)
+
+    def get_mutual_favorability(self, group_id: str, user_a_id: str, user_b_id: str) -> Tuple[int, int]:
+        """获取 (A对B, B对A) 的好感度"""
+        return self.favorability.get_pair(self._group_key(group_id), user_a_id, user_b_id)
     
     def _update_favorability(self, group_id: str, user_a_id: str, user_b_id: str, change: int) -> int:
         """
@@ -118,20 +186,13 @@ class SocialManager:
         Returns:
             更新后的好感度值
         """
-        user_a_data = self._get_user_social_data(group_id, user_a_id)
-        
-        # 初始化好感度字典
-        if "favorability" not in user_a_data:
-            user_a_data["favorability"] = {}
-        
-        # 获取当前好感度
-        current = user_a_data["favorability"].get(user_b_id, 0)
-        
+        # 确保用户A的数据存在（同时登记到好感度索引）
+        self._get_user_social_data(group_id, user_a_id)
+        group_key = self._group_key(group_id)
+
         # 确保好感度不会为负
-        new_value = max(0, current + change)
-        user_a_data["favorability"][user_b_id] = new_value
-        
-        return new_value
+        new_value = max(0, self.favorability.get(group_key, user_a_id, user_b_id) + change)
+        return self.favorability.set(group_key, user_a_id, user_b_id, new_value)
 
     
     async def process_gift(self, event, group_id: str, sender_id: str, 
@@ -173,62 +234,64 @@ class SocialManager:
         
         return True, f"赠送成功！对方好感度 +{favorability_gain} ({old_value} → {new_value})，当前关系：【{new_level}】"
 
-    def create_invitation(self, group_id: str, initiator_id: str, target_id: str) -> Tuple[bool, str]:
-        """创建一个约会邀请，取代 start_date_session"""
+    def create_invitation(self, group_id: str, initiator_id: str, target_id: str,
+                          origin: Optional[str] = None, target_name: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        创建一个约会邀请，取代 start_date_session
+
+        Args:
+            origin: 发起邀请的会话（unified_msg_origin），用于发送超时提醒
+            target_name: 被邀请者名称，用于超时提醒
+        """
         group_id_str = str(group_id)
-        if group_id_str not in self.active_invitations:
-            self.active_invitations[group_id_str] = {}
+        initiator_id_str = str(initiator_id)
+        target_id_str = str(target_id)
+
+        # 先处理已到期的邀请，保证群内计数准确
+        self.cleanup_expired_invitations()
 
         # 检查发起者或目标是否已在进行中的邀请中
-        for inv_target_id, inv_data in self.active_invitations[group_id_str].items():
-            if inv_data['initiator_id'] == initiator_id:
+        initiator_key = (group_id_str, initiator_id_str)
+        if initiator_key in self._invitations_by_initiator:
+            if self.get_invitation(group_id_str, self._invitations_by_initiator[initiator_key]):
                 return False, "你已经发出了一个约会邀请，请等待其结束。"
-            if inv_target_id == target_id:
-                return False, "对方正在被其他人邀请，请稍后再试。"
+        if (group_id_str, target_id_str) in self.active_invitations:
+            return False, "对方正在被其他人邀请，请稍后再试。"
+        if self._pending_per_group.get(group_id_str, 0) >= MAX_PENDING_INVITATIONS_PER_GROUP:
+            return False, "本群等待回应的约会邀请太多了，请稍后再试。"
 
         # 注册一个新的邀请
-        self.active_invitations[group_id_str][str(target_id)] = {
-            "initiator_id": str(initiator_id),
-            "created_at": datetime.now()
-        }
+        self.active_invitations.set((group_id_str, target_id_str), {
+            "initiator_id": initiator_id_str,
+            "created_at": datetime.now(),
+            "origin": origin,
+            "target_name": target_name
+        })
+        self._invitations_by_initiator[initiator_key] = target_id_str
+        self._pending_per_group[group_id_str] = self._pending_per_group.get(group_id_str, 0) + 1
         return True, "邀请已创建"
 
     def get_invitation(self, group_id: str, target_id: str) -> Optional[dict]:
         """获取一个待处理的约会邀请"""
-        group_id_str = str(group_id)
-        target_id_str = str(target_id)
-        
-        invitation = self.active_invitations.get(group_id_str, {}).get(target_id_str)
-        
-        if not invitation:
-            return None
-            
-        # 检查邀请是否超时（60秒）
-        if datetime.now() - invitation['created_at'] > timedelta(seconds=60):
-            # 如果超时，清理掉
-            self.remove_invitation(group_id, target_id)
-            return None
-            
-        return invitation
+        # 超时的邀请在读取时自动清理
+        return self.active_invitations.get((str(group_id), str(target_id)))
 
-    def remove_invitation(self, group_id: str, target_id: str):
-        """结束/移除一个约会邀请"""
-        group_id_str = str(group_id)
-        target_id_str = str(target_id)
-        
-        if group_id_str in self.active_invitations and target_id_str in self.active_invitations[group_id_str]:
-            del self.active_invitations[group_id_str][target_id_str]
+    def take_invitation(self, group_id: str, target_id: str) -> Optional[dict]:
+        """
+        取出并结束一个待处理的约会邀请（已过期或不存在时返回None）。
+        回复时先取出再处理，处理期间邀请不会再过期，重复的回复也不会再次处理
+        """
+        key = (str(group_id), str(target_id))
+        invitation = self.active_invitations.pop(key)
+        if invitation:
+            self._forget_invitation(key, invitation)
+        return invitation
     
     def check_social_master_achievement(self, group_id: str, user_id: str) -> bool:
         """检查是否满足'社交达人'成就条件：与5名不同用户的好感度在50以上"""
         try:
-            user_data = self._get_user_social_data(group_id, user_id)
-            favorability_data = user_data.get("favorability", {})
-            
-            # 计算好感度大于等于50的用户数量
-            high_favorability_count = sum(1 for fav in favorability_data.values() if fav >= 50)
-            
-            return high_favorability_count >= 5
+            # 好感度大于等于50的用户数量由索引维护
+            return self.favorability.count_at_least(self._group_key(group_id), user_id, 50) >= 5
         except Exception as e:
             logger.error(f"检查社交达人成就时出错: {e}", exc_info=True)
             return False
@@ -292,12 +355,11 @@ class SocialManager:
             包含约会结果的字典
         """
         # 记录开始时的好感度
-        a_to_b_before = self.get_favorability(group_id, user_a_id, user_b_id)
-        b_to_a_before = self.get_favorability(group_id, user_b_id, user_a_id)
+        a_to_b_before, b_to_a_before = self.get_mutual_favorability(group_id, user_a_id, user_b_id)
         
         # 随机选择3-5个事件
-        event_count = random.randint(3, 5)
-        selected_events = random.sample(DATE_EVENTS, min(event_count, len(DATE_EVENTS)))
+        event_count = self.rng.randint(3, 5)
+        selected_events = self.rng.sample(DATE_EVENTS, min(event_count, len(DATE_EVENTS)))
         
         # 累计好感度变化
         a_to_b_change = 0
@@ -308,8 +370,8 @@ class SocialManager:
         for event in selected_events:
             # 从范围中随机选择好感度变化值
             change_min, change_max = event["favorability_change"]
-            change_a = random.randint(change_min, change_max)
-            change_b = random.randint(change_min, change_max)
+            change_a = self.rng.randint(change_min, change_max)
+            change_b = self.rng.randint(change_min, change_max)
             
             # 累加变化值
             a_to_b_change += change_a
@@ -527,8 +589,7 @@ class SocialManager:
             关系数据字典
         """
         # 获取相互好感度
-        a_to_b = self.get_favorability(group_id, user_id, target_id)
-        b_to_a = self.get_favorability(group_id, target_id, user_id)
+        a_to_b, b_to_a = self.get_mutual_favorability(group_id, user_id, target_id)
         
         # 获取关系等级
         a_to_b_level = self._get_relation_level(a_to_b)
@@ -558,14 +619,9 @@ class SocialManager:
             关系列表
         """
         user_data = self._get_user_social_data(group_id, user_id)
-        favorability_data = user_data["favorability"]
-        
-        # 按好感度排序
-        sorted_relations = sorted(
-            favorability_data.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )
+
+        # 取好感度最高的前 limit 个（过滤掉好感度为0的关系）
+        top_relations = self.favorability.top(self._group_key(group_id), user_id, limit)
         
         # 获取特殊关系
         special_relations = {}
@@ -575,11 +631,7 @@ class SocialManager:
         
         # 构建结果
         result = []
-        for target_id, favorability in sorted_relations[:limit]:
-            # 过滤掉好感度为0的关系
-            if favorability <= 0:
-                continue
-                
+        for target_id, favorability in top_relations:
             level = self._get_relation_level(favorability)
             special_relation = special_relations.get(target_id)
             
@@ -592,4 +644,18 @@ class SocialManager:
             
         return result
 
+    def get_group_social_stats(self, group_id: str,
+                               mutual_threshold: int = DEFAULT_MUTUAL_THRESHOLD) -> GroupSocialStats:
+        """
+        获取全群的社交统计：最佳CP、互相好感度达标的对数、社交圈子与人气王
+
+        Args:
+            group_id: 群聊ID
+            mutual_threshold: 统计"互相好感度都不低于此值"的用户对
+
+        Returns:
+            GroupSocialStats
+        """
+        return self.social_graph.get_group_stats(self._group_key(group_id), mutual_threshold)
+
 
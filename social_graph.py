@@ -0,0 +1,137 @@
+# feifeisupermarket/social_graph.py
+
+"""
+AstrAstr超级市场 - 群社交关系统计
+
+基于 FavorabilityStore 中按用户对存储的好感度记录（每对用户一条，天然是无向边表），
+一次遍历同时得到：
+- 最佳CP：双方互相好感度（取两者较小值）最高的用户对
+- 互相好感度都达到指定值的用户对数量
+- 社交圈子：互相好感度达到熟人等级的用户用并查集连成的连通分量
+- 人气王：收到的好感度总和最高的成员
+
+统计结果按群缓存，只有该群的好感度发生变化（版本号改变）后再次查询时才重新计算。
+"""
+
+import heapq
+from typing import Dict, List, NamedTuple, Tuple
+
+from .favorability import FavorabilityStore
+
+DEFAULT_MUTUAL_THRESHOLD = 50  # 朋友
+CLUSTER_THRESHOLD = 20  # 熟人，互相达到此好感度才算同一个圈子
+DEFAULT_TOP_K = 5
+
+
+class GroupSocialStats(NamedTuple):
+    """群社交统计结果"""
+    member_count: int  # 有好感度数据的成员数
+    relation_count: int  # 至少一方好感度大于0的用户对数量
+    mutual_count: int  # 双方好感度都不低于 mutual_threshold 的用户对数量
+    mutual_threshold: int
+    top_couples: List[Tuple[str, str, int, int]]  # [(用户A, 用户B, A对B, B对A)]
+    most_popular: List[Tuple[str, int, int]]  # [(用户, 收到的好感度总和, 有好感的人数)]
+    clusters: List[List[str]]  # 人数不少于2的圈子，按人数降序
+
+
+class SocialGraph:
+    """
+    群社交统计引擎。
+
+    Args:
+        store: 好感度存储
+        top_k: 最佳CP与人气王的展示数量
+    """
+
+    def __init__(self, store: FavorabilityStore, top_k: int = DEFAULT_TOP_K):
+        self.store = store
+        self.top_k = top_k
+        # {群: (版本号, 阈值, 统计结果)}
+        self._cache: Dict[str, Tuple[int, int, GroupSocialStats]] = {}
+        self.stats = {"hits": 0, "builds": 0}
+
+    def get_group_stats(self, group_key: str,
+                        mutual_threshold: int = DEFAULT_MUTUAL_THRESHOLD) -> GroupSocialStats:
+        """获取群社交统计（好感度未变化时直接返回缓存）"""
+        version = self.store.version(group_key)
+        cached = self._cache.get(group_key)
+        if cached and cached[0] == version and cached[1] == mutual_threshold:
+            self.stats["hits"] += 1
+            return cached[2]
+
+        result = self._build(group_key, mutual_threshold)
+        self._cache[group_key] = (version, mutual_threshold, result)
+        self.stats["builds"] += 1
+        return result
+
+    def _build(self, group_key: str, mutual_threshold: int) -> GroupSocialStats:
+        """遍历一次用户对记录，计算全部统计"""
+        top_k = self.top_k
+        relation_count = 0
+        mutual_count = 0
+        couples_heap: List[Tuple[int, int, str, str, int, int]] = []  # 小顶堆，只保留前 top_k 对
+        received: Dict[str, int] = {}
+        admirers: Dict[str, int] = {}
+        parent: Dict[str, str] = {}
+
+        def find(user_id: str) -> str:
+            root = parent.setdefault(user_id, user_id)
+            while root != parent[root]:
+                parent[root] = parent[parent[root]]
+                root = parent[root]
+            return root
+
+        for user_a_id, user_b_id, a_to_b, b_to_a in self.store.pairs(group_key):
+            if a_to_b <= 0 and b_to_a <= 0:
+                continue
+            relation_count += 1
+
+            if a_to_b > 0:
+                received[user_b_id] = received.get(user_b_id, 0) + a_to_b
+                admirers[user_b_id] = admirers.get(user_b_id, 0) + 1
+            if b_to_a > 0:
+                received[user_a_id] = received.get(user_a_id, 0) + b_to_a
+                admirers[user_a_id] = admirers.get(user_a_id, 0) + 1
+
+            mutual = min(a_to_b, b_to_a)
+            if mutual <= 0:
+                continue
+            if mutual >= mutual_threshold:
+                mutual_count += 1
+            if mutual >= CLUSTER_THRESHOLD:
+                root_a, root_b = find(user_a_id), find(user_b_id)
+                if root_a != root_b:
+                    parent[root_a] = root_b
+
+            entry = (mutual, a_to_b + b_to_a, user_a_id, user_b_id, a_to_b, b_to_a)
+            if len(couples_heap) < top_k:
+                heapq.heappush(couples_heap, entry)
+            elif entry > couples_heap[0]:
+                heapq.heapreplace(couples_heap, entry)
+
+        top_couples = [
+            (user_a_id, user_b_id, a_to_b, b_to_a)
+            for _, _, user_a_id, user_b_id, a_to_b, b_to_a in sorted(couples_heap, reverse=True)
+        ]
+        most_popular = [
+            (user_id, total, admirers[user_id])
+            for user_id, total in heapq.nlargest(top_k, received.items(), key=lambda item: item[1])
+        ]
+
+        members_by_root: Dict[str, List[str]] = {}
+        for user_id in parent:
+            members_by_root.setdefault(find(user_id), []).append(user_id)
+        clusters = sorted(
+            (sorted(members) for members in members_by_root.values() if len(members) >= 2),
+            key=len, reverse=True
+        )
+
+        return GroupSocialStats(
+            member_count=len(self.store.members(group_key)),
+            relation_count=relation_count,
+            mutual_count=mutual_count,
+            mutual_threshold=mutual_threshold,
+            top_couples=top_couples,
+            most_popular=most_popular,
+            clusters=clusters,
+        )
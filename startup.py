@@ -0,0 +1,162 @@
+# feifeisupermarket/startup.py
+
+"""
+AstrAstr超级市场 - 延迟加载与启动耗时
+
+插件注册时只做轻量的初始化，四个数据文件的读取与各管理器（含冒险抽样表、物品表）的
+构建放到后台线程中依次完成，不阻塞 AstrBot 的启动与事件循环：
+- LazyComponent：首次访问时创建的组件。后台线程可以提前创建；
+  如果指令在加载完成前到达，由 requires_components 在线程中创建（或等待后台线程创建完成），
+  事件循环不会被阻塞
+- StartupReport：记录各阶段耗时，就绪后输出启动耗时报告
+"""
+
+import asyncio
+import functools
+import importlib
+import inspect
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from astrbot.api import logger
+
+MODE_SYNC = "同步"  # 在事件循环中执行
+MODE_BACKGROUND = "后台"  # 启动后的后台线程
+MODE_ON_DEMAND = "按需"  # 指令先于后台加载到达，在线程中加载，指令等待
+
+
+class StartupReport:
+    """启动各阶段的耗时记录"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float, str]] = []  # [(阶段, 秒, 方式)]
+        self.ready_after: Optional[float] = None
+
+    def record(self, name: str, seconds: float, mode: str = MODE_SYNC):
+        self.phases.append((name, seconds, mode))
+
+    def mark_ready(self):
+        self.ready_after = time.perf_counter() - self.started
+
+    def blocking_seconds(self) -> float:
+        """在事件循环中执行（阻塞指令处理）的总耗时"""
+        return sum(seconds for _, seconds, mode in self.phases if mode == MODE_SYNC)
+
+    def format(self) -> str:
+        lines = [f"· {name}：{seconds * 1000:.0f}ms（{mode}）" for name, seconds, mode in self.phases]
+        if self.ready_after is None:
+            lines.append("后台加载进行中")
+        else:
+            lines.append(f"后台加载完成用时 {self.ready_after * 1000:.0f}ms；"
+                         f"同步执行（阻塞事件循环）合计 {self.blocking_seconds() * 1000:.0f}ms")
+        return "\n".join(lines)
+
+
+class LazyComponent:
+    """
+    首次访问时创建的组件（线程安全，只创建一次）
+
+    Args:
+        name: 名称（用于启动报告）
+        factory: 创建组件的函数
+        report: 启动报告，创建时记录耗时
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], report: Optional[StartupReport] = None):
+        self.name = name
+        self._factory = factory
+        self._report = report
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> Any:
+        """
+        返回组件，尚未创建时就地创建（后台线程正在创建时等待其完成）。
+        在事件循环中调用会阻塞，指令处理函数应通过 requires_components 先加载
+        """
+        if self._loaded:
+            return self._value
+        return self._load(MODE_SYNC)
+
+    async def aget(self) -> Any:
+        """返回组件，尚未创建时在线程中创建（后台线程正在创建时在线程中等待），不阻塞事件循环"""
+        if self._loaded:
+            return self._value
+        return await asyncio.to_thread(self._load, MODE_ON_DEMAND)
+
+    def preload(self) -> Any:
+        """提前创建组件（在后台线程中调用）"""
+        return self._load(MODE_BACKGROUND)
+
+    def _load(self, mode: str) -> Any:
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                self._value = self._factory()
+                self._loaded = True
+                if self._report is not None:
+                    self._report.record(self.name, time.perf_counter() - start, mode)
+        return self._value
+
+
+async def ensure_loaded(components: Iterable[LazyComponent]):
+    """等待所有组件加载完成（未加载的在线程中加载）"""
+    for component in components:
+        if not component.loaded:
+            await component.aget()
+
+
+def requires_components(func: Callable) -> Callable:
+    """
+    指令处理函数的装饰器，放在 @instrument_command 之下（紧贴函数定义）。
+    处理前先 await self.prepare_command()：插件在其中等待延迟加载的组件（ensure_loaded），
+    之后的同步访问不再阻塞事件循环。
+    """
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            await self.prepare_command()
+            async for result in func(self, *args, **kwargs):
+                yield result
+        return wrapper
+
+    @functools.wraps(func)
+    async def async_wrapper(self, *args, **kwargs):
+        await self.prepare_command()
+        return await func(self, *args, **kwargs)
+    return async_wrapper
+
+
+async def preload_components(components: Iterable[LazyComponent], report: StartupReport,
+                             warm_modules: Iterable[str] = (), package: Optional[str] = None):
+    """
+    在后台线程中依次创建组件，再预先导入渲染模块，完成后输出启动耗时报告。
+    单个组件创建失败时记录错误并继续（之后首次访问时会再次尝试）。
+    """
+    for component in components:
+        try:
+            await asyncio.to_thread(component.preload)
+        except Exception as e:
+            logger.error(f"后台加载 {component.name} 失败: {e}", exc_info=True)
+
+    modules = list(warm_modules)
+    if modules:
+        def import_modules():
+            for module in modules:
+                importlib.import_module(module, package)
+        try:
+            start = time.perf_counter()
+            await asyncio.to_thread(import_modules)
+            report.record("渲染模块", time.perf_counter() - start, MODE_BACKGROUND)
+        except Exception as e:
+            logger.error(f"预先导入渲染模块失败: {e}")
+
+    report.mark_ready()
+    logger.info(f"Astr超级市场启动耗时：\n{report.format()}")
@@ -0,0 +1,256 @@
+# feifeisupermarket/storage.py
+
+"""
+AstrAstr超级市场 - 多进程安全的 YAML 数据文件
+
+插件重载时旧实例仍在写入，或多个机器人账号共用 data/feifeiQsign 时，
+直接 yaml.dump 覆盖文件会让后写入的进程悄悄丢掉其他进程的修改。YamlStore 负责：
+- 进程间建议锁：读取时加共享锁、写入时加排他锁（同目录下的 <文件>.lock；
+  POSIX 使用 fcntl.flock，Windows 使用 msvcrt.locking，只有排他锁）
+- 原子写入：写入同目录的临时文件并 fsync，再用 os.replace 替换，其他进程不会读到写了一半的文件
+- 修改检测：记录上次读写后文件的 (inode, 修改时间, 大小)。发现文件已被其他进程修改时，
+  读取磁盘上的版本，以上次同步时的内容为共同祖先做三方合并：
+  只有对方修改的值采用对方的版本，只有本进程修改的保留本进程的版本，
+  双方都修改了同一个值时保留本进程的版本并计为冲突。合并粒度为 群 → 用户 → 字段，
+  字段为字典时继续向下合并（背包的 分类 → 物品、好感度的 目标用户），
+  因此两个进程修改同一用户的不同字段时双方的修改都会保留
+- 两个同步时机：指令修改记录之前调用 refresh，使判断基于最新数据；写入前 save 再检查一次
+
+共同祖先保存为上次读写的 YAML 文本，只在需要合并时才解析，平时不增加保存的开销。
+"""
+
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+import yaml
+
+from astrbot.api import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# 三方合并的层数：群 → 用户 → 字段 → 字段内的字典（最深为商店的 群 → 用户 → 背包 → 分类 → 物品）
+DEFAULT_MERGE_DEPTH = 5
+DEFAULT_FILE_MODE = 0o644
+
+_MISSING = object()
+
+
+class FileLock:
+    """基于锁文件的进程间建议锁"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def acquire(self, shared: bool = False):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, DEFAULT_FILE_MODE)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)  # 每次最多等待约10秒
+                        break
+                    except OSError:
+                        logger.warning(f"等待数据文件锁 {self.path} 超时，继续等待")
+            yield
+        finally:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(fd)
+
+
+def _same(a, b) -> bool:
+    return a is b or (a is not _MISSING and b is not _MISSING and a == b)
+
+
+def merge_changes(ours: dict, theirs: dict, base: dict, depth: int = DEFAULT_MERGE_DEPTH) -> Tuple[int, int]:
+    """
+    三方合并：把 theirs 相对 base 的修改合并进 ours（原地修改，保留 ours 中字典对象的身份）。
+
+    Returns:
+        (采用对方版本的条目数, 冲突数)
+    """
+    merged = conflicts = 0
+    for key in set(ours) | set(theirs) | set(base):
+        mine, other, common = ours.get(key, _MISSING), theirs.get(key, _MISSING), base.get(key, _MISSING)
+        if _same(other, common) or _same(mine, other):
+            continue
+        if _same(mine, common):
+            if other is _MISSING:
+                del ours[key]
+            elif isinstance(mine, dict) and isinstance(other, dict):
+                mine.clear()
+                mine.update(other)
+            else:
+                ours[key] = other
+            merged += 1
+        elif depth > 1 and all(isinstance(value, dict) for value in (mine, other, common)):
+            sub_merged, sub_conflicts = merge_changes(mine, other, common, depth - 1)
+            merged += sub_merged
+            conflicts += sub_conflicts
+        elif depth > 1 and common is _MISSING and isinstance(mine, dict) and isinstance(other, dict):
+            # 双方各自新建了同一个群
+            sub_merged, sub_conflicts = merge_changes(mine, other, {}, depth - 1)
+            merged += sub_merged
+            conflicts += sub_conflicts
+        else:
+            conflicts += 1
+    return merged, conflicts
+
+
+def _signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class YamlStore:
+    """
+    多进程安全的 YAML 数据文件
+
+    Args:
+        path: 数据文件路径
+        name: 名称（用于日志）
+        dumper: yaml.dump 使用的 Dumper
+        on_load: 对刚读取的数据做转换（如把列表还原为集合），返回转换后的数据
+        merge_depth: 三方合并的层数
+    """
+
+    def __init__(self, path: str, name: str, dumper: type = yaml.Dumper,
+                 on_load: Optional[Callable[[dict], dict]] = None, merge_depth: int = DEFAULT_MERGE_DEPTH):
+        self.path = path
+        self.name = name
+        self._dumper = dumper
+        self._on_load = on_load
+        self._merge_depth = merge_depth
+        self._lock = FileLock(path + ".lock")
+        self._signature: Optional[Tuple[int, int, int]] = None  # 上次读写后文件的签名
+        self._base_text: Optional[str] = None  # 上次读写的内容（三方合并的共同祖先）
+        # refresh 时无法解析的磁盘版本的签名：文件未再变化前不重复读取，由下一次保存处理
+        self._bad_signature: Optional[Tuple[int, int, int]] = None
+        self.stats = {"saves": 0, "merges": 0, "merged_records": 0, "conflicts": 0}
+
+    def _parse(self, text: str) -> dict:
+        data = yaml.safe_load(text) or {}
+        return self._on_load(data) if self._on_load else data
+
+    def load(self) -> dict:
+        """读取数据文件，文件不存在时返回空字典（解析失败时抛出异常）"""
+        with self._lock.acquire(shared=True):
+            if not os.path.exists(self.path):
+                self._signature, self._base_text = None, None
+                return {}
+            with open(self.path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            signature = _signature(self.path)
+        data = self._parse(text)
+        self._signature, self._base_text = signature, text
+        return data
+
+    def changed_on_disk(self) -> bool:
+        """数据文件是否在上次读写之后被其他进程修改过（文件被删除不算）"""
+        current = _signature(self.path)
+        return current is not None and current != self._signature
+
+    def refresh(self, data: dict) -> int:
+        """
+        文件已被其他进程修改时，读取磁盘上的版本并合并进 data（原地修改），之后以该版本作为共同祖先。
+        在指令修改记录之前调用，避免基于过期的数据做判断（例如重复花费同一笔Astr币）。
+
+        Returns:
+            从磁盘合并进来的条目数量；大于0时调用方应重建由数据派生的索引
+        """
+        current = _signature(self.path)
+        if current is None or current == self._signature or current == self._bad_signature:
+            return 0
+        try:
+            with self._lock.acquire(shared=True):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                signature = _signature(self.path)
+        except FileNotFoundError:
+            return 0
+        try:
+            merged = self._merge(data, text)
+        except Exception as e:
+            self._bad_signature = signature
+            logger.warning(f"其他进程写入的{self.name}无法解析，暂不同步: {e}")
+            return 0
+        self._signature, self._base_text = signature, text
+        return merged
+
+    def save(self, data: dict) -> int:
+        """
+        原子写入数据。写入前如果文件已被其他进程修改，先把对方的修改合并进 data（原地修改）。
+
+        Returns:
+            从磁盘合并进来的条目数量；大于0时调用方应重建由数据派生的索引
+        """
+        merged = 0
+        with self._lock.acquire():
+            if self.changed_on_disk():
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        merged = self._merge(data, f.read())
+                except Exception as e:
+                    logger.error(f"读取其他进程修改后的{self.name}失败，将直接覆盖: {e}")
+            text = yaml.dump(data, allow_unicode=True, Dumper=self._dumper)
+            self._write(text)
+        self._base_text, self._bad_signature = text, None
+        self.stats["saves"] += 1
+        return merged
+
+    def _merge(self, data: dict, text: str) -> int:
+        """把其他进程写入的版本合并进 data，返回合并的条目数量（解析失败时抛出异常，data 不变）"""
+        theirs = self._parse(text)
+        base = self._parse(self._base_text) if self._base_text else {}
+
+        merged, conflicts = merge_changes(data, theirs, base, self._merge_depth)
+        self.stats["merges"] += 1
+        self.stats["merged_records"] += merged
+        self.stats["conflicts"] += conflicts
+        log = logger.warning if conflicts else logger.info
+        log(f"{self.name}已被其他进程修改，合并了 {merged} 条对方的修改，{conflicts} 条冲突保留本进程的版本")
+        return merged
+
+    def _write(self, text: str):
+        """写入临时文件后原子替换（调用方持有排他锁）"""
+        directory = os.path.dirname(self.path) or "."
+        try:
+            mode = stat.S_IMODE(os.stat(self.path).st_mode)
+        except FileNotFoundError:
+            mode = DEFAULT_FILE_MODE
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + ".", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._signature = _signature(self.path)
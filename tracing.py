@@ -0,0 +1,237 @@
+# feifeisupermarket/tracing.py
+
+"""
+AstrAstr超级市场 - 慢指令追踪
+
+基于 contextvars 的轻量分段计时：
+- 指令开始时由 @instrument_command 开启一条追踪（trace）
+- 追踪期间 with span("阶段名") 或 @traced() 记录各阶段的开始时间与耗时，
+  嵌套的阶段自动挂在外层阶段之下；asyncio 新建的任务会继承当前追踪
+- 没有进行中的追踪时，span / traced 只做一次 ContextVar 读取，几乎没有开销
+
+指令耗时超过阈值时输出分段明细日志；慢指令与按比例抽样的追踪
+以 JSON 行写入滚动日志文件（需要先调用 tracer.configure 指定文件）。
+"""
+
+import functools
+import inspect
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Callable, List, Optional
+
+from astrbot.api import logger
+
+DEFAULT_SLOW_THRESHOLD_SECONDS = 2.0
+MAX_SPANS_PER_TRACE = 200  # 单条追踪最多记录的阶段数量，超出的只计数
+TRACE_LOG_MAX_BYTES = 2 * 1024 * 1024
+TRACE_LOG_BACKUP_COUNT = 3
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("astrsupermarket_trace", default=None)
+_current_span: ContextVar[int] = ContextVar("astrsupermarket_span", default=-1)
+
+
+def _reset(var: ContextVar, token, fallback):
+    """恢复 ContextVar；在其他上下文中结束时（如跨任务迭代生成器）直接写回外层值"""
+    try:
+        var.reset(token)
+    except ValueError:
+        var.set(fallback)
+
+
+class Trace:
+    """一条指令的追踪记录，spans 中每项为 [名称, 父阶段下标, 开始偏移, 耗时, 错误]"""
+
+    __slots__ = ("name", "started_at", "_start", "spans", "dropped", "duration", "error")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans: List[list] = []
+        self.dropped = 0
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+    def open(self, name: str, parent: int) -> int:
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped += 1
+            return -1
+        self.spans.append([name, parent, time.perf_counter() - self._start, None, None])
+        return len(self.spans) - 1
+
+    def close(self, index: int, error: Optional[str]):
+        if index < 0:
+            return
+        span = self.spans[index]
+        span[3] = time.perf_counter() - self._start - span[2]
+        span[4] = error
+
+    def to_dict(self) -> dict:
+        return {
+            "command": self.name,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="milliseconds"),
+            "duration_ms": round(self.duration * 1000, 1),
+            "error": self.error,
+            "dropped_spans": self.dropped,
+            "spans": [
+                {
+                    "name": name,
+                    "parent": parent,
+                    "start_ms": round(start * 1000, 1),
+                    "duration_ms": None if duration is None else round(duration * 1000, 1),
+                    "error": error,
+                }
+                for name, parent, start, duration, error in self.spans
+            ],
+        }
+
+    def format_tree(self) -> str:
+        """按嵌套关系缩进的分段明细"""
+        depths = []
+        lines = []
+        for name, parent, start, duration, error in self.spans:
+            depth = depths[parent] + 1 if parent >= 0 else 0
+            depths.append(depth)
+            cost = "未结束" if duration is None else f"{duration * 1000:.0f}ms"
+            line = f"{'  ' * depth}- {name}: {cost}（+{start * 1000:.0f}ms）"
+            if error:
+                line += f" [{error}]"
+            lines.append(line)
+        if self.dropped:
+            lines.append(f"- 另有 {self.dropped} 个阶段未记录")
+        return "\n".join(lines)
+
+
+class Tracer:
+    """
+    追踪器
+
+    Args:
+        slow_threshold: 超过该耗时（秒）的指令视为慢指令，输出日志并写入文件
+        sample_rate: 未超过阈值的追踪写入文件的抽样比例（0~1）
+    """
+
+    def __init__(self, slow_threshold: float = DEFAULT_SLOW_THRESHOLD_SECONDS, sample_rate: float = 0.0):
+        self.slow_threshold = slow_threshold
+        self.sample_rate = sample_rate
+        self._file_logger: Optional[logging.Logger] = None
+        self.stats = {"traces": 0, "slow": 0, "written": 0}
+
+    def configure(self, slow_threshold: Optional[float] = None, sample_rate: Optional[float] = None,
+                  log_path: Optional[str] = None):
+        """调整阈值、抽样比例，并指定追踪文件（按大小滚动）"""
+        if slow_threshold is not None:
+            self.slow_threshold = slow_threshold
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if log_path:
+            file_logger = logging.getLogger(f"astrsupermarket.traces.{log_path}")
+            file_logger.propagate = False
+            file_logger.setLevel(logging.INFO)
+            if not file_logger.handlers:
+                handler = RotatingFileHandler(log_path, maxBytes=TRACE_LOG_MAX_BYTES,
+                                              backupCount=TRACE_LOG_BACKUP_COUNT, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                file_logger.addHandler(handler)
+            self._file_logger = file_logger
+
+    @contextmanager
+    def trace(self, name: str):
+        """开启一条追踪；已在追踪中时作为普通阶段记录"""
+        if _current_trace.get() is not None:
+            with self.span(name):
+                yield
+            return
+
+        current = Trace(name)
+        trace_token = _current_trace.set(current)
+        span_token = _current_span.set(-1)
+        try:
+            yield
+        except BaseException as e:
+            current.error = type(e).__name__
+            raise
+        finally:
+            current.duration = time.perf_counter() - current._start
+            _reset(_current_span, span_token, -1)
+            _reset(_current_trace, trace_token, None)
+            self._finish(current)
+
+    @contextmanager
+    def span(self, name: str):
+        """记录当前追踪中的一个阶段（没有追踪时什么也不做）"""
+        current = _current_trace.get()
+        if current is None:
+            yield
+            return
+
+        parent = _current_span.get()
+        index = current.open(name, parent)
+        token = _current_span.set(index)
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            current.close(index, error)
+            _reset(_current_span, token, parent)
+
+    def _finish(self, current: Trace):
+        self.stats["traces"] += 1
+        slow = current.duration >= self.slow_threshold
+        if slow:
+            self.stats["slow"] += 1
+            logger.warning(
+                f"慢指令 {current.name} 耗时 {current.duration * 1000:.0f}ms，分段明细：\n{current.format_tree()}"
+            )
+        if self._file_logger and (slow or (self.sample_rate and random.random() < self.sample_rate)):
+            record = current.to_dict()
+            record["slow"] = slow
+            try:
+                self._file_logger.info(json.dumps(record, ensure_ascii=False))
+                self.stats["written"] += 1
+            except Exception as e:
+                logger.error(f"写入追踪记录失败: {e}")
+
+
+tracer = Tracer()
+
+
+def span(name: str):
+    """with span("阶段名"): 记录当前追踪中的一个阶段"""
+    return tracer.span(name)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """把整个函数记录为一个阶段的装饰器（支持普通函数、协程函数与异步生成器），名称缺省为函数名"""
+    def decorator(func: Callable) -> Callable:
+        label = name or func.__qualname__
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def asyncgen_wrapper(*args, **kwargs):
+                with tracer.span(label):
+                    async for result in func(*args, **kwargs):
+                        yield result
+            return asyncgen_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(label):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator